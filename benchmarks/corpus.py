@@ -0,0 +1,387 @@
+"""
+Generates a synthetic corpus of customer document packages with known
+ground truth, for benchmarks and accuracy measurements.
+
+Each package looks like a branch upload (kyc/ and mandate/ folders plus
+package_info.json) and holds some of: a Mandate Card, a National ID with a
+machine-readable zone, a proof of address and, for companies, registration
+and tax documents. Documents are rendered as scanned images, image-only
+PDFs, text PDFs or multi-page scan bundles, then degraded with configurable
+noise, blur, skew and resolution.
+
+ground_truth.json records, for every document, the clean text that was
+rendered, the fields a perfect extractor would return and the document type
+and account type a perfect OCR pass would produce.
+
+    python benchmarks/corpus.py /tmp/corpus --packages 50 --dpi 200 --noise 0.05 --blur 0.8 --skew 1.5
+"""
+import os
+import sys
+import json
+import random
+import argparse
+from datetime import date, timedelta
+from dataclasses import dataclass, asdict
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+# Page sizes in inches: A4 forms and bills, ID-1 cards
+A4 = (8.27, 11.69)
+ID_CARD = (3.37, 2.13)
+
+SURNAMES = ['MOYO', 'NCUBE', 'CHITEZA', 'SIBANDA', 'DUBE', 'MUTASA', 'NYATHI', 'CHIKWANHA', 'MARUFU', 'GUMBO']
+GIVEN_NAMES = ['TADIWA', 'RUDO', 'CLETOS', 'NYASHA', 'TENDAI', 'FARAI', 'CHIPO', 'TAFADZWA', 'KUDZAI', 'SIPHO']
+OCCUPATIONS = ['ACCOUNTANT', 'TEACHER', 'NURSE', 'CIVIL ENGINEER', 'CHEF', 'FARMER', 'DRIVER', 'PHARMACIST']
+EMPLOYERS = ['DELTA BEVERAGES', 'MINISTRY OF HEALTH', 'ECONET WIRELESS', 'OLD MUTUAL', 'ZIMPLATS']
+STREETS = ['SAMORA MACHEL AVE', 'JULIUS NYERERE WAY', 'BORROWDALE RD', 'JASON MOYO ST', 'KING GEORGE RD']
+CITIES = ['HARARE', 'BULAWAYO', 'MUTARE', 'GWERU', 'MASVINGO']
+BRANCHES = ['Harare', 'Bulawayo', 'Mutare', 'Gweru']
+COMPANY_SUFFIXES = ['HOLDINGS (PVT) LTD', 'TRADING COMPANY LIMITED', 'LOGISTICS (PVT) LTD']
+
+
+@dataclass
+class Degradation:
+    """How a rendered page is spoiled before it is saved, to imitate a scanner or phone camera."""
+    dpi: int = 300
+    noise: float = 0.0      # standard deviation of Gaussian pixel noise, as a fraction of 255
+    blur: float = 0.0       # Gaussian blur radius in pixels at 300 dpi
+    skew: float = 0.0       # maximum rotation in degrees, either direction
+    jpeg_quality: int = 85  # for documents saved as JPEG
+
+    def apply(self, img, rng):
+        if self.skew:
+            img = img.rotate(rng.uniform(-self.skew, self.skew), expand=True, fillcolor='white',
+                             resample=Image.BICUBIC)
+        if self.blur:
+            img = img.filter(ImageFilter.GaussianBlur(self.blur * self.dpi / 300))
+        if self.noise:
+            pixels = np.asarray(img, dtype=np.float32)
+            noise = np.random.default_rng(rng.randrange(2 ** 32)).normal(0, self.noise * 255, pixels.shape)
+            img = Image.fromarray(np.clip(pixels + noise, 0, 255).astype(np.uint8))
+        return img
+
+
+def _font(size_px):
+    try:
+        return ImageFont.truetype('DejaVuSans.ttf', size_px)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def render_page(lines, size_inches, dpi, font_points=11):
+    """Draws lines of text top to bottom on a white page of the given size."""
+    width, height = int(size_inches[0] * dpi), int(size_inches[1] * dpi)
+    img = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(img)
+    font_px = max(8, int(font_points * dpi / 72))
+    font = _font(font_px)
+    margin = int(0.08 * min(size_inches) * dpi)
+    y = margin
+    for line in lines:
+        if y + font_px > height - margin:
+            break
+        draw.text((margin, y), line, fill=0, font=font)
+        y += int(font_px * 1.6)
+    return img
+
+
+# --- Ground truth people and documents ---
+
+def _mrz_check_digit(value):
+    """ICAO 9303 check digit: weights 7, 3, 1 over digits, letters (A=10) and fillers."""
+    total = 0
+    for index, char in enumerate(value):
+        if char.isdigit():
+            number = int(char)
+        elif char.isalpha():
+            number = ord(char) - ord('A') + 10
+        else:
+            number = 0
+        total += number * (7, 3, 1)[index % 3]
+    return str(total % 10)
+
+
+def make_person(rng):
+    dob = date(1950, 1, 1) + timedelta(days=rng.randrange(0, 365 * 50))
+    issued = date(2012, 1, 1) + timedelta(days=rng.randrange(0, 365 * 10))
+    district = rng.randrange(10, 80)
+    self_employed = rng.random() < 0.25
+    return {
+        'surname': rng.choice(SURNAMES),
+        'given_names': rng.choice(GIVEN_NAMES),
+        'id_number': f'{district}-{rng.randrange(1000000, 9999999)}-{rng.choice("ABCDEFGHJKLMNPQRSTVWXYZ")}-{district}',
+        'date_of_birth': dob,
+        'gender': rng.choice(['M', 'F']),
+        'issue_date': issued,
+        'expiry_date': issued + timedelta(days=3652),
+        'occupation': rng.choice(OCCUPATIONS),
+        'employer': 'SELF' if self_employed else rng.choice(EMPLOYERS),
+        'employer_address': f'{rng.randrange(1, 300)} {rng.choice(STREETS)}, {rng.choice(CITIES)}',
+        'home_address': f'{rng.randrange(1, 999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}',
+        'salary': rng.randrange(300, 6000) + rng.choice([0, 0.5]),
+    }
+
+
+def mandate_card(person, account_no, company=None):
+    full_name = f"{person['given_names']} {person['surname']}"
+    lines = [
+        'AURA BANK',
+        'ACCOUNT MANDATE CARD',
+        'ACCOUNT SIGNING INSTRUCTIONS',
+        f'ACCOUNT NAME: {company or full_name}',
+        f'ACCOUNT NUMBER: {account_no}',
+        f'AUTHORISED SIGNATORY: {full_name}',
+        '3. EMPLOYMENT STATUS',
+        f'OCCUPATION: {person["occupation"]}',
+        f"EMPLOYER'S NAME: {person['employer']}",
+        f"EMPLOYER'S ADDRESS: {person['employer_address']}",
+        'MONTHLY SALARY INCOME (ATTACH PAYSLIP)',
+        f'GROSS MONTHLY $ {person["salary"]:,.2f}',
+        '4. SIGNATURE',
+    ]
+    fields = {
+        'profession': person['occupation'],
+        'employment_status': 'Self-Employed' if person['employer'] == 'SELF' else 'Employed',
+        'monthly_salary': f'{person["salary"]:.2f}',
+        'employer_address': person['employer_address'],
+    }
+    return lines, fields, 'basic_details'
+
+
+def national_id(person):
+    surname, given = person['surname'], person['given_names']
+    id_digits = person['id_number'].replace('-', '')
+    document_number = (id_digits + '<' * 9)[:9]
+    dob, expiry = person['date_of_birth'].strftime('%y%m%d'), person['expiry_date'].strftime('%y%m%d')
+    line1 = f'IDZWE{document_number}{_mrz_check_digit(document_number)}'.ljust(30, '<')
+    line2_body = f'{dob}{_mrz_check_digit(dob)}{person["gender"]}{expiry}{_mrz_check_digit(expiry)}ZWE'
+    line2 = line2_body.ljust(29, '<') + _mrz_check_digit(line2_body)
+    line3 = f'{surname}<<{given}'.replace(' ', '<').ljust(30, '<')[:30]
+    lines = [
+        'REPUBLIC OF ZIMBABWE',
+        'NATIONAL IDENTITY CARD',
+        f'NATIONAL ID NUMBER: {person["id_number"]}',
+        f'SURNAME: {surname}',
+        f'GIVEN NAMES: {given}',
+        f'DATE OF BIRTH: {person["date_of_birth"].strftime("%d/%m/%Y")}',
+        f'SEX: {person["gender"]}',
+        'NATIONALITY: ZIMBABWEAN',
+        f'DATE OF ISSUE: {person["issue_date"].strftime("%d/%m/%Y")}',
+        f'EXPIRY DATE: {person["expiry_date"].strftime("%d/%m/%Y")}',
+        line1,
+        line2,
+        line3,
+    ]
+    fields = {
+        'full_name': f'{given} {surname}',
+        'id_number': person['id_number'],
+        'date_of_birth': person['date_of_birth'].isoformat(),
+        'gender': 'Male' if person['gender'] == 'M' else 'Female',
+        'nationality': 'Zimbabwean',
+        'issue_date': person['issue_date'].isoformat(),
+        'expiry_date': person['expiry_date'].isoformat(),
+    }
+    return lines, fields, 'personal_details'
+
+
+def proof_of_address(person, rng):
+    billed = date(2024, 1, 1) + timedelta(days=rng.randrange(0, 365))
+    lines = [
+        'CITY OF HARARE',
+        'UTILITY BILL - WATER AND RATES',
+        'PROOF OF RESIDENCE',
+        f'ACCOUNT HOLDER: {person["given_names"]} {person["surname"]}',
+        f'SERVICE ADDRESS: {person["home_address"]}',
+        f'BILLING DATE: {billed.strftime("%d/%m/%Y")}',
+        f'AMOUNT DUE: $ {rng.randrange(10, 400)}.00',
+    ]
+    return lines, {'home_address': person['home_address']}, None
+
+
+def company_documents(company, rng):
+    """Registration, tax and ownership documents of a company account."""
+    return {
+        'tax_clearance': ([
+            'ZIMBABWE REVENUE AUTHORITY', 'TAX CLEARANCE CERTIFICATE (ITF263)',
+            f'TAXPAYER: {company}', f'VALID UNTIL: 31/12/{rng.randrange(2025, 2028)}',
+        ], {}, None),
+        'cr14': ([
+            'COMPANIES AND OTHER BUSINESS ENTITIES ACT', 'FORM CR14 - NOTICE OF DIRECTORS',
+            f'COMPANY NAME: {company}', 'CERTIFICATE OF INCORPORATION ATTACHED',
+        ], {}, None),
+        'ubo': ([
+            'ULTIMATE BENEFICIAL OWNER (UBO) DECLARATION', f'ENTITY: {company}',
+            f'OWNERSHIP: {rng.randrange(25, 100)}%',
+        ], {}, None),
+        'evl': (['ELEVATE FORM (EVL)', f'BUSINESS NAME: {company}', 'SECTOR: TRADING'], {}, None),
+    }
+
+
+# --- Writing documents ---
+
+def _save(pages, path, fmt, degradation, rng, text_lines=None):
+    """Degrades and saves rendered pages as 'png', 'jpg', 'scan_pdf' (image-only) or 'text_pdf'."""
+    if fmt == 'text_pdf':
+        import fitz  # PyMuPDF
+        with fitz.open() as pdf:
+            page = pdf.new_page(width=A4[0] * 72, height=A4[1] * 72)
+            page.insert_text((50, 72), '\n'.join(text_lines), fontsize=11)
+            pdf.save(path)
+        return
+    pages = [degradation.apply(page, rng) for page in pages]
+    if fmt == 'png':
+        pages[0].save(path, dpi=(degradation.dpi, degradation.dpi))
+    elif fmt == 'jpg':
+        pages[0].convert('RGB').save(path, quality=degradation.jpeg_quality, dpi=(degradation.dpi, degradation.dpi))
+    else:
+        pages[0].convert('RGB').save(path, save_all=True, append_images=[p.convert('RGB') for p in pages[1:]],
+                                     resolution=degradation.dpi)
+
+
+def _expected_type(text, config):
+    from utils.package_processor import match_document_type
+    return match_document_type(text.lower(), config)
+
+
+def generate_package(package_dir, account_no, rng, degradation, config, company=False, missing_ratio=0.15,
+                     bundle_ratio=0.2):
+    """Writes one package and returns its ground truth entry."""
+    person = make_person(rng)
+    company_name = f'{person["surname"]} {rng.choice(COMPANY_SUFFIXES)}' if company else None
+    documents = {
+        'mandate/mandate_card': mandate_card(person, account_no, company_name),
+        'kyc/national_id': national_id(person),
+        'kyc/proof_of_address': proof_of_address(person, rng),
+    }
+    if company:
+        documents.update({f'kyc/{name}': doc for name, doc in company_documents(company_name, rng).items()})
+    # Leave out a document now and then so some packages are incomplete
+    if rng.random() < missing_ratio:
+        del documents[rng.choice(sorted(name for name in documents if name.startswith('kyc/')))]
+
+    formats = {'mandate/mandate_card': 'scan_pdf', 'kyc/national_id': 'jpg',
+               'kyc/proof_of_address': rng.choice(['text_pdf', 'png'])}
+    bundle = rng.random() < bundle_ratio and len([n for n in documents if n.startswith('kyc/')]) > 1
+    truth_documents = []
+    kyc_bundle = []
+    for name, (lines, fields, extractor) in documents.items():
+        size = ID_CARD if name == 'kyc/national_id' else A4
+        page = render_page(lines, size, degradation.dpi, font_points=6 if size == ID_CARD else 11)
+        text = '\n'.join(lines)
+        if bundle and name.startswith('kyc/'):
+            kyc_bundle.append((page, text, name, fields, extractor))
+            continue
+        fmt = formats.get(name, 'scan_pdf')
+        extension = {'scan_pdf': 'pdf', 'text_pdf': 'pdf'}.get(fmt, fmt)
+        relative_path = f'{name}.{extension}'
+        os.makedirs(os.path.join(package_dir, os.path.dirname(relative_path)), exist_ok=True)
+        _save([page], os.path.join(package_dir, relative_path), fmt, degradation, rng, text_lines=lines)
+        truth_documents.append({
+            'path': relative_path, 'document': name.split('/')[-1], 'format': fmt, 'pages': 1, 'text': text,
+            'extractor': extractor, 'fields': fields, 'identified_type': _expected_type(text, config),
+        })
+
+    if kyc_bundle:
+        # Several documents scanned into one multi-page PDF, as branches often do
+        relative_path = 'kyc/scan_bundle.pdf'
+        os.makedirs(os.path.join(package_dir, 'kyc'), exist_ok=True)
+        _save([entry[0] for entry in kyc_bundle], os.path.join(package_dir, relative_path), 'scan_pdf',
+              degradation, rng)
+        text = '\n'.join(entry[1] for entry in kyc_bundle)
+        truth_documents.append({
+            'path': relative_path, 'document': 'bundle', 'format': 'scan_pdf', 'pages': len(kyc_bundle),
+            'text': text, 'extractor': None, 'fields': {},
+            'bundled': [entry[2].split('/')[-1] for entry in kyc_bundle],
+            'identified_type': _expected_type(text, config),
+        })
+
+    all_text = '\n'.join(doc['text'] for doc in truth_documents).lower()
+    company_keywords = config.get('classification_keywords', {}).get('COMPANY', [])
+    account_type = 'COMPANY' if any(keyword in all_text for keyword in company_keywords) else 'INDIVIDUAL'
+    identified = {doc['identified_type'] for doc in truth_documents}
+    missing = sorted(set(config['document_checklists'].get(account_type, [])) - identified)
+
+    with open(os.path.join(package_dir, 'package_info.json'), 'w') as f:
+        json.dump({
+            'account_no': account_no,
+            'account_name': company_name or f"{person['given_names']} {person['surname']}",
+            'branch_name': rng.choice(BRANCHES),
+            'account_type': 'Corporate' if company else 'Individual',
+        }, f, indent=4)
+    return {
+        'package': account_no,
+        'account_type': account_type,
+        'missing_documents': missing,
+        'documents': truth_documents,
+    }
+
+
+def generate_corpus(out_dir, packages=20, seed=1, degradation=None, company_ratio=0.25, missing_ratio=0.15,
+                    bundle_ratio=0.2):
+    """
+    Writes packages into out_dir/packages and their ground truth into
+    out_dir/ground_truth.json, which is also returned. The same seed and
+    settings always produce the same corpus.
+    """
+    degradation = degradation or Degradation()
+    rng = random.Random(seed)
+    with open(os.path.join(ROOT_DIR, 'config.json')) as f:
+        config = json.load(f)
+
+    packages_dir = os.path.join(out_dir, 'packages')
+    os.makedirs(packages_dir, exist_ok=True)
+    truth = []
+    for index in range(packages):
+        account_no = f'9{seed % 100:02d}{index:07d}'
+        truth.append(generate_package(
+            os.path.join(packages_dir, account_no), account_no, rng, degradation, config,
+            company=rng.random() < company_ratio, missing_ratio=missing_ratio, bundle_ratio=bundle_ratio,
+        ))
+
+    ground_truth = {
+        'seed': seed,
+        'degradation': asdict(degradation),
+        'company_ratio': company_ratio,
+        'missing_ratio': missing_ratio,
+        'bundle_ratio': bundle_ratio,
+        'packages': truth,
+    }
+    with open(os.path.join(out_dir, 'ground_truth.json'), 'w') as f:
+        json.dump(ground_truth, f, indent=2)
+    return ground_truth
+
+
+def load_ground_truth(corpus_dir):
+    with open(os.path.join(corpus_dir, 'ground_truth.json')) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('out_dir')
+    parser.add_argument('--packages', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--noise', type=float, default=0.0)
+    parser.add_argument('--blur', type=float, default=0.0)
+    parser.add_argument('--skew', type=float, default=0.0)
+    parser.add_argument('--jpeg-quality', type=int, default=85)
+    parser.add_argument('--company-ratio', type=float, default=0.25)
+    parser.add_argument('--missing-ratio', type=float, default=0.15)
+    parser.add_argument('--bundle-ratio', type=float, default=0.2)
+    args = parser.parse_args()
+
+    degradation = Degradation(dpi=args.dpi, noise=args.noise, blur=args.blur, skew=args.skew,
+                              jpeg_quality=args.jpeg_quality)
+    truth = generate_corpus(args.out_dir, args.packages, args.seed, degradation, args.company_ratio,
+                            args.missing_ratio, args.bundle_ratio)
+    documents = sum(len(package['documents']) for package in truth['packages'])
+    print(f'Wrote {len(truth["packages"])} packages ({documents} documents) to {args.out_dir}')
+
+
+if __name__ == '__main__':
+    main()
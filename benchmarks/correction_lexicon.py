@@ -0,0 +1,104 @@
+"""
+Measures the correction lexicon (utils/lexicon.py): how long a lookup takes
+as the vocabulary grows and how many recurring misreadings it fixes.
+
+A correction history is simulated by misreading values with the character
+confusions OCR and HTR make (O/0, I/1, S/5, E/F, ...): the lexicon learns
+from half of the misreadings, then every field is looked up with fresh
+ones, some repeating a misreading already corrected and some new.
+
+    python benchmarks/correction_lexicon.py
+    python benchmarks/correction_lexicon.py --vocabulary 50000 --lookups 20000 --output /tmp/lexicon.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.corpus import SURNAMES, OCCUPATIONS, EMPLOYERS
+from benchmarks.pipeline import summarise
+from utils.lexicon import CorrectionLexicon
+
+CONFUSIONS = {'O': '0', '0': 'O', 'I': '1', 'L': '1', 'S': '5', 'E': 'F', 'B': '8', 'Z': '2', 'G': '6', 'N': 'M'}
+LETTERS = 'ABCDEFGHIJKLMNOPRSTUVWYZ'
+
+
+def misread(value, rng):
+    """value with one character confused, or the same value if none can be."""
+    positions = [i for i, char in enumerate(value) if char in CONFUSIONS]
+    if not positions:
+        return value
+    i = rng.choice(positions)
+    return value[:i] + CONFUSIONS[value[i]] + value[i + 1:]
+
+
+def vocabulary(seed_values, size, rng):
+    """seed_values padded to size with made-up words of similar length."""
+    values = set(seed_values)
+    while len(values) < size:
+        values.add(''.join(rng.choice(LETTERS) for _ in range(rng.randint(4, 12))))
+    return sorted(values)
+
+
+def run(vocabulary_size=5000, lookups=10000, seed=1):
+    rng = random.Random(seed)
+    fields = {
+        'SURNAME': vocabulary(SURNAMES, vocabulary_size, rng),
+        'OCCUPATION': vocabulary(OCCUPATIONS, vocabulary_size, rng),
+        'EMPLOYER': vocabulary(EMPLOYERS, vocabulary_size, rng),
+    }
+    lexicon = CorrectionLexicon()
+    started = time.perf_counter()
+    for field, values in fields.items():
+        for value in values:
+            # Half the values were corrected from a misreading, the rest confirmed as read
+            lexicon.learn(field, misread(value, rng) if rng.random() < 0.5 else None, value)
+    learn_seconds = time.perf_counter() - started
+
+    latencies = {field: [] for field in fields}
+    fixed = {field: 0 for field in fields}
+    for _ in range(lookups):
+        field = rng.choice(list(fields))
+        truth = rng.choice(fields[field])
+        value = misread(truth, rng)
+        start = time.perf_counter()
+        corrected, _ = lexicon.lookup(field, value)
+        latencies[field].append(time.perf_counter() - start)
+        fixed[field] += value != truth and corrected == truth
+
+    return {
+        'vocabulary_per_field': vocabulary_size,
+        'learn_seconds': learn_seconds,
+        'lookup_seconds': {field: summarise(values) for field, values in latencies.items()},
+        'fixed': fixed,
+        'lexicon': lexicon.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vocabulary', type=int, default=5000, help='known values per field')
+    parser.add_argument('--lookups', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the JSON results here')
+    args = parser.parse_args()
+
+    result = run(args.vocabulary, args.lookups, args.seed)
+    print(f"learned {args.vocabulary} values per field in {result['learn_seconds']:.2f}s", file=sys.stderr)
+    for field, latency in result['lookup_seconds'].items():
+        stats = result['lexicon'][field]
+        print(f"  {field:<11} p50 {latency['p50'] * 1e6:7.1f}us  p99 {latency['p99'] * 1e6:7.1f}us  "
+              f"hit rate {stats['hit_rate']:.1%}  corrected {stats['correction_rate']:.1%} "
+              f"(learned {stats['learned']}, fuzzy {stats['fuzzy']})", file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Load-tests how many extractions one process can hold in flight, comparing
+the threaded Flask service (app_dual_extraction) with the asyncio one
+(app_dual_extraction_async).
+
+Gemini is replaced by a local fake model that waits --latency seconds before
+answering, and the database write by a no-op, so each request spends its
+life waiting on the "network" exactly like a real extraction. For every
+concurrency level, each mode runs in a fresh subprocess and reports the peak
+number of model calls in flight, wall time and resident memory growth.
+
+    python benchmarks/extraction_concurrency.py --levels 10,100,1000,5000
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.extraction_tokens import issue_extraction_token
+
+FAKE_FIELDS = {"fields": [{"field_name": "SURNAME", "extracted_value": "MOYO"}]}
+
+
+def rss_bytes():
+    """Current resident set size of this process, from /proc where available."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class InFlight:
+    """Counts concurrent fake-model calls and remembers the peak."""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self.peak_rss = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.current += 1
+            if self.current > self.peak:
+                self.peak = self.current
+                self.peak_rss = rss_bytes()
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.current -= 1
+
+
+def make_package(work_dir):
+    package_dir = os.path.join(work_dir, 'LOAD001')
+    os.makedirs(package_dir)
+    for name in ('mandate.jpg', 'id.jpg'):
+        with open(os.path.join(package_dir, name), 'wb') as f:
+            f.write(os.urandom(200 * 1024))
+    from utils.package_catalog import PackageCatalog, STATUS_CLEAN
+    catalog_db = os.path.join(work_dir, 'catalog.db')
+    PackageCatalog(catalog_db).register_directory(package_dir, STATUS_CLEAN)
+    return catalog_db
+
+
+BODY = {'package_name': 'LOAD001', 'mandate_path': 'mandate.jpg', 'id_path': 'id.jpg'}
+SECRET = 'benchmark'
+HEADERS = {'Authorization': 'Bearer ' + issue_extraction_token(SECRET, 'LOAD001')}
+
+
+def run_threaded(concurrency, latency, catalog_db):
+    import app_dual_extraction
+    counter = InFlight()
+
+    def fake_model(*args, **kwargs):
+        with counter:
+            time.sleep(latency)
+        return json.loads(json.dumps(FAKE_FIELDS))
+
+    app_dual_extraction.gemini_extract = fake_model
+    app_dual_extraction.store_htr_results = lambda schema: None
+    app = app_dual_extraction.app
+    app.config.update(CATALOG_DB=catalog_db, GEMINI_PAUSE_SECONDS=0, TESTING=True, EXTRACTION_SECRET=SECRET)
+    client = app.test_client()
+    statuses = []
+
+    def request_once():
+        statuses.append(client.post('/extract_by_reference', json=BODY, headers=HEADERS).status_code)
+
+    baseline = rss_bytes()
+    start = time.perf_counter()
+    # One thread per in-flight request, as with a threaded WSGI server
+    threads = [threading.Thread(target=request_once) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counter, statuses, baseline, time.perf_counter() - start
+
+
+def run_async(concurrency, latency, catalog_db):
+    import app_dual_extraction_async
+    counter = InFlight()
+
+    async def fake_model(*args, **kwargs):
+        with counter:
+            await asyncio.sleep(latency)
+        return json.loads(json.dumps(FAKE_FIELDS))
+
+    async def no_store(schema):
+        return None
+
+    app_dual_extraction_async.gemini_extract_async = fake_model
+    app_dual_extraction_async.store_htr_results = no_store
+    app = app_dual_extraction_async.app
+    app.config.update(CATALOG_DB=catalog_db, GEMINI_PAUSE_SECONDS=0, TESTING=True, EXTRACTION_SECRET=SECRET)
+    client = app.test_client()
+
+    async def request_all():
+        responses = await asyncio.gather(*(
+            client.post('/extract_by_reference', json=BODY, headers=HEADERS) for _ in range(concurrency)
+        ))
+        return [response.status_code for response in responses]
+
+    baseline = rss_bytes()
+    start = time.perf_counter()
+    statuses = asyncio.run(request_all())
+    return counter, statuses, baseline, time.perf_counter() - start
+
+
+def run_single(mode, concurrency, latency):
+    work_dir = tempfile.mkdtemp()
+    try:
+        catalog_db = make_package(work_dir)
+        runner = run_async if mode == 'async' else run_threaded
+        counter, statuses, baseline, elapsed = runner(concurrency, latency, catalog_db)
+    finally:
+        shutil.rmtree(work_dir)
+    return {
+        'mode': mode,
+        'concurrency': concurrency,
+        'succeeded': statuses.count(201),
+        'peak_in_flight': counter.peak,
+        'wall_seconds': round(elapsed, 3),
+        'rss_growth_mb': round((counter.peak_rss - baseline) / (1024 * 1024), 1),
+        'rss_growth_kb_per_request': round((counter.peak_rss - baseline) / 1024 / max(counter.peak, 1), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--levels', default='10,100,1000', help='Comma-separated concurrency levels')
+    parser.add_argument('--latency', type=float, default=2.0, help='Seconds the fake model takes per call')
+    parser.add_argument('--max-threads', type=int, default=1000,
+                        help='Skip the threaded mode above this level to avoid exhausting the machine')
+    parser.add_argument('--output', help='Write the JSON results here')
+    parser.add_argument('--single', nargs=2, metavar=('MODE', 'CONCURRENCY'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_single(args.single[0], int(args.single[1]), args.latency)))
+        return
+
+    results = []
+    for level in (int(value) for value in args.levels.split(',')):
+        for mode in ('threaded', 'async'):
+            if mode == 'threaded' and level > args.max_threads:
+                continue
+            # A fresh process per run so memory growth is not hidden by an earlier run
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--single', mode, str(level), '--latency', str(args.latency)],
+                capture_output=True, text=True, check=True,
+            )
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(f"{mode:>8} x{level:<6} peak in flight {result['peak_in_flight']:<6} "
+                  f"{result['wall_seconds']:>7.2f}s  +{result['rss_growth_mb']} MB "
+                  f"({result['rss_growth_kb_per_request']} KB/request)", file=sys.stderr)
+
+    output = json.dumps({'latency_seconds': args.latency, 'runs': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+Drives /extract_dual_source at a fixed request rate and reports latency
+percentiles, error rates and throughput.
+
+Requests are sent open-loop: each is due at start + i / rps, whether or not
+earlier ones have finished, and its latency is measured from when it was due.
+A service that falls behind therefore shows up as growing latency rather
+than as a quietly lower request rate.
+
+By default the threaded service (app_dual_extraction) runs in this process
+against a local fake Gemini (benchmarks/fake_gemini.py), with the database
+write replaced by a no-op, so nothing leaves the machine:
+
+    python benchmarks/extraction_load.py --rps 20 --duration 30 --latency 1.5 --rate-429 0.05
+
+--url targets a service that is already running instead, e.g. one started
+with AURA_MODEL_BACKEND=http against a separate fake_gemini.py:
+
+    python benchmarks/extraction_load.py --url http://127.0.0.1:5001 --rps 50 --duration 60
+
+Each request carries a token for its document_id, signed with --secret,
+which must match the service's AURA_EXTRACTION_SECRET.
+"""
+import os
+import io
+import sys
+import json
+import time
+import uuid
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_gemini import FakeGemini, FakeGeminiServer
+from benchmarks.pipeline import summarise
+from utils.extraction_tokens import issue_extraction_token
+
+
+def sample_image(seed):
+    """A small JPEG standing in for a scanned document."""
+    from PIL import Image, ImageDraw
+    image = Image.new('RGB', (800, 500), 'white')
+    ImageDraw.Draw(image).text((40, 40), f'SAMPLE DOCUMENT {seed}', fill='black')
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=80)
+    return buffer.getvalue()
+
+
+def multipart_body(fields, files):
+    """Encodes form fields and (name, filename, bytes, mime type) files as multipart/form-data."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, filename, data, mime_type in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {mime_type}\r\n\r\n'.encode() + data + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def read_document(path, default_seed):
+    if not path:
+        return f'document{default_seed}.jpg', sample_image(default_seed), 'image/jpeg'
+    import mimetypes
+    with open(path, 'rb') as f:
+        data = f.read()
+    return os.path.basename(path), data, mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+class LoadGenerator:
+    """Sends POST /extract_dual_source at rps for duration seconds from a pool of max_in_flight threads."""
+
+    def __init__(self, url, rps, duration, max_in_flight, documents, secret, timeout=300):
+        self.url = url.rstrip('/') + '/extract_dual_source'
+        self.secret = secret
+        self.rps = rps
+        self.duration = duration
+        self.max_in_flight = max_in_flight
+        self.documents = documents
+        self.timeout = timeout
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = Counter()
+        self._lock = threading.Lock()
+
+    def send(self, index, due):
+        mandate, id_document = self.documents
+        document_id = f'LOAD{index:07d}'
+        body, content_type = multipart_body(
+            {'document_id': document_id},
+            [('mandate_file',) + mandate, ('id_file',) + id_document],
+        )
+        headers = {'Content-Type': content_type,
+                   'Authorization': 'Bearer ' + issue_extraction_token(self.secret, document_id)}
+        request = urllib.request.Request(self.url, data=body, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+            try:
+                error = json.loads(e.read()).get('error', '')
+            except ValueError:
+                error = ''
+            with self._lock:
+                self.errors[f'{status} {error}'.strip()] += 1
+        except (urllib.error.URLError, OSError) as e:
+            status = 'connection_error'
+            with self._lock:
+                self.errors[f'connection error: {e}'] += 1
+        latency = time.perf_counter() - due
+        with self._lock:
+            self.latencies.append(latency)
+            self.statuses[str(status)] += 1
+
+    def run(self):
+        total = int(self.rps * self.duration)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            for index in range(total):
+                due = start + index / self.rps
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self.send, index, due)
+        wall = time.perf_counter() - start
+
+        succeeded = sum(count for status, count in self.statuses.items() if status.startswith('2'))
+        return {
+            'requests': total,
+            'offered_rps': self.rps,
+            'wall_seconds': wall,
+            'throughput_rps': succeeded / wall if wall else None,
+            'succeeded': succeeded,
+            'error_rate': (total - succeeded) / total if total else None,
+            'statuses': dict(self.statuses),
+            'errors': dict(self.errors.most_common(10)),
+            'latency': summarise(self.latencies),
+        }
+
+
+def start_local_service(fake_server, pause_seconds, secret):
+    """Serves app_dual_extraction from a background thread, backed by the fake model."""
+    import logging
+    from werkzeug.serving import make_server
+    import app_dual_extraction
+    # Per-request access and warning logs would drown the report
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    logging.getLogger('aura').setLevel(logging.ERROR)
+    app_dual_extraction.store_htr_results = lambda schema: None
+    app = app_dual_extraction.app
+    app.config.update(MODEL_BACKEND='http', MODEL_BACKEND_URL=fake_server.url, GEMINI_PAUSE_SECONDS=pause_seconds,
+                      EXTRACTION_SECRET=secret)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='extraction-service', daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Base URL of a running extraction service (default: run one in-process)')
+    parser.add_argument('--rps', type=float, default=10.0, help='Requests started per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to keep sending')
+    parser.add_argument('--max-in-flight', type=int, default=1000, help='Most requests outstanding at once')
+    parser.add_argument('--mandate-file', help='Mandate Card to send (default: a generated JPEG)')
+    parser.add_argument('--id-file', help='National ID to send (default: a generated JPEG)')
+    parser.add_argument('--output', help='Write the JSON results here')
+    parser.add_argument('--secret', default=os.environ.get('AURA_EXTRACTION_SECRET', 'load-test'),
+                        help="The service's AURA_EXTRACTION_SECRET, to sign request tokens with")
+    fake = parser.add_argument_group('fake model (in-process mode only)')
+    fake.add_argument('--latency', type=float, default=1.0)
+    fake.add_argument('--jitter', type=float, default=0.0)
+    fake.add_argument('--rate-429', type=float, default=0.0)
+    fake.add_argument('--rate-5xx', type=float, default=0.0)
+    fake.add_argument('--rate-malformed', type=float, default=0.0)
+    fake.add_argument('--pause', type=float, default=0.0,
+                      help='GEMINI_PAUSE_SECONDS between the two model calls of a request')
+    args = parser.parse_args()
+
+    documents = (read_document(args.mandate_file, 1), read_document(args.id_file, 2))
+    fake_server = service = None
+    url = args.url
+    if url is None:
+        fake_server = FakeGeminiServer(FakeGemini(args.latency, args.jitter, args.rate_429, args.rate_5xx,
+                                                  args.rate_malformed)).start()
+        service, url = start_local_service(fake_server, args.pause, args.secret)
+
+    print(f'Sending {args.rps:g} requests/s for {args.duration:g}s to {url}...', file=sys.stderr)
+    try:
+        result = LoadGenerator(url, args.rps, args.duration, args.max_in_flight, documents, args.secret).run()
+        if fake_server:
+            result['model'] = dict(fake_server.fake.stats(), latency=args.latency, jitter=args.jitter,
+                                   rate_429=args.rate_429, rate_5xx=args.rate_5xx,
+                                   rate_malformed=args.rate_malformed)
+    finally:
+        if service:
+            service.shutdown()
+        if fake_server:
+            fake_server.stop()
+
+    latency = result['latency']
+    if latency['count']:
+        print(f"p50 {latency['p50']:.3f}s  p90 {latency['p90']:.3f}s  p99 {latency['p99']:.3f}s  "
+              f"throughput {result['throughput_rps']:.2f}/s  errors {result['error_rate']:.1%}", file=sys.stderr)
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Compares the browser download-and-reupload extraction flow with
+/extract_by_reference for one Mandate Card and National ID.
+
+Gemini and the database write are replaced by stubs so only the transfer
+and request handling are measured. Network time is modelled from the byte
+counts at --network-mbps, since the in-process test client has no network.
+
+    python benchmarks/extraction_transfer.py --mandate mandate.pdf --id id.jpg
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.test import EnvironBuilder
+import app_dual_extraction
+from utils.package_catalog import PackageCatalog, STATUS_CLEAN
+from utils.extraction_tokens import issue_extraction_token
+
+FAKE_FIELDS = {"fields": [{"field_name": "SURNAME", "extracted_value": "MOYO"}]}
+
+
+def _multipart_length(files):
+    """Size of the multipart body the browser would upload for these files."""
+    data = {'document_id': 'benchmark'}
+    for field, path in files.items():
+        data[field] = (open(path, 'rb'), os.path.basename(path))
+    builder = EnvironBuilder(method='POST', data=data)
+    try:
+        return int(builder.get_environ()['CONTENT_LENGTH'])
+    finally:
+        builder.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mandate', required=True, help='Mandate Card file (PDF or image)')
+    parser.add_argument('--id', required=True, help='National ID file (PDF or image)')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--network-mbps', type=float, default=20.0, help='Browser <-> server bandwidth to model')
+    parser.add_argument('--output', help='Write the JSON results here')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        package_dir = os.path.join(work_dir, 'BENCH001')
+        os.makedirs(os.path.join(package_dir, 'mandate'))
+        os.makedirs(os.path.join(package_dir, 'kyc'))
+        mandate_rel = 'mandate/' + os.path.basename(args.mandate)
+        id_rel = 'kyc/' + os.path.basename(args.id)
+        shutil.copy(args.mandate, os.path.join(package_dir, mandate_rel))
+        shutil.copy(args.id, os.path.join(package_dir, id_rel))
+
+        catalog_db = os.path.join(work_dir, 'catalog.db')
+        PackageCatalog(catalog_db).register_directory(package_dir, STATUS_CLEAN)
+
+        app = app_dual_extraction.app
+        app.config.update(CATALOG_DB=catalog_db, GEMINI_PAUSE_SECONDS=0, TESTING=True, EXTRACTION_SECRET='benchmark')
+        app_dual_extraction.gemini_extract = lambda *a, **kw: json.loads(json.dumps(FAKE_FIELDS))
+        app_dual_extraction.store_htr_results = lambda schema: None
+        client = app.test_client()
+
+        file_bytes = os.path.getsize(args.mandate) + os.path.getsize(args.id)
+        reference_body = json.dumps({'package_name': 'BENCH001', 'mandate_path': mandate_rel, 'id_path': id_rel})
+        reference_headers = {'Authorization': 'Bearer ' + issue_extraction_token('benchmark', 'BENCH001')}
+
+        legacy_latencies, reference_latencies = [], []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            # The two /view_document downloads, then the multipart re-upload
+            with open(args.mandate, 'rb') as mandate, open(args.id, 'rb') as id_file:
+                response = client.post('/extract_dual_source', data={
+                    'document_id': 'BENCH001',
+                    'mandate_file': (mandate, os.path.basename(args.mandate)),
+                    'id_file': (id_file, os.path.basename(args.id)),
+                }, headers=reference_headers)
+            legacy_latencies.append(time.perf_counter() - start)
+            assert response.status_code == 201, response.get_data(as_text=True)
+
+            start = time.perf_counter()
+            response = client.post('/extract_by_reference', data=reference_body, content_type='application/json',
+                                   headers=reference_headers)
+            reference_latencies.append(time.perf_counter() - start)
+            assert response.status_code == 201, response.get_data(as_text=True)
+
+        legacy_bytes = file_bytes + _multipart_length({'mandate_file': args.mandate, 'id_file': args.id})
+        reference_bytes = len(reference_body)
+        bytes_per_second = args.network_mbps * 1_000_000 / 8
+
+        def summarise(latencies, wire_bytes):
+            return {
+                'browser_transfer_bytes': wire_bytes,
+                'server_p50_ms': round(statistics.median(latencies) * 1000, 2),
+                'modelled_network_ms': round(wire_bytes / bytes_per_second * 1000, 2),
+                'modelled_end_to_end_ms': round((statistics.median(latencies) + wire_bytes / bytes_per_second) * 1000, 2),
+            }
+
+        results = {
+            'document_bytes': file_bytes,
+            'network_mbps': args.network_mbps,
+            'download_and_reupload': summarise(legacy_latencies, legacy_bytes),
+            'by_reference': summarise(reference_latencies, reference_bytes),
+        }
+        output = json.dumps(results, indent=2)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(output)
+        print(output)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+A local stand-in for Gemini's generateContent endpoint, for load-testing the
+extraction services without spending quota.
+
+Point a service at it with the 'http' model backend:
+
+    python benchmarks/fake_gemini.py --port 8090 --latency 1.5 --jitter 0.5 --rate-429 0.05
+    AURA_MODEL_BACKEND=http AURA_MODEL_BACKEND_URL=http://127.0.0.1:8090 python app_dual_extraction.py
+
+Every request waits --latency seconds (plus up to --jitter), then fails with
+429 or 503, answers with malformed JSON, or returns canned fields, at the
+given rates. The canned fields are chosen by the prompt: National ID prompts
+get ID fields, anything else Mandate Card fields; --fields replaces them with
+a JSON file of {"mandate": {...}, "id": {...}}. GET /stats returns the
+request counts by outcome.
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_FIELDS = {
+    'mandate': {'fields': [
+        {'field_name': 'SURNAME', 'extracted_value': 'MOYO'},
+        {'field_name': 'NAME', 'extracted_value': 'TADIWA'},
+        {'field_name': 'OCCUPATION', 'extracted_value': 'ACCOUNTANT'},
+        {'field_name': 'GROSS MONTHLY INCOME', 'extracted_value': 1850.0},
+    ]},
+    'id': {'fields': [
+        {'field_name': 'ID_NUMBER', 'extracted_value': '63-2001234-A-42'},
+        {'field_name': 'DATE_OF_BIRTH', 'extracted_value': '1988-04-12'},
+        {'field_name': 'GENDER', 'extracted_value': 'MALE'},
+        {'field_name': 'NATIONALITY', 'extracted_value': 'ZIMBABWEAN'},
+        {'field_name': 'FULL NAME', 'extracted_value': 'TADIWA MOYO'},
+    ]},
+}
+OUTCOMES = ('ok', 'rate_limited', 'server_error', 'malformed')
+
+
+class FakeGemini:
+    """Behaviour and counters shared by every request handler thread."""
+
+    def __init__(self, latency=1.0, jitter=0.0, rate_429=0.0, rate_5xx=0.0, rate_malformed=0.0, fields=None,
+                 seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rates = (('rate_limited', rate_429), ('server_error', rate_5xx), ('malformed', rate_malformed))
+        self.fields = fields or CANNED_FIELDS
+        self.counts = dict.fromkeys(OUTCOMES, 0)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def outcome(self):
+        with self._lock:
+            draw = self._random.random()
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        for outcome, rate in self.rates:
+            if draw < rate:
+                return outcome, delay
+            draw -= rate
+        return 'ok', delay
+
+    def begin(self):
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def end(self, outcome):
+        with self._lock:
+            self.in_flight -= 1
+            self.counts[outcome] += 1
+
+    def stats(self):
+        with self._lock:
+            return {'requests': dict(self.counts), 'in_flight': self.in_flight, 'peak_in_flight': self.peak_in_flight}
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self.send_json(200, self.server.fake.stats())
+        else:
+            self.send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+
+    def do_POST(self):
+        if not self.path.endswith(':generateContent'):
+            self.send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            prompt = ''.join(part.get('text', '') for part in request['contents'][0]['parts'])
+        except (ValueError, KeyError, IndexError, TypeError):
+            self.send_json(400, {'error': {'code': 400, 'message': 'Invalid request'}})
+            return
+
+        fake = self.server.fake
+        outcome, delay = fake.outcome()
+        fake.begin()
+        try:
+            time.sleep(delay)
+            if outcome == 'rate_limited':
+                self.send_json(429, {'error': {'code': 429, 'message': 'Resource has been exhausted',
+                                               'status': 'RESOURCE_EXHAUSTED'}})
+            elif outcome == 'server_error':
+                self.send_json(503, {'error': {'code': 503, 'message': 'The model is overloaded',
+                                               'status': 'UNAVAILABLE'}})
+            else:
+                fields = fake.fields['id' if 'National ID' in prompt else 'mandate']
+                text = json.dumps(fields)
+                if outcome == 'malformed':
+                    # Truncated mid-object, as when a response hits its token limit
+                    text = 'Here are the fields: ' + text[:len(text) // 2]
+                self.send_json(200, {
+                    'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'},
+                                    'finishReason': 'STOP'}],
+                    'usageMetadata': {'promptTokenCount': len(prompt) // 4 + 258,
+                                      'candidatesTokenCount': len(text) // 4},
+                })
+        finally:
+            fake.end(outcome)
+
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    """Serves a FakeGemini; port 0 picks a free port (see .url)."""
+
+    daemon_threads = True
+
+    def __init__(self, fake, host='127.0.0.1', port=0):
+        super().__init__((host, port), FakeGeminiHandler)
+        self.fake = fake
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-gemini', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=1.0, help='Seconds every call takes')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many extra seconds, uniformly')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='Fraction of calls rejected with 429')
+    parser.add_argument('--rate-5xx', type=float, default=0.0, help='Fraction of calls failing with 503')
+    parser.add_argument('--rate-malformed', type=float, default=0.0, help='Fraction of answers with broken JSON')
+    parser.add_argument('--fields', help='JSON file of canned answers: {"mandate": {...}, "id": {...}}')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    fields = None
+    if args.fields:
+        with open(args.fields) as f:
+            fields = json.load(f)
+    fake = FakeGemini(args.latency, args.jitter, args.rate_429, args.rate_5xx, args.rate_malformed, fields, args.seed)
+    server = FakeGeminiServer(fake, args.host, args.port)
+    print(f'Fake Gemini listening on {server.url}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(fake.stats()), file=sys.stderr)
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
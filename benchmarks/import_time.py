@@ -0,0 +1,91 @@
+"""
+Measures how long importing the web app takes, using Python's own
+-X importtime report from a fresh interpreter, and checks that none of the
+OCR stack is loaded until a package is actually analysed.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --module app_dual_extraction --top 25 --runs 5
+
+Exits with status 1 when the best run is over --budget milliseconds or any
+HEAVY_MODULES were imported.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded only by the workers that OCR and render documents
+HEAVY_MODULES = ('cv2', 'numpy', 'PyPDF2', 'pdf2image', 'pytesseract', 'PIL', 'fitz', 'sqlalchemy')
+# About three times a warm `import app` on a developer laptop
+DEFAULT_BUDGET_MS = 600
+
+
+def parse_importtime(stderr):
+    """
+    Turns -X importtime output into {module: (self_us, cumulative_us)}.
+    Lines look like 'import time:       312 |       1045 |   flask.json'.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header row
+        modules[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+    return modules
+
+
+def measure_import(module, cwd=ROOT_DIR):
+    """Imports module in a fresh interpreter and returns its import report."""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=cwd, capture_output=True, text=True, check=True,
+    )
+    modules = parse_importtime(completed.stderr)
+    return {
+        'module': module,
+        'total_ms': modules[module][1] / 1000,
+        'heavy_modules': sorted(
+            name for name in modules if name.split('.')[0] in HEAVY_MODULES and '.' not in name
+        ),
+        'slowest': [
+            {'module': name, 'self_ms': own / 1000, 'cumulative_ms': cumulative / 1000}
+            for name, (own, cumulative) in sorted(modules.items(), key=lambda item: -item[1][0])[:50]
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--runs', type=int, default=3, help='report the fastest of this many imports')
+    parser.add_argument('--top', type=int, default=15, help='slowest modules to list')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_MS, help='milliseconds')
+    parser.add_argument('--output', help='write the JSON results here')
+    args = parser.parse_args()
+
+    result = min((measure_import(args.module) for _ in range(max(1, args.runs))), key=lambda run: run['total_ms'])
+    result['slowest'] = result['slowest'][:args.top]
+    result['budget_ms'] = args.budget
+
+    print(f"import {args.module}: {result['total_ms']:.1f}ms (budget {args.budget:g}ms)", file=sys.stderr)
+    for entry in result['slowest']:
+        print(f"  {entry['self_ms']:8.1f}ms  {entry['cumulative_ms']:8.1f}ms  {entry['module']}", file=sys.stderr)
+    if result['heavy_modules']:
+        print(f"heavy modules imported: {', '.join(result['heavy_modules'])}", file=sys.stderr)
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+    if result['total_ms'] > args.budget or result['heavy_modules']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
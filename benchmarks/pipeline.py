@@ -0,0 +1,551 @@
+"""
+Benchmarks the document pipeline end to end on a synthetic corpus
+(benchmarks/corpus.py) and saves the results as JSON so runs can be compared.
+
+Benches, each run in a fresh subprocess so its peak memory is its own:
+
+  extract_text       extract_text_from_pdf / extract_text_from_image on every
+                     document: latency, pages per second, similarity of the
+                     text to what was rendered, and the accuracy of the field
+                     extractors on that OCR text
+  field_extractors   extract_basic_details / extract_personal_details on the
+                     clean rendered text, isolating the parsers from OCR
+  process_package    package_processor.process_package on every package:
+                     document type, account type and missing-document accuracy
+  process_packages   app.process_packages over the whole corpus: the full
+                     ingestion path including filing, the catalog and previews
+  field_confidence   the local extraction tier (utils/tiered_extraction.py) on
+                     every Mandate Card and National ID: how many fields and
+                     model calls it saves, how well its confidence separates
+                     right from wrong values, the calibrated auto-accept
+                     threshold and the review workload it removes
+
+Each bench reports latency percentiles, throughput and peak resident memory.
+OCR needs Tesseract and poppler; without them, scanned documents are counted
+as errors and the metadata records ocr_available: false.
+
+    python benchmarks/pipeline.py --packages 20 --dpi 200 --noise 0.05 --blur 0.8
+    python benchmarks/pipeline.py --corpus /tmp/corpus --benches field_extractors,process_package
+    python benchmarks/pipeline.py --compare benchmarks/results/pipeline-20261018-101500.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import difflib
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.corpus import Degradation, generate_corpus, load_ground_truth
+
+BENCHES = ('extract_text', 'field_extractors', 'process_package', 'process_packages', 'field_confidence')
+RESULTS_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'results')
+
+
+def peak_rss_bytes():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarise(latencies):
+    """Count, mean and tail percentiles of a list of latencies in seconds."""
+    values = sorted(latencies)
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values) if values else None,
+        'p50': percentile(values, 0.50),
+        'p90': percentile(values, 0.90),
+        'p95': percentile(values, 0.95),
+        'p99': percentile(values, 0.99),
+        'max': values[-1] if values else None,
+    }
+
+
+def normalise(value):
+    return ' '.join(str(value).split()).casefold() if value is not None else None
+
+
+def similarity(expected, actual):
+    """How closely extracted text matches the rendered text, from 0 to 1, ignoring case and spacing."""
+    return difflib.SequenceMatcher(None, normalise(expected), normalise(actual), autojunk=False).ratio()
+
+
+class FieldAccuracy:
+    """Per-field counts of exact matches (after normalise) against ground truth."""
+
+    def __init__(self):
+        self.fields = {}
+        self.errors = 0
+
+    def add(self, expected_fields, extracted):
+        for name, expected in expected_fields.items():
+            counts = self.fields.setdefault(name, {'correct': 0, 'total': 0})
+            counts['total'] += 1
+            if extracted is not None and normalise(extracted.get(name)) == normalise(expected):
+                counts['correct'] += 1
+
+    def result(self):
+        correct = sum(counts['correct'] for counts in self.fields.values())
+        total = sum(counts['total'] for counts in self.fields.values())
+        return {
+            'accuracy': correct / total if total else None,
+            'errors': self.errors,
+            'fields': {
+                name: dict(counts, accuracy=counts['correct'] / counts['total'])
+                for name, counts in sorted(self.fields.items())
+            },
+        }
+
+
+def extractor_functions():
+    from utils.document_processor import extract_basic_details, extract_personal_details
+    return {'basic_details': extract_basic_details, 'personal_details': extract_personal_details}
+
+
+def run_extractor(extractors, document, text, accuracy):
+    try:
+        extracted = extractors[document['extractor']](text)
+    except Exception:
+        accuracy.errors += 1
+        extracted = None
+    accuracy.add(document['fields'], extracted)
+
+
+def documents_of(truth):
+    for package in truth['packages']:
+        for document in package['documents']:
+            yield package, document
+
+
+def bench_extract_text(corpus_dir, truth):
+    from utils.document_processor import extract_text_from_pdf, extract_text_from_image
+    extractors = extractor_functions()
+    accuracy = FieldAccuracy()
+    latencies, pages, errors = [], 0, 0
+    by_format = {}
+
+    started = time.perf_counter()
+    for package, document in documents_of(truth):
+        path = os.path.join(corpus_dir, 'packages', package['package'], document['path'])
+        extract = extract_text_from_pdf if path.endswith('.pdf') else extract_text_from_image
+        start = time.perf_counter()
+        try:
+            text = extract(path)
+        except Exception:
+            text = None
+        elapsed = time.perf_counter() - start
+        latencies.append(elapsed)
+
+        entry = by_format.setdefault(document['format'], {'latencies': [], 'similarity': [], 'errors': 0})
+        entry['latencies'].append(elapsed)
+        if text is None:
+            errors += 1
+            entry['errors'] += 1
+            continue
+        pages += document['pages']
+        entry['similarity'].append(similarity(document['text'], text))
+        if document['extractor']:
+            run_extractor(extractors, document, text, accuracy)
+    wall = time.perf_counter() - started
+
+    return {
+        'documents': len(latencies),
+        'errors': errors,
+        'wall_seconds': wall,
+        'documents_per_second': len(latencies) / wall if wall else None,
+        'pages_per_second': pages / wall if wall else None,
+        'latency': summarise(latencies),
+        'formats': {
+            fmt: {
+                'documents': len(entry['latencies']),
+                'errors': entry['errors'],
+                'latency': summarise(entry['latencies']),
+                'text_similarity': (sum(entry['similarity']) / len(entry['similarity'])
+                                    if entry['similarity'] else None),
+            }
+            for fmt, entry in sorted(by_format.items())
+        },
+        'field_accuracy': accuracy.result(),
+    }
+
+
+def bench_field_extractors(corpus_dir, truth, repeat=20):
+    extractors = extractor_functions()
+    results = {}
+    for name in extractors:
+        documents = [document for _, document in documents_of(truth) if document['extractor'] == name]
+        accuracy = FieldAccuracy()
+        for document in documents:
+            run_extractor(extractors, document, document['text'], accuracy)
+
+        # The parsers take microseconds, so each document is timed over several calls
+        latencies = []
+        for document in documents:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                try:
+                    extractors[name](document['text'])
+                except Exception:
+                    pass
+            latencies.append((time.perf_counter() - start) / repeat)
+        total = sum(latencies)
+        results[name] = {
+            'documents': len(documents),
+            'documents_per_second': len(documents) / total if total else None,
+            'latency': summarise(latencies),
+            'field_accuracy': accuracy.result(),
+        }
+    return results
+
+
+def bench_process_package(corpus_dir, truth):
+    from utils.ingestion import gather_package_files
+    from utils.package_processor import process_package
+
+    latencies, documents = [], 0
+    types = {'correct': 0, 'total': 0}
+    account_types = missing = errors = 0
+    stage_seconds = {}
+
+    started = time.perf_counter()
+    for package in truth['packages']:
+        package_dir = os.path.join(corpus_dir, 'packages', package['package'])
+        files = sorted(gather_package_files(package_dir))
+        start = time.perf_counter()
+        try:
+            report = process_package(files)
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        documents += len(files)
+
+        for stage_name, seconds in report['timings'].items():
+            stage_seconds[stage_name] = stage_seconds.get(stage_name, 0.0) + seconds
+        expected_types = {document['path'].split('/')[-1]: document['identified_type']
+                          for document in package['documents']}
+        for document_report in report['documents']:
+            types['total'] += 1
+            if expected_types.get(document_report['original_name']) == document_report['identified_type']:
+                types['correct'] += 1
+        account_types += report['account_type'] == package['account_type']
+        missing += sorted(report['missing_documents']) == package['missing_documents']
+    wall = time.perf_counter() - started
+
+    processed = len(latencies)
+    return {
+        'packages': len(truth['packages']),
+        'errors': errors,
+        'wall_seconds': wall,
+        'packages_per_second': processed / wall if wall else None,
+        'documents_per_second': documents / wall if wall else None,
+        'latency': summarise(latencies),
+        'stage_seconds': stage_seconds,
+        'accuracy': {
+            'document_type': types['correct'] / types['total'] if types['total'] else None,
+            'account_type': account_types / processed if processed else None,
+            'missing_documents': missing / processed if processed else None,
+        },
+    }
+
+
+def bench_process_packages(corpus_dir, truth):
+    from app import app, process_packages, get_catalog
+
+    work_dir = tempfile.mkdtemp(prefix='aura-bench-')
+    try:
+        app.config.update({
+            'PACKAGES_DIR': os.path.join(work_dir, 'packages_to_process'),
+            'CLEAN_DIR': os.path.join(work_dir, 'clean_packages'),
+            'FLAGGED_DIR': os.path.join(work_dir, 'flagged_for_review'),
+            'CATALOG_DB': os.path.join(work_dir, 'aura_catalog.db'),
+            'JOB_QUEUE_DB': os.path.join(work_dir, 'aura_jobs.db'),
+            'BLOB_DIR': os.path.join(work_dir, 'blob_store'),
+            'PREVIEW_DIR': os.path.join(work_dir, 'preview_cache'),
+            'INGESTION_WORKERS': 0,
+        })
+        for key in ('CLEAN_DIR', 'FLAGGED_DIR'):
+            os.makedirs(app.config[key], exist_ok=True)
+        shutil.copytree(os.path.join(corpus_dir, 'packages'), app.config['PACKAGES_DIR'])
+
+        start = time.perf_counter()
+        processed = process_packages()
+        wall = time.perf_counter() - start
+
+        statuses = {}
+        for package in truth['packages']:
+            record = get_catalog().get(package['package'])
+            status = record['status'] if record else 'MISSING'
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'packages': processed,
+        'wall_seconds': wall,
+        'packages_per_second': processed / wall if wall else None,
+        'mean_package_seconds': wall / processed if processed else None,
+        'statuses': statuses,
+    }
+
+
+# Ground truth keys of the extraction fields the corpus records
+TRUTH_FIELDS = {
+    'mandate_card': ('mandate', {'OCCUPATION': 'profession', 'GROSS MONTHLY INCOME': 'monthly_salary'}),
+    'national_id': ('id', {
+        'FULL NAME': 'full_name', 'ID_NUMBER': 'id_number', 'DATE_OF_BIRTH': 'date_of_birth', 'GENDER': 'gender',
+        'NATIONALITY': 'nationality', 'ISSUE DATE': 'issue_date',
+    }),
+}
+
+
+def first_page_image(data, mime_type):
+    """The first page of a PDF as JPEG bytes, as the extraction service rasterises it; images pass through."""
+    if mime_type != 'application/pdf':
+        return data
+    import fitz
+    with fitz.open(stream=data, filetype='pdf') as document:
+        return document.load_page(0).get_pixmap(dpi=200).tobytes('jpeg')
+
+
+def bench_field_confidence(corpus_dir, truth, target_precision=0.98, threshold=0.9):
+    import mimetypes
+    from utils.tiered_extraction import read_document_fields, unresolved_fields, field_names
+    from utils.confidence import calibrate_threshold, review_workload
+
+    samples, latencies = [], []
+    fields_total = fields_unresolved = model_calls = 0
+    by_field = {}
+    for package, document in documents_of(truth):
+        if document['document'] not in TRUTH_FIELDS:
+            continue
+        kind, truth_keys = TRUTH_FIELDS[document['document']]
+        path = os.path.join(corpus_dir, 'packages', package['package'], document['path'])
+        mime_type = mimetypes.guess_type(path)[0]
+        with open(path, 'rb') as f:
+            data = f.read()
+        start = time.perf_counter()
+        local = read_document_fields(data, mime_type, first_page_image(data, mime_type), kind)
+        latencies.append(time.perf_counter() - start)
+
+        unresolved = unresolved_fields(kind, local, threshold)
+        fields_total += len(field_names(kind))
+        fields_unresolved += len(unresolved)
+        model_calls += bool(unresolved)
+        for name, key in truth_keys.items():
+            value, confidence = local.get(name, (None, 0.0))
+            correct = value is not None and normalise(value) == normalise(document['fields'][key])
+            samples.append((confidence, correct))
+            counts = by_field.setdefault(name, {'read': 0, 'correct': 0, 'total': 0})
+            counts['total'] += 1
+            counts['read'] += value is not None
+            counts['correct'] += correct
+
+    calibrated = calibrate_threshold(samples, target_precision)
+    documents = len(latencies)
+    return {
+        'documents': documents,
+        'latency': summarise(latencies),
+        'model_calls': {
+            'documents': documents,
+            'calls': model_calls,
+            'calls_saved': 1 - model_calls / documents if documents else None,
+            'fields_sent': fields_unresolved,
+            'fields_saved': 1 - fields_unresolved / fields_total if fields_total else None,
+        },
+        'fields': by_field,
+        'target_precision': target_precision,
+        'review_at_threshold': review_workload(samples, threshold),
+        'review_at_calibrated_threshold': review_workload(samples, calibrated),
+    }
+
+
+def run_single(name, corpus_dir):
+    """Runs one bench in this process and prints its result as JSON."""
+    # package_processor reads config.json from the working directory
+    os.chdir(ROOT_DIR)
+    import logging
+    logging.getLogger('aura').setLevel(logging.ERROR)
+    truth = load_ground_truth(corpus_dir)
+    baseline = peak_rss_bytes()
+    result = globals()[f'bench_{name}'](corpus_dir, truth)
+    result['peak_rss_bytes'] = peak_rss_bytes()
+    result['baseline_rss_bytes'] = baseline
+    print(json.dumps(result))
+
+
+def run_bench(name, corpus_dir):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--single', name, '--corpus', corpus_dir],
+        capture_output=True, text=True,
+    )
+    if output.returncode != 0:
+        return {'error': output.stderr.strip().splitlines()[-1] if output.stderr.strip() else 'failed'}
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def ocr_available():
+    try:
+        import pytesseract
+        import utils.document_processor  # noqa: F401 (configures the Tesseract path)
+        pytesseract.get_tesseract_version()
+    except Exception:
+        return False
+    return shutil.which('pdftoppm') is not None
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(result, prefix=''):
+    """{'a': {'b': 1}} -> {'a.b': 1}, keeping only numbers."""
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def compare(previous, current):
+    """Prints every numeric result that changed between two runs."""
+    before = flatten(previous['benches'])
+    after = flatten(current['benches'])
+    print(f"\nCompared with {previous['metadata'].get('commit') or 'previous run'} "
+          f"({previous['metadata'].get('started_at')}):")
+    for key in sorted(set(before) & set(after)):
+        old, new = before[key], after[key]
+        if old == new:
+            continue
+        change = f'{(new - old) / old * 100:+.1f}%' if old else 'new'
+        print(f'  {key:<60} {old:>14.4f} -> {new:>14.4f}  {change}')
+
+
+def print_summary(results):
+    for name, result in results['benches'].items():
+        if 'error' in result:
+            print(f'{name:<18} FAILED: {result["error"]}')
+            continue
+        latency = result.get('latency', {})
+        line = f'{name:<18}'
+        if latency.get('p50') is not None:
+            line += f' p50 {latency["p50"] * 1000:9.2f}ms  p95 {latency["p95"] * 1000:9.2f}ms'
+        for key in ('documents_per_second', 'packages_per_second'):
+            if result.get(key) is not None:
+                line += f'  {result[key]:8.2f} {key.split("_")[0]}/s'
+        line += f'  peak RSS {result["peak_rss_bytes"] / 2 ** 20:7.1f}MiB'
+        print(line)
+        if 'field_accuracy' in result and result['field_accuracy']['accuracy'] is not None:
+            print(f'{"":<18} field accuracy {result["field_accuracy"]["accuracy"]:.1%}')
+        for extractor in ('basic_details', 'personal_details'):
+            if extractor in result:
+                accuracy = result[extractor]['field_accuracy']
+                print(f'{"":<18} {extractor}: field accuracy {accuracy["accuracy"] or 0:.1%},'
+                      f' {accuracy["errors"]} errors, {result[extractor]["documents_per_second"] or 0:.0f} docs/s')
+        if 'review_at_calibrated_threshold' in result:
+            review = result['review_at_calibrated_threshold']
+            print(f'{"":<18} model calls saved {result["model_calls"]["calls_saved"] or 0:.1%},'
+                  f' fields saved {result["model_calls"]["fields_saved"] or 0:.1%};'
+                  f' calibrated threshold {review["threshold"]} removes'
+                  f' {review["review_reduction"] or 0:.1%} of field reviews')
+        if 'accuracy' in result:
+            print(f'{"":<18} ' + ', '.join(f'{key} {value:.1%}' for key, value in result['accuracy'].items()
+                                            if value is not None))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help='existing corpus directory (default: generate one in a temporary directory)')
+    parser.add_argument('--benches', default=','.join(BENCHES))
+    parser.add_argument('--packages', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--dpi', type=int, default=200)
+    parser.add_argument('--noise', type=float, default=0.0)
+    parser.add_argument('--blur', type=float, default=0.0)
+    parser.add_argument('--skew', type=float, default=0.0)
+    parser.add_argument('--output', help='results file (default: benchmarks/results/pipeline-<timestamp>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare this run with')
+    parser.add_argument('--single', choices=BENCHES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run_single(args.single, args.corpus)
+        return
+
+    benches = [name.strip() for name in args.benches.split(',') if name.strip()]
+    unknown = set(benches) - set(BENCHES)
+    if unknown:
+        parser.error(f'unknown benches: {", ".join(sorted(unknown))}')
+
+    temp_dir = None
+    corpus_dir = os.path.abspath(args.corpus) if args.corpus else None
+    if corpus_dir is None:
+        temp_dir = corpus_dir = tempfile.mkdtemp(prefix='aura-corpus-')
+        degradation = Degradation(dpi=args.dpi, noise=args.noise, blur=args.blur, skew=args.skew)
+        print(f'Generating {args.packages} packages in {corpus_dir}...')
+        generate_corpus(corpus_dir, args.packages, args.seed, degradation)
+    truth = load_ground_truth(corpus_dir)
+
+    started_at = datetime.now()
+    results = {
+        'metadata': {
+            'started_at': started_at.isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'ocr_available': ocr_available(),
+            'corpus': {key: truth[key] for key in ('seed', 'degradation', 'company_ratio', 'missing_ratio',
+                                                   'bundle_ratio')},
+            'packages': len(truth['packages']),
+            'documents': sum(len(package['documents']) for package in truth['packages']),
+        },
+        'benches': {},
+    }
+    if not results['metadata']['ocr_available']:
+        print('Tesseract or poppler not found: scanned documents will be counted as errors.')
+    try:
+        for name in benches:
+            print(f'Running {name}...')
+            results['benches'][name] = run_bench(name, corpus_dir)
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, f'pipeline-{started_at:%Y%m%d-%H%M%S}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print()
+    print_summary(results)
+    print(f'\nResults written to {output}')
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
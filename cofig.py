@@ -6,7 +6,8 @@ class Config:
     
     # File Upload Configuration
     UPLOAD_FOLDER = 'static/uploads'
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB max per uploaded file
+    MAX_CONTENT_LENGTH = 64 * 1024 * 1024  # 64MB max per upload request (a whole package)
     ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
     
     # Database Configuration (add if needed)
@@ -4,9 +4,10 @@ from typing import List, Optional
 class ExtractedField(BaseModel):
     field_name: str = Field(...)
     extracted_value: Optional[str] = None
-    confidence_score: float = Field(default=0.99)
+    confidence_score: float = Field(default=0.0)  # unscored fields are always reviewed
     is_corrected: bool = Field(default=False)
     corrected_value: Optional[str]
+    source: Optional[str] = None  # 'local' (OCR), 'gemini' or 'duplicate' (copied from the same document in another package)
 
 class HTRSchema(BaseModel):
     document_id: str = Field(...)
@@ -11,7 +11,7 @@ class HTRResult(db.Model):
     source_type = db.Column(db.String(32), nullable=False)  # 'MANDATE_CARD' or 'NATIONAL_ID'
     field_name = db.Column(db.String(64), nullable=False)
     extracted_value = db.Column(db.Text)
-    confidence_score = db.Column(db.Float, default=0.99)
+    confidence_score = db.Column(db.Float, default=0.0)
     is_corrected = db.Column(db.Boolean, default=False)
     corrected_value = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,67 @@
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from utils.active_learning import LabelQueue, CONFIDENT_GROUP, apply_htr_results, apply_document_extractions
+
+
+def htr_row(document_id, field_name, confidence, source_type='MANDATE_CARD', is_corrected=False):
+    return SimpleNamespace(document_id=document_id, source_type=source_type, field_name=field_name,
+                           confidence_score=confidence, is_corrected=is_corrected)
+
+
+class LabelQueueTestCase(unittest.TestCase):
+
+    def test_most_uncertain_first(self):
+        queue = LabelQueue(decay=1.0)
+        queue.update('a', 'ID_CARD', {'GENDER': 0.95, 'ID_NUMBER': 0.2})
+        queue.update('b', 'ID_CARD', {'GENDER': 0.99, 'ID_NUMBER': 0.98})
+        queue.update('c', 'ID_CARD', {'GENDER': None, 'ID_NUMBER': 0.1})
+        self.assertEqual([entry['document_id'] for entry in queue.top(3)], ['c', 'a', 'b'])
+        self.assertEqual(queue.top(3)[1]['uncertainty'], 0.425)
+        self.assertEqual(queue.top(3)[2]['group'], CONFIDENT_GROUP)
+        self.assertEqual(len(queue.top(1)), 1)
+
+    def test_updates_rescore_only_that_document(self):
+        queue = LabelQueue(decay=1.0)
+        queue.update('a', 'MANDATE_CARD', {'NAME': 0.3})
+        queue.update('b', 'MANDATE_CARD', {'NAME': 0.5})
+        queue.update('a', 'ID_CARD', {'GENDER': 0.99})
+        queue.update('a', 'MANDATE_CARD', {'NAME': 0.97})
+        self.assertEqual([entry['document_id'] for entry in queue.top(2)], ['b', 'a'])
+
+        queue.mark_labelled('b')
+        queue.update('b', 'MANDATE_CARD', {'NAME': 0.0})
+        self.assertEqual([entry['document_id'] for entry in queue.top(5)], ['a'])
+        self.assertEqual(queue.stats()['labelled'], 1)
+
+    def test_diversity_across_groups(self):
+        queue = LabelQueue(decay=0.5)
+        for index in range(3):
+            queue.update(f'name{index}', 'MANDATE_CARD', {'NAME': 0.2 + index * 0.01, 'OCCUPATION': 0.99})
+        queue.update('income', 'MANDATE_CARD', {'NAME': 0.99, 'GROSS MONTHLY INCOME': 0.5})
+        # The second NAME document is halved within the batch, so the income one comes before it
+        self.assertEqual([entry['document_id'] for entry in queue.top(3)], ['name0', 'income', 'name1'])
+
+        # Labels already given in the NAME group push its documents back further
+        queue.mark_labelled('name0')
+        queue.mark_labelled('name1')
+        self.assertEqual(queue.top(1)[0]['document_id'], 'income')
+
+    def test_apply_database_rows(self):
+        queue = LabelQueue()
+        apply_htr_results(queue, [htr_row('1', 'NAME', 0.4), htr_row('1', 'SURNAME', 0.9),
+                                  htr_row('2', 'NAME', 0.6), htr_row('3', 'NAME', 0.1)])
+        apply_htr_results(queue, [htr_row('3', 'NAME', 0.1, is_corrected=True)])
+        self.assertEqual([entry['document_id'] for entry in queue.top(5)], ['2', '1'])
+
+        apply_document_extractions(queue, [
+            SimpleNamespace(document_id='4', gt_updated_at=None),
+            SimpleNamespace(document_id='1', gt_updated_at=None),
+            SimpleNamespace(document_id='2', gt_updated_at=datetime(2026, 1, 1)),
+        ])
+        self.assertEqual([entry['document_id'] for entry in queue.top(5)], ['4', '1'])
+        self.assertEqual(queue.top(1)[0]['uncertainty'], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
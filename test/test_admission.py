@@ -0,0 +1,98 @@
+import os
+import time
+import unittest
+import tempfile
+import shutil
+import threading
+from utils.admission import AdmissionController, estimate_package_cost, SMALL_LANE, LARGE_LANE
+
+MB = 1024 * 1024
+
+class AdmissionControllerTestCase(unittest.TestCase):
+
+    def test_budget_is_never_exceeded(self):
+        """Concurrent jobs never hold more memory or CPU slots than configured."""
+        controller = AdmissionController(400 * MB, cpu_slots=3, large_lane_limit=1)
+        peaks = {'memory': 0, 'cpu': 0, 'large': 0}
+        lock = threading.Lock()
+
+        def job(cost):
+            with controller.admit(cost):
+                snapshot = controller.snapshot()
+                with lock:
+                    peaks['memory'] = max(peaks['memory'], snapshot['memory_in_use'])
+                    peaks['cpu'] = max(peaks['cpu'], snapshot['cpu_in_use'])
+                    peaks['large'] = max(peaks['large'], snapshot['lane_active'][LARGE_LANE])
+                time.sleep(0.01)
+
+        costs = [{'memory_bytes': 150 * MB, 'lane': SMALL_LANE}] * 10 + \
+                [{'memory_bytes': 900 * MB, 'lane': LARGE_LANE}] * 3
+        threads = [threading.Thread(target=job, args=(cost,)) for cost in costs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertLessEqual(peaks['memory'], 400 * MB)
+        self.assertLessEqual(peaks['cpu'], 3)
+        self.assertEqual(peaks['large'], 1)
+        self.assertEqual(controller.snapshot()['memory_in_use'], 0)
+
+    def test_small_jobs_admitted_while_large_lane_is_busy(self):
+        """A large job only takes the large lane's share of the budget."""
+        controller = AdmissionController(400 * MB, cpu_slots=4, large_lane_limit=1, large_memory_fraction=0.5)
+        with controller.admit({'memory_bytes': 180 * MB, 'lane': LARGE_LANE}):
+            with controller.admit({'memory_bytes': 150 * MB, 'lane': SMALL_LANE}, timeout=0.1):
+                self.assertEqual(controller.snapshot()['memory_in_use'], 330 * MB)
+
+    def test_oversized_job_waits_for_an_idle_controller_and_runs_alone(self):
+        """A job estimated above its lane's share holds the whole budget, and later jobs queue behind it."""
+        controller = AdmissionController(400 * MB, cpu_slots=4, large_lane_limit=1, large_memory_fraction=0.5)
+        oversized = {'memory_bytes': 5000 * MB, 'lane': LARGE_LANE}
+        small = {'memory_bytes': 50 * MB, 'lane': SMALL_LANE}
+        running = threading.Event()
+        release = threading.Event()
+
+        def run_oversized():
+            with controller.admit(oversized):
+                running.set()
+                release.wait(5)
+
+        with controller.admit(small):
+            thread = threading.Thread(target=run_oversized)
+            thread.start()
+            self.assertFalse(running.wait(0.1))
+            # Nothing jumps ahead of the waiting job
+            with self.assertRaises(TimeoutError):
+                with controller.admit(small, timeout=0.1):
+                    pass
+        self.assertTrue(running.wait(5))
+        self.assertEqual(controller.snapshot()['memory_in_use'], 400 * MB)
+        with self.assertRaises(TimeoutError):
+            with controller.admit(small, timeout=0.1):
+                pass
+        release.set()
+        thread.join()
+        with controller.admit(small, timeout=0.1):
+            self.assertEqual(controller.snapshot()['memory_in_use'], 50 * MB)
+
+    def test_many_page_package_routed_to_large_lane(self):
+        """Packages are routed by estimated page count."""
+        test_dir = tempfile.mkdtemp()
+        try:
+            from PIL import Image
+            pages = [Image.new('RGB', (200, 300), 'white') for _ in range(12)]
+            pdf_path = os.path.join(test_dir, 'statement.pdf')
+            pages[0].save(pdf_path, save_all=True, append_images=pages[1:])
+            image_path = os.path.join(test_dir, 'id.png')
+            pages[0].save(image_path)
+
+            self.assertEqual(estimate_package_cost([image_path])['lane'], SMALL_LANE)
+            cost = estimate_package_cost([pdf_path, image_path])
+            self.assertEqual(cost['pages'], 13)
+            self.assertEqual(cost['lane'], LARGE_LANE)
+        finally:
+            shutil.rmtree(test_dir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,12 @@
 import os
 import unittest
 import tempfile
+import io
+import json
 import shutil
-from app import app, users
+from unittest import mock
+from app import app, users, get_catalog, process_packages, enqueue_package, create_app
+from utils.extraction_tokens import token_package
 
 class AuraTestCase(unittest.TestCase):
 
@@ -17,6 +21,14 @@ class AuraTestCase(unittest.TestCase):
         app.config['PACKAGES_DIR'] = os.path.join(self.test_dir, 'packages_to_process')
         app.config['CLEAN_DIR'] = os.path.join(self.test_dir, 'clean_packages')
         app.config['FLAGGED_DIR'] = os.path.join(self.test_dir, 'flagged_for_review')
+        app.config['CATALOG_DB'] = os.path.join(self.test_dir, 'aura_catalog.db')
+        app.config['JOB_QUEUE_DB'] = os.path.join(self.test_dir, 'aura_jobs.db')
+        app.config['BLOB_DIR'] = os.path.join(self.test_dir, 'blob_store')
+        app.config['MAX_FILE_SIZE'] = 16 * 1024 * 1024
+        app.config['PREVIEW_DIR'] = os.path.join(self.test_dir, 'preview_cache')
+        app.config['DOCUMENT_SENDFILE_MODE'] = None
+        app.config['DOCUMENT_ACCEL_ROOT'] = self.test_dir
+        app.config['INGESTION_WORKERS'] = 0
 
         os.makedirs(app.config['PACKAGES_DIR'], exist_ok=True)
         os.makedirs(app.config['CLEAN_DIR'], exist_ok=True)
@@ -25,7 +37,7 @@ class AuraTestCase(unittest.TestCase):
         # Log in the CPC user
         with self.app as client:
             with client.session_transaction() as sess:
-                sess['user_id'] = users['cpc_user'].id
+                sess['_user_id'] = users['cpc_user'].id
                 sess['_fresh'] = True
 
     def tearDown(self):
@@ -47,15 +59,24 @@ class AuraTestCase(unittest.TestCase):
         with open(os.path.join(package_path, 'document1.pdf'), 'w') as f:
             f.write('dummy content')
 
-        # Process the package
+        # Viewing the dashboard must not process packages itself
+        response = self.app.get('/dashboard', follow_redirects=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(package_name, os.listdir(app.config['PACKAGES_DIR']))
+
+        # Process the package as the ingestion workers would
+        process_packages()
         response = self.app.get('/dashboard', follow_redirects=True)
         self.assertEqual(response.status_code, 200)
 
         # Check that the package is no longer in the processing directory
         self.assertNotIn(package_name, os.listdir(app.config['PACKAGES_DIR']))
 
-        # Check that the package is in the clean directory
-        self.assertIn(package_name, os.listdir(app.config['CLEAN_DIR']))
+        # The dummy document cannot be read as a PDF or an image, so the
+        # package is filed for review rather than as clean
+        self.assertIn(package_name, os.listdir(app.config['FLAGGED_DIR']))
+        self.assertNotIn(package_name, os.listdir(app.config['CLEAN_DIR']))
+        self.assertEqual(get_catalog().get(package_name)['status'], 'FLAGGED_FOR_REVIEW')
 
         # Check that the package is displayed on the dashboard
         self.assertIn(bytes(package_name, 'utf-8'), response.data)
@@ -86,5 +107,294 @@ class AuraTestCase(unittest.TestCase):
         self.assertIn(bytes(kyc_doc_name, 'utf-8'), response.data)
         self.assertIn(bytes(mandate_doc_name, 'utf-8'), response.data)
 
+    def test_package_detail_hands_out_a_package_token(self):
+        """The page carries a token the extraction service accepts for this package only."""
+        package_name = '987654321'
+        os.makedirs(os.path.join(app.config['CLEAN_DIR'], package_name, 'kyc'))
+        with mock.patch.dict(app.config, EXTRACTION_SECRET='test-secret'):
+            page = self.app.get(f'/package/{package_name}').get_data(as_text=True)
+        token = page.split("const extractionToken = '", 1)[1].split("'", 1)[0]
+        self.assertEqual(token_package('test-secret', token, 60), package_name)
+
+    def test_dashboard_lists_packages_from_catalog(self):
+        """Test that the dashboard is answered from the catalog rather than the directories."""
+        package_name = '555000111'
+        get_catalog().upsert(
+            package_name,
+            'FLAGGED_FOR_REVIEW',
+            os.path.join(app.config['FLAGGED_DIR'], package_name),
+            files=['kyc/id.pdf'],
+            package_info={'account_name': 'Catalog Only', 'branch_name': 'Harare', 'account_type': 'INDIVIDUAL'}
+        )
+
+        response = self.app.get('/dashboard', follow_redirects=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(bytes(package_name, 'utf-8'), response.data)
+        self.assertIn(b'Catalog Only', response.data)
+
+    def test_submit_and_delete_removes_catalog_entry(self):
+        """Test that submitting a package removes both its directory and its catalog entry."""
+        package_name = '444000222'
+        package_path = os.path.join(app.config['CLEAN_DIR'], package_name)
+        os.makedirs(os.path.join(package_path, 'kyc'))
+        with open(os.path.join(package_path, 'kyc', 'id.pdf'), 'w') as f:
+            f.write('dummy content')
+        get_catalog().register_directory(package_path, 'CLEAN_FOR_PROCESSING')
+
+        response = self.app.post(f'/submit_and_delete_package/{package_name}')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(os.path.exists(package_path))
+        self.assertIsNone(get_catalog().get(package_name))
+
+    def test_package_status_reports_queued_package(self):
+        """Test that a queued package exposes its status until a worker picks it up."""
+        package_name = '333000444'
+        package_path = os.path.join(app.config['PACKAGES_DIR'], package_name)
+        os.makedirs(package_path)
+        with open(os.path.join(package_path, 'document1.pdf'), 'w') as f:
+            f.write('dummy content')
+        get_catalog().register_directory(package_path, 'RECEIVED')
+        enqueue_package(package_name)
+
+        response = self.app.get(f'/package/{package_name}/status')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['status'], 'QUEUED')
+        self.assertEqual(response.json['job']['status'], 'queued')
+
+        process_packages()
+        response = self.app.get(f'/package/{package_name}/status')
+        self.assertIn(response.json['status'], ('CLEAN_FOR_PROCESSING', 'FLAGGED_FOR_REVIEW'))
+        self.assertEqual(response.json['job']['status'], 'done')
+
+        # Only CPC users may follow a package through the pipeline
+        self.login_branch_user()
+        self.assertEqual(self.app.get(f'/package/{package_name}/status').status_code, 403)
+
+    def test_create_app_can_start_ingestion_workers(self):
+        """Test that the web app starts its own ingestion workers only when configured to."""
+        with mock.patch('app.start_ingestion_workers') as start:
+            create_app({'START_INGESTION_WORKERS': False})
+            start.assert_not_called()
+            started = create_app({'START_INGESTION_WORKERS': True})
+        start.assert_called_once_with(started)
+
+    def test_document_previews(self):
+        """Test that the viewer gets page previews and thumbnails instead of the original."""
+        from PIL import Image
+        package_name = '555000111'
+        package_path = os.path.join(app.config['CLEAN_DIR'], package_name)
+        os.makedirs(os.path.join(package_path, 'kyc'))
+        Image.new('RGB', (2000, 2800), 'white').save(os.path.join(package_path, 'kyc', 'id.png'))
+        get_catalog().register_directory(package_path, 'CLEAN_FOR_PROCESSING')
+
+        info = self.app.get(f'/preview/{package_name}/kyc/id.png/info').json
+        self.assertEqual(info['pages'], 1)
+        self.assertEqual(info['original_url'], f'/view_document/{package_name}/kyc/id.png')
+
+        response = self.app.get(info['page_urls'][0])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertEqual(self.app.get(info['thumbnail_url']).status_code, 200)
+        self.assertEqual(self.app.get(f'/preview/{package_name}/../secret.png').status_code, 404)
+
+        stats = self.app.get('/previews/stats').json
+        self.assertGreaterEqual(stats['previews_generated'], 2)
+
+    def make_clean_package(self, package_name, content=b'%PDF-1.4 dummy content'):
+        package_path = os.path.join(app.config['CLEAN_DIR'], package_name)
+        os.makedirs(os.path.join(package_path, 'kyc'))
+        with open(os.path.join(package_path, 'kyc', 'id.pdf'), 'wb') as f:
+            f.write(content)
+        get_catalog().register_directory(package_path, 'CLEAN_FOR_PROCESSING')
+        return package_path
+
+    def test_view_document_revalidates_with_etag(self):
+        """Test that reopening a document returns 304 and PDF viewers can request ranges."""
+        self.make_clean_package('666000111')
+        url = '/view_document/666000111/kyc/id.pdf'
+
+        response = self.app.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertEqual(response.headers['Cache-Control'], 'private, no-cache')
+
+        self.assertEqual(self.app.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+        response = self.app.get(url, headers={'Range': 'bytes=0-7'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, b'%PDF-1.4')
+
+    def test_view_document_offloads_to_nginx(self):
+        """Test that the x-accel-redirect mode leaves the transfer to the proxy."""
+        package_path = self.make_clean_package('666000222')
+        app.config['DOCUMENT_SENDFILE_MODE'] = 'x-accel-redirect'
+        response = self.app.get('/view_document/666000222/kyc/id.pdf')
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['X-Accel-Redirect'],
+                         '/protected-documents/clean_packages/666000222/kyc/id.pdf')
+        self.assertEqual(response.mimetype, 'application/pdf')
+        self.assertTrue(os.path.exists(os.path.join(package_path, 'kyc', 'id.pdf')))
+
+    def test_view_document_rejects_path_traversal(self):
+        self.make_clean_package('666000333')
+        with open(os.path.join(app.config['CLEAN_DIR'], 'secret.pdf'), 'w') as f:
+            f.write('outside the package')
+        response = self.app.get('/view_document/666000333/kyc/..%2F..%2Fsecret.pdf')
+        self.assertEqual(response.status_code, 403)
+
+    def login_branch_user(self):
+        with self.app.session_transaction() as sess:
+            sess['_user_id'] = users['branch_user'].id
+
+    def upload(self, account_no, content):
+        return self.app.post('/upload', data={
+            'account_no': account_no,
+            'account_name': 'Test Account',
+            'branch_name': 'Harare',
+            'account_type': 'INDIVIDUAL',
+            'kyc_docs': (io.BytesIO(content), 'id.pdf'),
+        }, content_type='multipart/form-data')
+
+    def test_upload_hashes_and_deduplicates_files(self):
+        """Test that repeated uploads of the same scan share one stored copy."""
+        self.login_branch_user()
+        self.upload('111000111', b'identical scan')
+        self.upload('111000222', b'identical scan')
+
+        first = os.path.join(app.config['PACKAGES_DIR'], '111000111', 'kyc', 'id.pdf')
+        second = os.path.join(app.config['PACKAGES_DIR'], '111000222', 'kyc', 'id.pdf')
+        self.assertTrue(os.path.samefile(first, second))
+        with open(os.path.join(app.config['PACKAGES_DIR'], '111000222', 'package_info.json')) as f:
+            stored = json.load(f)['files']['kyc/id.pdf']
+        self.assertEqual(stored['bytes'], len(b'identical scan'))
+        self.assertTrue(stored['deduplicated'])
+        self.assertEqual(len(stored['sha256']), 64)
+
+    def test_upload_rejects_oversized_file(self):
+        """Test that a file over the per-file limit is refused without being stored."""
+        self.login_branch_user()
+        app.config['MAX_FILE_SIZE'] = 8
+        response = self.upload('111000333', b'this scan is far too large')
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(os.path.exists(os.path.join(app.config['PACKAGES_DIR'], '111000333')))
+        self.assertEqual(os.listdir(os.path.join(app.config['BLOB_DIR'], 'tmp')), [])
+
+    def catalog_packages(self, count):
+        for i in range(count):
+            name = f'7770{i:05d}'
+            get_catalog().upsert(
+                name,
+                'CLEAN_FOR_PROCESSING' if i % 2 else 'FLAGGED_FOR_REVIEW',
+                os.path.join(app.config['CLEAN_DIR'], name),
+                package_info={'account_name': f'Holder {i}', 'branch_name': 'Harare' if i % 3 else 'Bulawayo',
+                              'account_type': 'Individual'},
+            )
+
+    def test_packages_api_pages_and_filters(self):
+        """Test that the listing API pages, filters and sorts in the catalog."""
+        self.catalog_packages(25)
+
+        response = self.app.get('/api/packages?per_page=10&page=3&sort=name&order=asc')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['total'], 25)
+        self.assertEqual(response.json['pages'], 3)
+        self.assertEqual([p['name'] for p in response.json['packages']],
+                         [f'7770{i:05d}' for i in range(20, 25)])
+
+        response = self.app.get('/api/packages?status=CLEAN_FOR_PROCESSING&branch=Bulawayo')
+        self.assertEqual(response.json['total'], 4)  # odd multiples of 3 below 25
+        self.assertTrue(all(p['branch'] == 'Bulawayo' for p in response.json['packages']))
+
+        self.assertEqual(self.app.get('/api/packages?sort=location').status_code, 400)
+        self.assertEqual(self.app.get('/api/packages?from=yesterday').status_code, 400)
+        self.assertEqual(self.app.get('/api/packages?to=2000-01-01').json['total'], 0)
+
+    def test_packages_api_revalidates_until_catalog_changes(self):
+        """Test that an unchanged listing is answered with 304 and a changed one is not."""
+        self.catalog_packages(3)
+        response = self.app.get('/api/packages')
+        etag = response.headers['ETag']
+        self.assertEqual(response.headers['Cache-Control'], 'private, no-cache')
+        self.assertEqual(self.app.get('/api/packages', headers={'If-None-Match': etag}).status_code, 304)
+        # The same parameters in another order are the same listing; other filters are not
+        self.assertEqual(self.app.get('/api/packages?sort=name&branch=Harare').headers['ETag'],
+                         self.app.get('/api/packages?branch=Harare&sort=name').headers['ETag'])
+        self.assertNotEqual(self.app.get('/api/packages?branch=Harare').headers['ETag'], etag)
+
+        self.catalog_packages(4)
+        response = self.app.get('/api/packages', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['total'], 4)
+
+    def test_packages_api_ignores_unlisted_status_changes(self):
+        """Test that a package moving through ingestion only changes the ETag once it is filed."""
+        self.catalog_packages(2)
+        etag = self.app.get('/api/packages').headers['ETag']
+        catalog = get_catalog()
+        location = os.path.join(app.config['PACKAGES_DIR'], '888000001')
+        catalog.upsert('888000001', 'RECEIVED', location)
+        catalog.update_status('888000001', 'QUEUED')
+        catalog.update_status('888000001', 'PROCESSING')
+        self.assertEqual(self.app.get('/api/packages', headers={'If-None-Match': etag}).status_code, 304)
+
+        catalog.update_status('888000001', 'FLAGGED_FOR_REVIEW')
+        response = self.app.get('/api/packages', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['total'], 3)
+
+    def test_dashboard_paginates(self):
+        """Test that the dashboard renders one page and links to the next."""
+        self.catalog_packages(30)
+        response = self.app.get('/dashboard?per_page=20&sort=name&order=asc')
+        self.assertIn(b'777000019', response.data)
+        self.assertNotIn(b'777000020', response.data)
+        self.assertIn(b'Page 1 of 2', response.data)
+        self.assertIn(b'page=2', response.data)
+
+    def test_package_events_stream_state_changes(self):
+        """Test that the dashboard's event stream reports packages as they change."""
+        self.catalog_packages(1)
+        get_catalog().delete('777000000')
+
+        response = self.app.get('/api/packages/events', headers={'Last-Event-ID': '0'})
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        chunks = iter(response.response)
+        self.assertEqual(next(chunks), b'retry: 3000\n\n')
+        added, removed = next(chunks).decode(), next(chunks).decode()
+        response.close()
+        self.assertIn('event: package', added)
+        self.assertIn('"event": "flagged"', added)
+        self.assertIn('"detail_url": "/package/777000000"', added)
+        self.assertIn('"event": "removed"', removed)
+
+    def test_metrics_endpoint(self):
+        """Test that request latencies are exported for Prometheus."""
+        self.app.get('/dashboard')
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'aura_http_request_seconds_bucket{app="aura",endpoint="dashboard"', response.data)
+        self.assertIn(b'aura_stage_seconds', response.data)
+
+    def test_request_profiling_is_gated_by_token(self):
+        """Test that only requests sent with the profiling token are profiled and downloadable."""
+        app.config['PROFILE_DIR'] = os.path.join(self.test_dir, 'profiles')
+        self.assertNotIn('X-Profile-Id', self.app.get('/dashboard').headers)
+
+        app.config['PROFILING_TOKEN'] = 'secret'
+        try:
+            response = self.app.get('/dashboard', headers={'X-Profile': 'secret', 'X-Request-ID': 'slow-dashboard'})
+            self.assertEqual(response.headers['X-Profile-Id'], 'slow-dashboard')
+            self.assertNotIn('X-Profile-Id', self.app.get('/dashboard', headers={'X-Profile': 'wrong'}).headers)
+
+            self.assertEqual(self.app.get('/profiles').status_code, 403)
+            profiles = self.app.get('/profiles', headers={'X-Profile': 'secret'}).json['profiles']
+            self.assertEqual([profile['path'] for profile in profiles], ['/dashboard'])
+            download = self.app.get('/profiles/slow-dashboard', headers={'X-Profile': 'secret'})
+            self.assertEqual(download.status_code, 200)
+            self.assertIn('slow-dashboard.folded', download.headers['Content-Disposition'])
+        finally:
+            app.config['PROFILING_TOKEN'] = None
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,89 @@
+import os
+import json
+import unittest
+import tempfile
+import shutil
+from utils.batch import find_package_dirs, load_checkpoint, run_batch
+from utils.ingestion import merge_and_file_package
+from utils.package_catalog import PackageCatalog
+
+class BatchProcessingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.source_dir = os.path.join(self.test_dir, 'migration')
+        for branch, account_no in (('harare', '111'), ('bulawayo', '222')):
+            package_path = os.path.join(self.source_dir, branch, account_no)
+            os.makedirs(os.path.join(package_path, 'kyc'))
+            with open(os.path.join(package_path, 'package_info.json'), 'w') as f:
+                json.dump({'account_no': account_no, 'branch_name': branch}, f)
+            with open(os.path.join(package_path, 'kyc', 'document1.pdf'), 'w') as f:
+                f.write('dummy content')
+        self.checkpoint = os.path.join(self.test_dir, 'checkpoint.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_find_package_dirs_uses_package_info(self):
+        """Packages are found at any depth, and their subfolders are not packages."""
+        packages = find_package_dirs(self.source_dir)
+        self.assertEqual([os.path.basename(p) for p in packages], ['222', '111'])
+
+    def test_resume_skips_checkpointed_packages(self):
+        """A rerun only processes packages missing from the checkpoint."""
+        done = os.path.join(self.source_dir, 'harare', '111')
+        with open(self.checkpoint, 'w') as f:
+            f.write(json.dumps({'package': done, 'status': 'CLEAN_FOR_PROCESSING'}) + '\n')
+            f.write('{"package": "torn')  # interrupted mid-write
+
+        filed = []
+        summary = run_batch(self.source_dir, self.checkpoint, on_result=lambda path, report: filed.append(path),
+                            workers=1, echo=lambda message: None)
+
+        self.assertEqual(filed, [os.path.join(self.source_dir, 'bulawayo', '222')])
+        self.assertEqual(summary['skipped_from_checkpoint'], 1)
+        self.assertEqual(summary['processed'], 1)
+        self.assertIn('identification', summary['stages'])
+        self.assertEqual(load_checkpoint(self.checkpoint), {done, filed[0]})
+
+    def test_duplicate_names_are_reported_and_not_filed(self):
+        """Two branch folders holding the same account number are neither filed over each other."""
+        package_path = os.path.join(self.source_dir, 'mutare', '111')
+        os.makedirs(os.path.join(package_path, 'kyc'))
+        with open(os.path.join(package_path, 'package_info.json'), 'w') as f:
+            json.dump({'account_no': '111', 'branch_name': 'mutare'}, f)
+        with open(os.path.join(package_path, 'kyc', 'document1.pdf'), 'w') as f:
+            f.write('dummy content')
+
+        filed = []
+        summary = run_batch(self.source_dir, self.checkpoint, on_result=lambda path, report: filed.append(path),
+                            workers=1, echo=lambda message: None)
+
+        self.assertEqual(filed, [os.path.join(self.source_dir, 'bulawayo', '222')])
+        self.assertEqual(sorted(summary['duplicate_names']['111']),
+                         [os.path.join(self.source_dir, 'harare', '111'), package_path])
+        self.assertEqual(summary['rejected_duplicates'], 2)
+
+    def test_filing_merges_an_already_filed_version(self):
+        """A package filed before the batch run keeps its documents and gains the new ones."""
+        clean_dir = os.path.join(self.test_dir, 'clean')
+        flagged_dir = os.path.join(self.test_dir, 'flagged')
+        catalog = PackageCatalog(os.path.join(self.test_dir, 'catalog.db'))
+        filed_path = os.path.join(flagged_dir, '111')
+        os.makedirs(os.path.join(filed_path, 'kyc'))
+        with open(os.path.join(filed_path, 'kyc', 'earlier.pdf'), 'w') as f:
+            f.write('earlier content')
+
+        summary = run_batch(
+            self.source_dir, self.checkpoint,
+            on_result=lambda path, report: merge_and_file_package(
+                os.path.basename(path), path, clean_dir, flagged_dir, catalog, report=report),
+            workers=1, echo=lambda message: None,
+        )
+
+        self.assertEqual(summary['processed'], 2)
+        self.assertEqual(sorted(os.listdir(os.path.join(filed_path, 'kyc'))), ['document1.pdf', 'earlier.pdf'])
+        self.assertIn('kyc/earlier.pdf', catalog.get('111')['files'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import unittest
+import tempfile
+import shutil
+import threading
+from utils.package_catalog import PackageCatalog, STATUS_RECEIVED, STATUS_CLEAN, STATUS_FLAGGED
+from utils.change_feed import ChangeFeed
+
+class ChangeFeedTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, 'catalog.db')
+        self.catalog = PackageCatalog(self.db_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_catalog_records_state_transitions(self):
+        """Every insert, status change and delete is written to the feed."""
+        self.catalog.upsert('123', STATUS_RECEIVED, '/packages/123', package_info={'branch_name': 'Harare'})
+        self.catalog.update_status('123', STATUS_FLAGGED)
+        self.catalog.delete('123')
+        events = self.catalog.events_since(0)
+        self.assertEqual([event['event'] for event in events], ['received', 'flagged', 'removed'])
+        self.assertEqual(events[-1]['branch_name'], 'Harare')
+        self.assertEqual(self.catalog.events_since(events[0]['id'])[0]['event'], 'flagged')
+
+    def test_one_poll_wakes_every_reader(self):
+        """Readers blocked in wait() all receive the events fetched by a single poll."""
+        feed = ChangeFeed(self.db_path)
+        received = []
+        readers = [threading.Thread(target=lambda: received.append(feed.wait(0, timeout=5))) for _ in range(3)]
+        for reader in readers:
+            reader.start()
+
+        self.catalog.upsert('123', STATUS_CLEAN, '/clean/123')
+        self.assertEqual(feed.poll(), 1)
+        for reader in readers:
+            reader.join()
+        self.assertEqual([[event['name'] for event in events] for events in received], [['123']] * 3)
+
+    def test_lagging_reader_catches_up_from_catalog(self):
+        """A reader older than the in-memory buffer is answered from the catalog."""
+        feed = ChangeFeed(self.db_path, buffer_size=2)
+        for name in ('1', '2', '3', '4'):
+            self.catalog.upsert(name, STATUS_CLEAN, f'/clean/{name}')
+        feed.poll()
+        self.assertEqual(len(feed._events), 2)
+        self.assertEqual([event['name'] for event in feed.wait(0, timeout=0)], ['1', '2', '3', '4'])
+        self.assertEqual(feed.wait(feed.last_id, timeout=0), [])
+
+if __name__ == '__main__':
+    unittest.main()
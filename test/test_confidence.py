@@ -0,0 +1,59 @@
+import unittest
+from utils.confidence import (
+    MODEL_PRIOR, INVALID_CONFIDENCE, model_confidence, inconsistent_fields, score_fields, review_fields,
+    calibrate_threshold, review_workload,
+)
+from utils.tiered_extraction import SOURCE_LOCAL, SOURCE_MODEL
+
+
+class ModelConfidenceTestCase(unittest.TestCase):
+
+    def test_validator_and_agreement_with_local_ocr(self):
+        self.assertEqual(model_confidence('id', 'ID_NUMBER', '63-2001234-A-42'), MODEL_PRIOR)
+        self.assertEqual(model_confidence('id', 'ID_NUMBER', 'not an id'), INVALID_CONFIDENCE)
+        self.assertEqual(model_confidence('id', 'ID_NUMBER', None), 0.0)
+        agreed = model_confidence('id', 'DATE_OF_BIRTH', '1985-12-24', ('1985-12-24', 0.6))
+        self.assertAlmostEqual(agreed, 1 - (1 - MODEL_PRIOR) * 0.4)
+        self.assertLess(model_confidence('id', 'GENDER', 'FEMALE', ('MALE', 0.6)), MODEL_PRIOR)
+        # The model's float income and the OCR's formatted amount are the same value
+        self.assertGreater(model_confidence('mandate', 'GROSS MONTHLY INCOME', 1850.5, ('1850.5', 0.7)), MODEL_PRIOR)
+
+    def test_birth_after_issue_is_inconsistent(self):
+        self.assertEqual(inconsistent_fields('id', {'DATE_OF_BIRTH': '1985-12-24', 'ISSUE DATE': '2017-06-15'}), set())
+        self.assertEqual(inconsistent_fields('id', {'DATE_OF_BIRTH': '2017-06-15', 'ISSUE DATE': '1985-12-24'}),
+                         {'DATE_OF_BIRTH', 'ISSUE DATE'})
+        self.assertEqual(inconsistent_fields('id', {'DATE_OF_BIRTH': None}), set())
+
+    def test_score_fields(self):
+        fields = [
+            {'field_name': 'DATE_OF_BIRTH', 'extracted_value': '2017-06-15', 'confidence_score': 0.95,
+             'source': SOURCE_LOCAL},
+            {'field_name': 'ISSUE DATE', 'extracted_value': '1985-12-24', 'source': SOURCE_MODEL},
+            {'field_name': 'GENDER', 'extracted_value': 'MALE', 'source': SOURCE_MODEL},
+        ]
+        scored = {field['field_name']: field['confidence_score'] for field in score_fields('id', fields, {})}
+        self.assertEqual(scored, {'DATE_OF_BIRTH': 0.475, 'ISSUE DATE': MODEL_PRIOR / 2, 'GENDER': MODEL_PRIOR})
+
+
+class ReviewTestCase(unittest.TestCase):
+
+    def test_review_fields(self):
+        accepted, review = review_fields({'profession': 0.97, 'monthly_salary': 0.4, 'employer_address': None}, 0.9)
+        self.assertEqual(accepted, ['profession'])
+        self.assertEqual(review, ['monthly_salary', 'employer_address'])
+
+    def test_calibrate_threshold(self):
+        samples = [(0.99, True), (0.97, True), (0.95, True), (0.9, False), (0.85, True), (0.5, False), (0.0, False)]
+        self.assertEqual(calibrate_threshold(samples, target_precision=1.0), 0.95)
+        self.assertEqual(calibrate_threshold(samples, target_precision=0.8), 0.85)
+        self.assertIsNone(calibrate_threshold([(0.9, False)], target_precision=0.5))
+
+        workload = review_workload(samples, 0.95)
+        self.assertEqual(workload['auto_accepted'], 3)
+        self.assertEqual(workload['needs_review'], 4)
+        self.assertEqual(workload['auto_accepted_precision'], 1.0)
+        self.assertEqual(review_workload(samples, None)['auto_accepted'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from benchmarks.corpus import Degradation, generate_corpus, load_ground_truth
+from benchmarks.pipeline import summarise, FieldAccuracy
+from utils.document_processor import extract_basic_details, extract_text_from_pdf
+
+
+class CorpusTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus_dir = tempfile.mkdtemp()
+        cls.truth = generate_corpus(cls.corpus_dir, packages=3, seed=5, degradation=Degradation(dpi=72),
+                                    company_ratio=0.5)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.corpus_dir)
+
+    def test_packages_match_ground_truth(self):
+        self.assertEqual(load_ground_truth(self.corpus_dir), json.loads(json.dumps(self.truth)))
+        self.assertEqual(len(self.truth['packages']), 3)
+        for package in self.truth['packages']:
+            package_dir = os.path.join(self.corpus_dir, 'packages', package['package'])
+            with open(os.path.join(package_dir, 'package_info.json')) as f:
+                self.assertEqual(json.load(f)['account_no'], package['package'])
+            for document in package['documents']:
+                self.assertTrue(os.path.getsize(os.path.join(package_dir, document['path'])) > 0)
+            self.assertIn(package['account_type'], ('INDIVIDUAL', 'COMPANY'))
+
+    def test_same_seed_same_corpus(self):
+        other_dir = tempfile.mkdtemp()
+        try:
+            other = generate_corpus(other_dir, packages=3, seed=5, degradation=Degradation(dpi=72),
+                                    company_ratio=0.5)
+        finally:
+            shutil.rmtree(other_dir)
+        self.assertEqual(other, self.truth)
+
+    def test_text_pdf_carries_the_rendered_text(self):
+        text_pdfs = [
+            (package, document) for package in self.truth['packages'] for document in package['documents']
+            if document['format'] == 'text_pdf'
+        ]
+        self.assertTrue(text_pdfs)
+        for package, document in text_pdfs:
+            path = os.path.join(self.corpus_dir, 'packages', package['package'], document['path'])
+            text = ' '.join(extract_text_from_pdf(path).split())
+            self.assertIn(' '.join(document['text'].splitlines()[0].split()), text)
+
+    def test_field_accuracy_against_clean_text(self):
+        accuracy = FieldAccuracy()
+        for package in self.truth['packages']:
+            for document in package['documents']:
+                if document['extractor'] == 'basic_details':
+                    accuracy.add(document['fields'], extract_basic_details(document['text']))
+        result = accuracy.result()
+        self.assertEqual(result['fields']['monthly_salary']['accuracy'], 1.0)
+        self.assertGreater(result['accuracy'], 0)
+
+    def test_summarise_percentiles(self):
+        summary = summarise([i / 100 for i in range(100, 0, -1)])
+        self.assertEqual(summary['count'], 100)
+        self.assertEqual(summary['p50'], 0.5)
+        self.assertEqual(summary['p99'], 0.99)
+        self.assertEqual(summary['max'], 1.0)
+        self.assertIsNone(summarise([])['p95'])
+
+
+if __name__ == '__main__':
+    unittest.main()
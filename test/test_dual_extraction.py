@@ -0,0 +1,195 @@
+import os
+import io
+import unittest
+import tempfile
+import shutil
+from unittest import mock
+import app_dual_extraction
+from app_dual_extraction import app
+from utils.package_catalog import PackageCatalog
+from utils.job_queue import run_pending
+from utils.extraction_tokens import issue_extraction_token
+
+FAKE_MANDATE = {'fields': [{'field_name': 'OCCUPATION', 'extracted_value': 'CHEF'}]}
+FAKE_ID = {'fields': [{'field_name': 'ID_NUMBER', 'extracted_value': '63-2001234-A-42'}]}
+
+class ExtractByReferenceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        package_path = os.path.join(self.test_dir, 'clean_packages', '123456789')
+        os.makedirs(os.path.join(package_path, 'kyc'))
+        os.makedirs(os.path.join(package_path, 'mandate'))
+        with open(os.path.join(package_path, 'kyc', 'id.jpg'), 'wb') as f:
+            f.write(b'id image bytes')
+        with open(os.path.join(package_path, 'mandate', 'mandate.jpg'), 'wb') as f:
+            f.write(b'mandate image bytes')
+        with open(os.path.join(self.test_dir, 'secret.txt'), 'w') as f:
+            f.write('outside the package')
+
+        app.config['TESTING'] = True
+        app.config['CATALOG_DB'] = os.path.join(self.test_dir, 'aura_catalog.db')
+        app.config['GEMINI_PAUSE_SECONDS'] = 0
+        app.config['LEXICON_REFRESH_SECONDS'] = 0
+        app.config['EXTRACTION_SECRET'] = 'test-secret'
+        self.token = issue_extraction_token('test-secret', '123456789')
+        self.headers = {'Authorization': 'Bearer ' + self.token}
+        PackageCatalog(app.config['CATALOG_DB']).register_directory(package_path, 'CLEAN_FOR_PROCESSING')
+        self.client = app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def post(self, **body):
+        payload = {'package_name': '123456789', 'mandate_path': 'mandate/mandate.jpg', 'id_path': 'kyc/id.jpg'}
+        payload.update(body)
+        return self.client.post('/extract_by_reference', json=payload, headers=self.headers)
+
+    @mock.patch.object(app_dual_extraction, 'store_htr_results')
+    @mock.patch.object(app_dual_extraction, 'gemini_extract')
+    def test_reads_documents_from_package_storage(self, gemini_extract, store_htr_results):
+        """Both documents are read server-side and mapped like /extract_dual_source."""
+        gemini_extract.side_effect = [dict(FAKE_MANDATE), dict(FAKE_ID)]
+        response = self.post()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json['mandate_card']['profession'], 'CHEF')
+        self.assertEqual(response.json['national_id']['id_number'], '63-2001234-A-42')
+        self.assertEqual(gemini_extract.call_args_list[0].args[0], b'mandate image bytes')
+        self.assertEqual(response.json['transfer']['document_bytes_read_locally'], 33)
+        # Unverified model answers are left for review
+        review = response.json['review']['mandate_card']
+        self.assertIn('profession', review['needs_review'])
+        self.assertEqual(review['confidence']['profession'], 0.85)
+
+    def test_rejects_paths_outside_the_package(self):
+        response = self.post(id_path='../../secret.txt')
+        self.assertEqual(response.status_code, 403)
+
+    def test_unknown_package(self):
+        self.headers['Authorization'] = 'Bearer ' + issue_extraction_token('test-secret', '000000000')
+        response = self.post(package_name='000000000')
+        self.assertEqual(response.status_code, 404)
+
+    def test_requires_a_token_for_the_package(self):
+        self.assertEqual(self.client.post('/extract_by_reference', json={
+            'package_name': '123456789', 'mandate_path': 'mandate/mandate.jpg', 'id_path': 'kyc/id.jpg'
+        }).status_code, 401)
+        self.headers['Authorization'] = 'Bearer ' + issue_extraction_token('other-secret', '123456789')
+        self.assertEqual(self.post().status_code, 401)
+        self.headers['Authorization'] = 'Bearer ' + issue_extraction_token('test-secret', '000000000')
+        self.assertEqual(self.post().status_code, 403)
+
+    @mock.patch.object(app_dual_extraction, 'store_htr_results')
+    @mock.patch.object(app_dual_extraction, 'gemini_extract')
+    def test_uploads_require_a_token_for_the_document_id(self, gemini_extract, store_htr_results):
+        gemini_extract.side_effect = [FAKE_MANDATE, FAKE_ID]
+
+        def upload(headers):
+            return self.client.post('/extract_dual_source', headers=headers, data={
+                'document_id': '123456789',
+                'mandate_file': (io.BytesIO(b'mandate image bytes'), 'mandate.jpg', 'image/jpeg'),
+                'id_file': (io.BytesIO(b'id image bytes'), 'id.jpg', 'image/jpeg'),
+            })
+
+        self.assertEqual(upload({}).status_code, 401)
+        other_package = {'Authorization': 'Bearer ' + issue_extraction_token('test-secret', '000000000')}
+        self.assertEqual(upload(other_package).status_code, 403)
+        gemini_extract.assert_not_called()
+        self.assertEqual(upload(self.headers).status_code, 201)
+
+    def test_refuses_every_request_without_a_secret(self):
+        app.config['EXTRACTION_SECRET'] = None
+        self.assertEqual(self.post().status_code, 503)
+
+    def test_cors_is_limited_to_the_front_end(self):
+        allowed = self.client.options('/extract_by_reference', headers={
+            'Origin': 'http://127.0.0.1:5000', 'Access-Control-Request-Method': 'POST'})
+        self.assertEqual(allowed.headers.get('Access-Control-Allow-Origin'), 'http://127.0.0.1:5000')
+        other = self.client.options('/extract_by_reference', headers={
+            'Origin': 'https://example.com', 'Access-Control-Request-Method': 'POST'})
+        self.assertNotIn('Access-Control-Allow-Origin', other.headers)
+
+class ExtractionJobTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        package_path = os.path.join(self.test_dir, 'clean_packages', '123456789')
+        os.makedirs(package_path)
+        with open(os.path.join(package_path, 'id.jpg'), 'wb') as f:
+            f.write(b'id image bytes')
+        with open(os.path.join(package_path, 'mandate.jpg'), 'wb') as f:
+            f.write(b'mandate image bytes')
+
+        app.config['TESTING'] = True
+        app.config['CATALOG_DB'] = os.path.join(self.test_dir, 'aura_catalog.db')
+        app.config['JOB_QUEUE_DB'] = os.path.join(self.test_dir, 'aura_jobs.db')
+        app.config['GEMINI_PAUSE_SECONDS'] = 0
+        app.config['LEXICON_REFRESH_SECONDS'] = 0
+        app.config['EXTRACTION_SECRET'] = 'test-secret'
+        self.token = issue_extraction_token('test-secret', '123456789')
+        self.headers = {'Authorization': 'Bearer ' + self.token}
+        PackageCatalog(app.config['CATALOG_DB']).register_directory(package_path, 'CLEAN_FOR_PROCESSING')
+        self.client = app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def submit(self, **body):
+        payload = {'package_name': '123456789', 'mandate_path': 'mandate.jpg', 'id_path': 'id.jpg'}
+        payload.update(body)
+        return self.client.post('/extraction_jobs', json=payload, headers=self.headers)
+
+    @mock.patch.object(app_dual_extraction, 'store_htr_results')
+    @mock.patch.object(app_dual_extraction, 'gemini_extract')
+    def test_job_lifecycle(self, gemini_extract, store_htr_results):
+        """A job is accepted at once, then polled and streamed once a worker has run it."""
+        gemini_extract.side_effect = [dict(FAKE_MANDATE), dict(FAKE_ID)]
+        response = self.submit()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.headers['Location'], response.json['status_url'])
+        self.assertEqual(self.client.get(response.json['status_url'], headers=self.headers).json['status'], 'queued')
+        gemini_extract.assert_not_called()
+
+        run_pending(app_dual_extraction.get_extraction_queue(), app_dual_extraction.handle_extraction_job)
+
+        status = self.client.get(response.json['status_url'], headers=self.headers).json
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['progress'], {'mandate_card': 'done', 'national_id': 'done'})
+        self.assertEqual(status['result']['mandate_card']['profession'], 'CHEF')
+
+        events = self.client.get(response.json['events_url'], query_string={'token': self.token})
+        self.assertEqual(events.mimetype, 'text/event-stream')
+        body = events.get_data(as_text=True)
+        self.assertIn('event: progress', body)
+        self.assertIn('event: result', body)
+        self.assertIn('63-2001234-A-42', body)
+
+    @mock.patch.object(app_dual_extraction, 'gemini_extract')
+    def test_failed_job_streams_failure(self, gemini_extract):
+        gemini_extract.side_effect = ValueError('Model returned invalid JSON')
+        response = self.submit()
+        run_pending(app_dual_extraction.get_extraction_queue(), app_dual_extraction.handle_extraction_job)
+
+        status = self.client.get(response.json['status_url'], headers=self.headers).json
+        self.assertEqual(status['status'], 'failed')
+        self.assertEqual(status['progress']['mandate_card'], 'running')
+        self.assertIn('error', status['progress'])
+        body = self.client.get(response.json['events_url'], headers=self.headers).get_data(as_text=True)
+        self.assertIn('event: failed', body)
+
+    def test_rejects_bad_references_before_queueing(self):
+        self.assertEqual(self.submit(id_path='../../secret.txt').status_code, 403)
+        self.headers['Authorization'] = 'Bearer ' + issue_extraction_token('test-secret', '000000000')
+        self.assertEqual(self.submit(package_name='000000000').status_code, 404)
+        self.assertEqual(self.client.get('/extraction_jobs/999', headers=self.headers).status_code, 404)
+
+    def test_jobs_are_only_visible_with_the_package_token(self):
+        response = self.submit()
+        other_package = {'Authorization': 'Bearer ' + issue_extraction_token('test-secret', '000000000')}
+        self.assertEqual(self.client.get(response.json['status_url']).status_code, 401)
+        self.assertEqual(self.client.get(response.json['status_url'], headers=other_package).status_code, 403)
+        self.assertEqual(self.client.get(response.json['events_url'], headers=other_package).status_code, 403)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import json
+import asyncio
+import unittest
+import tempfile
+import shutil
+from unittest import mock
+import app_dual_extraction_async
+from app_dual_extraction_async import app
+from utils.package_catalog import PackageCatalog
+from utils.extraction_tokens import issue_extraction_token
+
+FAKE_MANDATE = {'fields': [{'field_name': 'OCCUPATION', 'extracted_value': 'CHEF'}]}
+
+
+class AsyncExtractionTestCase(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        package_path = os.path.join(self.test_dir, '123456789')
+        os.makedirs(package_path)
+        for name in ('mandate.jpg', 'id.jpg'):
+            with open(os.path.join(package_path, name), 'wb') as f:
+                f.write(b'image bytes')
+        app.config['TESTING'] = True
+        app.config['CATALOG_DB'] = os.path.join(self.test_dir, 'aura_catalog.db')
+        app.config['GEMINI_PAUSE_SECONDS'] = 0
+        app.config['LEXICON_REFRESH_SECONDS'] = 0
+        app.config['EXTRACTION_SECRET'] = 'test-secret'
+        self.headers = {'Authorization': 'Bearer ' + issue_extraction_token('test-secret', '123456789')}
+        PackageCatalog(app.config['CATALOG_DB']).register_directory(package_path, 'CLEAN_FOR_PROCESSING')
+        self.client = app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    @mock.patch.object(app_dual_extraction_async, 'store_htr_results', new_callable=mock.AsyncMock)
+    async def test_concurrent_extractions_share_the_event_loop(self, store_htr_results):
+        """Requests waiting on the model overlap instead of each holding a thread."""
+        in_flight = {'current': 0, 'peak': 0}
+
+        async def fake_model(*args, **kwargs):
+            in_flight['current'] += 1
+            in_flight['peak'] = max(in_flight['peak'], in_flight['current'])
+            await asyncio.sleep(0.05)
+            in_flight['current'] -= 1
+            return json.loads(json.dumps(FAKE_MANDATE))
+
+        body = {'package_name': '123456789', 'mandate_path': 'mandate.jpg', 'id_path': 'id.jpg'}
+        with mock.patch.object(app_dual_extraction_async, 'gemini_extract_async', fake_model):
+            responses = await asyncio.gather(*(
+                self.client.post('/extract_by_reference', json=body, headers=self.headers) for _ in range(50)
+            ))
+
+        self.assertTrue(all(response.status_code == 201 for response in responses))
+        self.assertEqual((await responses[0].get_json())['mandate_card']['profession'], 'CHEF')
+        self.assertEqual(in_flight['peak'], 50)
+        self.assertEqual(store_htr_results.await_count, 50)
+
+    async def test_rejects_paths_outside_the_package(self):
+        body = {'package_name': '123456789', 'mandate_path': '../../etc/passwd', 'id_path': 'id.jpg'}
+        response = await self.client.post('/extract_by_reference', json=body, headers=self.headers)
+        self.assertEqual(response.status_code, 403)
+
+    async def test_requires_a_token_for_the_package(self):
+        body = {'package_name': '123456789', 'mandate_path': 'mandate.jpg', 'id_path': 'id.jpg'}
+        response = await self.client.post('/extract_by_reference', json=body)
+        self.assertEqual(response.status_code, 401)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,272 @@
+import os
+import json
+import random
+import unittest
+import tempfile
+import shutil
+from unittest import mock
+from PIL import Image, ImageDraw, ImageEnhance
+import app_dual_extraction
+import utils.package_processor as package_processor
+from app_dual_extraction import app
+from utils.ingestion import ingest_package
+from utils.manifest import load_manifest
+from utils.package_catalog import PackageCatalog
+from utils.extraction_tokens import issue_extraction_token
+from utils.duplicates import (
+    DuplicateIndex, MATCH_EXACT, MATCH_NEAR, NEAR_DISTANCE, SOURCE_DUPLICATE, fingerprint, hamming,
+)
+
+
+def draw_card(path, surname):
+    image = Image.new('RGB', (1000, 630), (235, 240, 230))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, 1000, 90], fill=(30, 90, 60))
+    draw.rectangle([40, 130, 300, 480], fill=(150, 150, 150))
+    for row, (label, value) in enumerate([('SURNAME', surname), ('ID NUMBER', '63-123456 F 42')]):
+        draw.text((340, 150 + row * 70), label, fill=(0, 0, 0))
+        draw.text((340, 175 + row * 70), value, fill=(0, 0, 0))
+    image.save(path)
+    return image
+
+
+def rescan(image, path):
+    """image as if scanned again: smaller, slightly tilted and darker, saved as a lossy JPEG."""
+    image = image.rotate(0.7, fillcolor=(235, 240, 230)).resize((700, 441))
+    ImageEnhance.Brightness(image).enhance(0.9).save(path, quality=60)
+
+
+def draw_letter(path):
+    image = Image.new('RGB', (800, 1100), 'white')
+    draw = ImageDraw.Draw(image)
+    for line in range(30):
+        draw.text((60, 80 + line * 30), 'Proof of residence for account holder ' * (1 + line % 2), fill='black')
+    image.save(path)
+
+
+def entry(path, sha256, phash=None, dhash=None, identified_type='ID Document', text_sha256='text'):
+    return {'path': path, 'sha256': sha256, 'phash': phash, 'dhash': dhash, 'identified_type': identified_type,
+            'quality_issues': [], 'company_keywords': False, 'text_sha256': text_sha256}
+
+
+class FingerprintTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_rescans_are_near_and_other_documents_far(self):
+        card = draw_card(os.path.join(self.test_dir, 'card.png'), 'MOYO')
+        rescan(card, os.path.join(self.test_dir, 'rescan.jpg'))
+        draw_letter(os.path.join(self.test_dir, 'letter.png'))
+        original, copy, letter = (fingerprint(os.path.join(self.test_dir, name))
+                                  for name in ('card.png', 'rescan.jpg', 'letter.png'))
+
+        self.assertLessEqual(hamming(original[0], copy[0]), NEAR_DISTANCE)
+        self.assertGreater(hamming(original[0], letter[0]), 2 * NEAR_DISTANCE)
+
+    def test_unreadable_documents_have_no_fingerprint(self):
+        path = os.path.join(self.test_dir, 'broken.pdf')
+        with open(path, 'w') as f:
+            f.write('not a pdf')
+        self.assertEqual(fingerprint(path), (None, None))
+
+
+class DuplicateIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.index = DuplicateIndex(os.path.join(self.test_dir, 'aura_catalog.db'))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_band_search_matches_a_linear_scan(self):
+        rng = random.Random(5)
+        hashes = [rng.getrandbits(64) for _ in range(300)]
+        # Copies of the first few hashes with a few bits flipped
+        for value in hashes[:20]:
+            for _ in range(rng.randint(1, 10)):
+                value ^= 1 << rng.randrange(64)
+            hashes.append(value)
+        for number, value in enumerate(hashes):
+            self.index.add_manifest(f'pkg{number}', {'files': [entry('kyc/id.jpg', f'sha{number}', value)]})
+
+        for query in hashes[:20]:
+            expected = sorted((hamming(query, value), f'pkg{number}') for number, value in enumerate(hashes)
+                              if hamming(query, value) <= NEAR_DISTANCE)
+            found = self.index.find('unknown', query, text_sha256='text')
+            self.assertEqual([(match['distance'], match['package']) for match in found], expected)
+            self.assertTrue(all(match['match'] == MATCH_NEAR for match in found))
+            # Without the same text, close hashes are not a match
+            self.assertEqual(self.index.find('unknown', query), [])
+            self.assertEqual(self.index.find('unknown', query, text_sha256='other text'), [])
+
+    def test_exact_matches_and_excluded_package(self):
+        self.index.add_manifest('111', {'files': [entry('kyc/id.jpg', 'abc', 0xFF), entry('kyc/poa.pdf', 'def')]})
+        self.index.add_manifest('222', {'files': [entry('kyc/id_copy.jpg', 'abc', 0xFF00)]})
+
+        found = self.index.find('abc', 0xFF, exclude_package='111')
+        self.assertEqual([(match['package'], match['path'], match['match']) for match in found],
+                         [('222', 'kyc/id_copy.jpg', MATCH_EXACT)])
+        self.assertEqual(self.index.package_duplicates('222', {'files': [entry('kyc/id_copy.jpg', 'abc', 0xFF00)]}),
+                         {'kyc/id_copy.jpg': [{'package': '111', 'path': 'kyc/id.jpg', 'match': MATCH_EXACT,
+                                               'distance': 0}]})
+
+        # Refiling a package drops documents it no longer holds
+        self.index.add_manifest('111', {'files': [entry('kyc/poa.pdf', 'def')]})
+        self.assertIsNone(self.index.get('111', 'kyc/id.jpg'))
+        self.assertEqual(self.index.find('abc', exclude_package='222'), [])
+
+    def test_extractions_are_kept_while_content_is_unchanged(self):
+        self.index.add_manifest('111', {'files': [entry('mandate/card.jpg', 'abc', 0xF0)]})
+        self.index.add_manifest('222', {'files': [entry('mandate/card.jpg', 'abc', 0xF0),
+                                                  entry('mandate/rescan.jpg', 'xyz', 0xF1),
+                                                  entry('mandate/other.jpg', 'uvw', 0xF0, text_sha256='other')]})
+        self.index.record_extraction('111', 'mandate/card.jpg', 'mandate', [{'field_name': 'NAME'}], 4.5)
+
+        match, extraction = self.index.find_extraction('222', 'mandate/card.jpg', 'mandate')
+        self.assertEqual((match['package'], extraction['seconds']), ('111', 4.5))
+        self.assertIsNone(self.index.find_extraction('222', 'mandate/card.jpg', 'id'))
+        # A rescan reuses it only when asked to
+        self.assertIsNone(self.index.find_extraction('222', 'mandate/rescan.jpg', 'mandate'))
+        self.assertEqual(self.index.find_extraction('222', 'mandate/rescan.jpg', 'mandate', near=True)[0]['match'],
+                         MATCH_NEAR)
+        # Another person's card of the same design hashes alike but reads differently
+        self.assertIsNone(self.index.find_extraction('222', 'mandate/other.jpg', 'mandate', near=True))
+
+        self.index.add_manifest('111', {'files': [entry('mandate/card.jpg', 'abc', 0xF0)]}, {'mandate/card.jpg': 9.0})
+        self.assertIn('mandate', self.index.get('111', 'mandate/card.jpg')['extraction'])
+        self.index.add_manifest('111', {'files': [entry('mandate/card.jpg', 'new', 0xF0)]})
+        self.assertEqual(self.index.get('111', 'mandate/card.jpg')['extraction'], {})
+
+
+class DuplicateIngestionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.packages_dir = os.path.join(self.test_dir, 'packages_to_process')
+        self.clean_dir = os.path.join(self.test_dir, 'clean_packages')
+        self.flagged_dir = os.path.join(self.test_dir, 'flagged_for_review')
+        self.catalog = PackageCatalog(os.path.join(self.test_dir, 'aura_catalog.db'))
+        patcher = mock.patch.object(package_processor, 'analyse_document', side_effect=self.fake_analyse_document)
+        self.analyse_document = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.text = None
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def fake_analyse_document(self, file_path, config, timings):
+        """As if OCR had read self.text from the document."""
+        return {'identified_type': 'ID Document', 'quality_issues': [], 'company_keywords': False,
+                'text_sha256': self.text}
+
+    def submit(self, package_name, write_document, text):
+        self.text = text
+        package_path = os.path.join(self.packages_dir, package_name)
+        os.makedirs(os.path.join(package_path, 'kyc'))
+        write_document(os.path.join(package_path, 'kyc'))
+        with open(os.path.join(package_path, 'package_info.json'), 'w') as f:
+            json.dump({'account_no': package_name}, f)
+        ingest_package(package_name, self.packages_dir, self.clean_dir, self.flagged_dir, self.catalog)
+        return load_manifest(os.path.join(self.flagged_dir, package_name))
+
+    def precheck_report(self, package_name):
+        with open(os.path.join(self.flagged_dir, package_name, '_Pre-Check_Report.txt')) as f:
+            return f.read()
+
+    def test_copies_in_other_packages_reuse_analysis(self):
+        self.submit('111', lambda directory: draw_card(os.path.join(directory, 'id.png'), 'MOYO'), 'moyo')
+        original = os.path.join(self.flagged_dir, '111', 'kyc', 'id.png')
+        self.assertEqual(self.analyse_document.call_count, 1)
+
+        manifest = self.submit('222', lambda directory: shutil.copy(original, os.path.join(directory, 'id.png')),
+                               'moyo')
+        self.assertEqual(self.analyse_document.call_count, 1)
+        self.assertEqual(manifest['files'][0]['duplicate_of'],
+                         {'package': '111', 'path': 'kyc/id.png', 'match': MATCH_EXACT, 'distance': 0})
+
+        manifest = self.submit('333', lambda directory: rescan(Image.open(original), os.path.join(directory, 'id.jpg')),
+                               'moyo')
+        # A rescan is read again; the same text confirms it as a near duplicate
+        self.assertEqual(self.analyse_document.call_count, 2)
+        self.assertEqual(manifest['files'][0]['duplicate_of']['match'], MATCH_NEAR)
+        self.assertIn('Near duplicate of: kyc/id.png in package 111', self.precheck_report('333'))
+
+        duplicates = DuplicateIndex(self.catalog.db_path).package_duplicates('111', load_manifest(
+            os.path.join(self.flagged_dir, '111')))
+        self.assertEqual([link['package'] for link in duplicates['kyc/id.png']], ['222', '333'])
+
+    def test_different_people_with_cards_of_one_design_are_not_duplicates(self):
+        self.submit('111', lambda directory: draw_card(os.path.join(directory, 'id.png'), 'MOYO'), 'moyo')
+        manifest = self.submit('444', lambda directory: draw_card(os.path.join(directory, 'id.png'), 'SIBANDA'),
+                               'sibanda')
+
+        first = load_manifest(os.path.join(self.flagged_dir, '111'))['files'][0]
+        second = manifest['files'][0]
+        # The cards hash alike; only their text tells them apart
+        self.assertLessEqual(hamming(first['phash'], second['phash']), NEAR_DISTANCE)
+        self.assertEqual(self.analyse_document.call_count, 2)
+        self.assertIsNone(second['duplicate_of'])
+        self.assertNotIn('duplicate', self.precheck_report('444').lower())
+        index = DuplicateIndex(self.catalog.db_path)
+        self.assertEqual(index.package_duplicates('444', manifest), {})
+        self.assertEqual(index.package_duplicates('111', load_manifest(os.path.join(self.flagged_dir, '111'))), {})
+
+
+class DuplicateExtractionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        app.config['TESTING'] = True
+        app.config['CATALOG_DB'] = os.path.join(self.test_dir, 'aura_catalog.db')
+        app.config['GEMINI_PAUSE_SECONDS'] = 0
+        app.config['LEXICON_REFRESH_SECONDS'] = 0
+        app.config['EXTRACTION_SECRET'] = 'test-secret'
+        catalog = PackageCatalog(app.config['CATALOG_DB'])
+        index = DuplicateIndex(app.config['CATALOG_DB'])
+        for package_name, id_bytes in (('111', b'first id'), ('222', b'second id')):
+            package_path = os.path.join(self.test_dir, package_name)
+            for relative_path, content in (('mandate/mandate.jpg', b'same mandate'), ('kyc/id.jpg', id_bytes)):
+                os.makedirs(os.path.join(package_path, os.path.dirname(relative_path)), exist_ok=True)
+                with open(os.path.join(package_path, relative_path), 'wb') as f:
+                    f.write(content)
+            catalog.register_directory(package_path, 'CLEAN_FOR_PROCESSING')
+            index.add_manifest(package_name, {'files': [entry('mandate/mandate.jpg', 'mandate'),
+                                                        entry('kyc/id.jpg', package_name)]})
+        self.client = app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def post(self, package_name):
+        return self.client.post('/extract_by_reference', json={
+            'package_name': package_name, 'mandate_path': 'mandate/mandate.jpg', 'id_path': 'kyc/id.jpg'},
+            headers={'Authorization': 'Bearer ' + issue_extraction_token('test-secret', package_name)})
+
+    @mock.patch.object(app_dual_extraction, 'store_htr_results')
+    @mock.patch.object(app_dual_extraction, 'gemini_extract')
+    def test_identical_documents_are_extracted_once(self, gemini_extract, store_htr_results):
+        gemini_extract.side_effect = lambda image_bytes, prompt, mime: {'fields': [
+            {'field_name': 'OCCUPATION', 'extracted_value': 'CHEF'} if image_bytes == b'same mandate' else
+            {'field_name': 'ID_NUMBER', 'extracted_value': image_bytes.decode()}
+        ]}
+        self.assertEqual(self.post('111').status_code, 201)
+        self.assertEqual(gemini_extract.call_count, 2)
+
+        response = self.post('222')
+        self.assertEqual(response.status_code, 201)
+        # Only the National ID, which differs, went to the model
+        self.assertEqual(gemini_extract.call_count, 3)
+        self.assertEqual(response.json['mandate_card']['profession'], 'CHEF')
+        self.assertEqual(response.json['national_id']['id_number'], 'second id')
+        mandate_schema = store_htr_results.call_args.args[0]
+        self.assertEqual(mandate_schema.document_id, '222')
+        self.assertEqual({field.source for field in mandate_schema.fields}, {SOURCE_DUPLICATE})
+
+
+if __name__ == '__main__':
+    unittest.main()
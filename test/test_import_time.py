@@ -0,0 +1,58 @@
+import os
+import sys
+import json
+import subprocess
+import statistics
+import unittest
+from benchmarks.import_time import HEAVY_MODULES, DEFAULT_BUDGET_MS, measure_import, parse_importtime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Fresh-interpreter imports timed against the budget
+IMPORT_RUNS = 5
+
+# Creates an app on empty directories, serves the dashboard and reports which heavy modules got loaded
+SERVE_DASHBOARD = '''
+import sys, json, tempfile
+from app import create_app, users
+directory = tempfile.mkdtemp()
+app = create_app({
+    'TESTING': True, 'INGESTION_WORKERS': 0,
+    'PACKAGES_DIR': directory + '/packages', 'CLEAN_DIR': directory + '/clean',
+    'FLAGGED_DIR': directory + '/flagged', 'CATALOG_DB': directory + '/catalog.db',
+    'JOB_QUEUE_DB': directory + '/jobs.db', 'PREVIEW_DIR': directory + '/previews',
+})
+client = app.test_client()
+with client.session_transaction() as session:
+    session['_user_id'] = users['cpc_user'].id
+statuses = [client.get('/dashboard').status_code, client.get('/api/packages').status_code]
+print(json.dumps({'statuses': statuses, 'loaded': sorted(name for name in %r if name in sys.modules)}))
+''' % (HEAVY_MODULES,)
+
+
+class ImportTimeTestCase(unittest.TestCase):
+
+    def test_parse_importtime(self):
+        report = parse_importtime(
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |   flask.json\n'
+            'import time:      1500 |       2000 | app\n'
+        )
+        self.assertEqual(report, {'flask.json': (120, 120), 'app': (1500, 2000)})
+
+    def test_app_imports_within_budget_without_ocr_stack(self):
+        runs = [measure_import('app') for _ in range(IMPORT_RUNS)]
+        self.assertEqual(runs[0]['heavy_modules'], [])
+        # The median shrugs off a cold disk cache or a busy machine during one run;
+        # a breach means something heavy moved back to module level
+        self.assertLess(statistics.median(run['total_ms'] for run in runs), DEFAULT_BUDGET_MS)
+
+    def test_dashboard_serves_without_ocr_stack(self):
+        completed = subprocess.run([sys.executable, '-c', SERVE_DASHBOARD], cwd=ROOT_DIR,
+                                   capture_output=True, text=True, check=True)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        self.assertEqual(result['statuses'], [200, 200])
+        self.assertEqual(result['loaded'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import json
+import unittest
+import tempfile
+import shutil
+from unittest import mock
+import utils.package_processor as package_processor
+from utils.ingestion import ingest_package
+from utils.manifest import load_manifest
+from utils.package_catalog import PackageCatalog
+
+RESULTS = {
+    'kyc/id.pdf': 'ID Document',
+    'mandate/mandate.pdf': 'Mandate Card',
+    'kyc/proof_of_address.pdf': 'Proof of Address',
+}
+
+
+def fake_analyse_document(file_path, config, timings):
+    relative_path = '/'.join(file_path.replace(os.sep, '/').split('/')[-2:])
+    return {'identified_type': RESULTS[relative_path], 'quality_issues': [],
+            'company_keywords': False, 'text_sha256': relative_path}
+
+
+class IncrementalIngestionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.packages_dir = os.path.join(self.test_dir, 'packages_to_process')
+        self.clean_dir = os.path.join(self.test_dir, 'clean_packages')
+        self.flagged_dir = os.path.join(self.test_dir, 'flagged_for_review')
+        for directory in (self.packages_dir, self.clean_dir, self.flagged_dir):
+            os.makedirs(directory)
+        self.catalog = PackageCatalog(os.path.join(self.test_dir, 'aura_catalog.db'))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def submit(self, files, account_name='Test Account'):
+        package_path = os.path.join(self.packages_dir, '777000111')
+        for relative_path in files:
+            os.makedirs(os.path.join(package_path, os.path.dirname(relative_path)), exist_ok=True)
+            with open(os.path.join(package_path, relative_path), 'w') as f:
+                f.write(f'contents of {relative_path}')
+        with open(os.path.join(package_path, 'package_info.json'), 'w') as f:
+            json.dump({'account_no': '777000111', 'account_name': account_name}, f)
+        return ingest_package('777000111', self.packages_dir, self.clean_dir, self.flagged_dir, self.catalog)
+
+    @mock.patch.object(package_processor, 'analyse_document', side_effect=fake_analyse_document)
+    def test_resubmission_only_analyses_new_files(self, analyse_document):
+        status = self.submit(['kyc/id.pdf', 'mandate/mandate.pdf'])
+        self.assertEqual(status, 'FLAGGED_FOR_REVIEW')  # Proof of Address missing
+        self.assertEqual(analyse_document.call_count, 2)
+
+        analyse_document.reset_mock()
+        status = self.submit(['kyc/proof_of_address.pdf'], account_name='')
+
+        self.assertEqual(status, 'CLEAN_FOR_PROCESSING')
+        self.assertEqual(analyse_document.call_count, 1)
+        package_path = os.path.join(self.clean_dir, '777000111')
+        manifest = load_manifest(package_path)
+        self.assertEqual(sorted(entry['path'] for entry in manifest['files']),
+                         ['kyc/id.pdf', 'kyc/proof_of_address.pdf', 'mandate/mandate.pdf'])
+        self.assertEqual(self.catalog.get('777000111')['account_name'], 'Test Account')
+        # The flagged copy was superseded by the merged, clean package
+        self.assertFalse(os.path.exists(os.path.join(self.flagged_dir, '777000111')))
+        self.assertFalse(os.path.exists(os.path.join(self.packages_dir, '777000111')))
+
+    @mock.patch.object(package_processor, 'analyse_document', side_effect=fake_analyse_document)
+    def test_failed_resubmission_leaves_the_filed_package_intact(self, analyse_document):
+        self.submit(['kyc/id.pdf', 'mandate/mandate.pdf'])
+        filed_path = os.path.join(self.flagged_dir, '777000111')
+
+        analyse_document.side_effect = RuntimeError('OCR crashed')
+        with self.assertRaises(RuntimeError):
+            self.submit(['kyc/proof_of_address.pdf'])
+
+        for relative_path in ('kyc/id.pdf', 'mandate/mandate.pdf'):
+            with open(os.path.join(filed_path, relative_path)) as f:
+                self.assertEqual(f.read(), f'contents of {relative_path}')
+        self.assertEqual(self.catalog.get('777000111')['location'], filed_path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import unittest
+import tempfile
+import shutil
+from utils.job_queue import JobQueue, run_pending, JOB_PROCESSING, JOB_DONE, JOB_FAILED
+
+class JobQueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.queue = JobQueue(os.path.join(self.test_dir, 'jobs.db'), 'ingestion')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_enqueue_deduplicates_waiting_jobs(self):
+        """A package that is already waiting is not queued twice."""
+        first = self.queue.enqueue('123')
+        second = self.queue.enqueue('123')
+        self.assertEqual(first['id'], second['id'])
+        self.assertEqual(self.queue.pending_count(), 1)
+
+    def test_enqueue_refreshes_the_waiting_job(self):
+        """Re-queueing a waiting job replaces its payload and lane with the latest ones."""
+        first = self.queue.enqueue('123', payload={'mandate_path': 'old.pdf'})
+        second = self.queue.enqueue('123', payload={'mandate_path': 'new.pdf'}, lane='large')
+        self.assertEqual(first['id'], second['id'])
+        self.assertEqual(second['payload'], {'mandate_path': 'new.pdf'})
+        self.assertEqual(second['lane'], 'large')
+
+        self.assertIsNone(self.queue.claim(lanes=['default']))
+        self.assertEqual(self.queue.claim(lanes=['large'])['payload'], {'mandate_path': 'new.pdf'})
+
+    def test_claim_is_exclusive_per_key(self):
+        """A second job for a package waits while the first one is processing."""
+        self.queue.enqueue('123')
+        claimed = self.queue.claim()
+        self.assertEqual(claimed['status'], JOB_PROCESSING)
+
+        self.queue.enqueue('123')
+        self.assertIsNone(self.queue.claim())
+
+        self.queue.complete(claimed['id'], {'status': 'CLEAN_FOR_PROCESSING'})
+        self.assertEqual(self.queue.claim()['job_key'], '123')
+
+    def test_run_pending_records_results_and_failures(self):
+        """Handler results complete a job and exceptions fail it."""
+        ok = self.queue.enqueue('ok')
+        bad = self.queue.enqueue('bad')
+
+        def handler(job):
+            if job['job_key'] == 'bad':
+                raise ValueError('unreadable package')
+            return {'status': 'CLEAN_FOR_PROCESSING'}
+
+        self.assertEqual(run_pending(self.queue, handler), 2)
+        self.assertEqual(self.queue.get(ok['id'])['status'], JOB_DONE)
+        self.assertEqual(self.queue.get(ok['id'])['result'], {'status': 'CLEAN_FOR_PROCESSING'})
+        self.assertEqual(self.queue.get(bad['id'])['status'], JOB_FAILED)
+        self.assertIn('unreadable package', self.queue.get(bad['id'])['error'])
+        self.assertEqual(self.queue.pending_count(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
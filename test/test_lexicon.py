@@ -0,0 +1,136 @@
+import random
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+import fitz
+import app_dual_extraction
+from app_dual_extraction import app, extract_document
+from utils.lexicon import (
+    LEARNED, FUZZY, KNOWN, MISS, DeleteIndex, CorrectionLexicon, edit_distance, learn_htr_corrections, learn_ground_truth,
+)
+
+
+class DeleteIndexTestCase(unittest.TestCase):
+
+    def test_search_matches_a_linear_scan(self):
+        rng = random.Random(3)
+        words = {''.join(rng.choice('ABCDE') for _ in range(rng.randint(3, 8))) for _ in range(400)}
+        index = DeleteIndex()
+        for word in words:
+            index.add(word)
+        self.assertEqual(len(index), len(words))
+        for query in ('ABCDE', 'AAB', 'EDCBAED'):
+            expected = sorted((edit_distance(query, word), word) for word in words if edit_distance(query, word) <= 2)
+            self.assertEqual(index.search(query, 2), expected)
+        self.assertEqual(DeleteIndex().search('ABC', 2), [])
+
+    def test_discarded_values_are_not_found(self):
+        index = DeleteIndex()
+        for word in ('TEACHER', 'TEECHER'):
+            index.add(word)
+        index.discard('TEECHER')
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.search('TEECHER', 2), [(1, 'TEACHER')])
+
+
+class CorrectionLexiconTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.lexicon = CorrectionLexicon()
+        self.lexicon.learn('OCCUPATION', 'ACC0UNTANT', 'Accountant')
+        self.lexicon.learn('OCCUPATION', None, 'CIVIL ENGINEER')
+        self.lexicon.learn('SURNAME', 'MOY0', 'MOYO')
+
+    def test_learned_known_fuzzy_and_missed_values(self):
+        self.assertEqual(self.lexicon.lookup('OCCUPATION', 'acc0untant'), ('ACCOUNTANT', LEARNED))
+        self.assertEqual(self.lexicon.lookup('OCCUPATION', 'Civil  Engineer'), ('Civil  Engineer', KNOWN))
+        self.assertEqual(self.lexicon.lookup('OCCUPATION', 'CIVIL ENG1NEER'), ('CIVIL ENGINEER', FUZZY))
+        self.assertEqual(self.lexicon.lookup('OCCUPATION', 'PHARMACIST'), ('PHARMACIST', MISS))
+        self.assertEqual(self.lexicon.lookup('OCCUPATION', None), (None, None))
+        # Names are only corrected from misreadings seen before
+        self.assertEqual(self.lexicon.lookup('SURNAME', 'MOY0'), ('MOYO', LEARNED))
+        self.assertEqual(self.lexicon.lookup('SURNAME', 'MOYA'), ('MOYA', MISS))
+
+    def test_ties_and_confirmed_values_are_left_alone(self):
+        self.lexicon.learn('EMPLOYER', None, 'ZIMPLATS')
+        self.lexicon.learn('EMPLOYER', None, 'ZIMPLATZ')
+        self.assertEqual(self.lexicon.lookup('EMPLOYER', 'ZIMPLAT5'), ('ZIMPLAT5', MISS))
+        self.lexicon.learn('EMPLOYER', 'X', 'ZIMPLATS')
+        self.assertEqual(self.lexicon.lookup('EMPLOYER', 'ZIMPLAT5'), ('ZIMPLATS', FUZZY))
+
+        # MOYA was corrected once but confirmed as right twice
+        self.lexicon.learn('SURNAME', 'MOYA', 'MOYO')
+        self.lexicon.learn('SURNAME', None, 'MOYA')
+        self.lexicon.learn('SURNAME', None, 'MOYA')
+        self.assertEqual(self.lexicon.lookup('SURNAME', 'MOYA'), ('MOYA', KNOWN))
+
+    def test_a_changed_correction_replaces_what_the_row_taught(self):
+        key = ('htr', '1', 'MANDATE_CARD', 'OCCUPATION')
+        self.lexicon.learn('OCCUPATION', 'TEACHFR', 'TEECHER', key=key)
+        self.assertTrue(self.lexicon.learn('OCCUPATION', 'TEACHFR', 'TEACHER', key=key))
+        self.assertEqual(self.lexicon.lookup('OCCUPATION', 'TEACHFR'), ('TEACHER', LEARNED))
+        # The earlier correction is no longer a known value, nor a fuzzy match
+        self.assertEqual(self.lexicon.lookup('OCCUPATION', 'TEECHER'), ('TEACHER', FUZZY))
+        self.assertEqual(self.lexicon.stats()['OCCUPATION']['known_values'], 3)
+
+    def test_rows_are_learned_once_and_hit_rates_reported(self):
+        rows = [
+            SimpleNamespace(document_id='1', source_type='MANDATE_CARD', field_name='OCCUPATION',
+                            extracted_value='TEACHFR', corrected_value='TEACHER', is_corrected=True),
+            SimpleNamespace(document_id='1', source_type='MANDATE_CARD', field_name='GROSS MONTHLY INCOME',
+                            extracted_value='25O0', corrected_value='2500', is_corrected=True),
+            SimpleNamespace(document_id='2', source_type='MANDATE_CARD', field_name='OCCUPATION',
+                            extracted_value='NURSE', corrected_value=None, is_corrected=False),
+        ]
+        self.assertEqual(learn_htr_corrections(self.lexicon, rows), 1)
+        self.assertEqual(learn_htr_corrections(self.lexicon, rows), 0)
+        truth = SimpleNamespace(document_id='3', surname='NCUBF', gt_surname='NCUBE', name='TADIWA', gt_name='TADIWA',
+                                occupation='FARMER', gt_occupation=None)
+        self.assertEqual(learn_ground_truth(self.lexicon, [truth]), 2)
+
+        self.lexicon.lookup('OCCUPATION', 'TEACHFR')
+        self.lexicon.lookup('OCCUPATION', 'CHEF')
+        self.lexicon.lookup('SURNAME', 'NCUBF')
+        stats = self.lexicon.stats()
+        self.assertEqual(stats['OCCUPATION']['known_values'], 3)
+        self.assertEqual(stats['OCCUPATION']['hit_rate'], 0.5)
+        self.assertEqual(stats['SURNAME']['correction_rate'], 1.0)
+        self.assertEqual(stats['NAME']['lookups'], 0)
+        self.assertIsNone(stats['NAME']['hit_rate'])
+
+
+class LexiconConsultedTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.lexicon = CorrectionLexicon()
+        self.lexicon.learn('OCCUPATION', 'TEACHFR', 'TEACHER')
+        self.lexicon.learn('OCCUPATION', None, 'ACCOUNTANT')
+
+    @mock.patch.object(app_dual_extraction, 'gemini_extract')
+    def test_model_answers(self, gemini_extract):
+        gemini_extract.return_value = {'fields': [{'field_name': 'OCCUPATION', 'extracted_value': 'ACC0UNTANT'}]}
+        with mock.patch.object(app_dual_extraction, 'correction_lexicon', self.lexicon), \
+                mock.patch.dict(app.config, TIERED_EXTRACTION=False):
+            schema = extract_document('123', b'not an image', 'image/jpeg', 'mandate', 'MANDATE_CARD', 'Mandate Card')
+        self.assertEqual(schema.fields[0].extracted_value, 'ACCOUNTANT')
+        self.assertEqual(self.lexicon.stats()['OCCUPATION'][FUZZY], 1)
+
+    @mock.patch.object(app_dual_extraction, 'gemini_extract')
+    def test_tiered_extraction_looks_each_field_up_once(self, gemini_extract):
+        gemini_extract.return_value = {'fields': []}
+        document = fitz.open()
+        page = document.new_page()
+        for number, line in enumerate(['ACCOUNT MANDATE CARD', 'SURNAME: MOYO', 'FIRST NAME: TADIWA',
+                                       'OCCUPATION: TEACHFR', 'GROSS MONTHLY $ 2,500.00']):
+            page.insert_text((72, 72 + 18 * number), line, fontsize=11)
+        pdf = document.tobytes()
+        with mock.patch.object(app_dual_extraction, 'correction_lexicon', self.lexicon), \
+                mock.patch.dict(app.config, TIERED_EXTRACTION=True):
+            schema = extract_document('123', pdf, 'application/pdf', 'mandate', 'MANDATE_CARD', 'Mandate Card')
+        occupation = next(field for field in schema.fields if field.field_name == 'OCCUPATION')
+        self.assertEqual(occupation.extracted_value, 'TEACHER')
+        self.assertEqual(self.lexicon.stats()['OCCUPATION']['lookups'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import unittest
+import tempfile
+import shutil
+from utils.manifest import build_manifest, write_manifest, load_manifest, is_current, current_manifest
+from utils.package_catalog import list_package_files
+
+
+class ManifestTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.package_path = tempfile.mkdtemp()
+        for relative_path in ('kyc/id.pdf', 'mandate/mandate.jpg'):
+            os.makedirs(os.path.join(self.package_path, os.path.dirname(relative_path)), exist_ok=True)
+            with open(os.path.join(self.package_path, relative_path), 'w') as f:
+                f.write(relative_path)
+        self.report = {
+            'account_type': 'INDIVIDUAL',
+            'status': 'FLAGGED_FOR_REVIEW',
+            'missing_documents': ['Proof of Residence'],
+            'documents': [
+                {'relative_path': 'kyc/id.pdf', 'identified_type': 'National ID', 'quality_issues': ['Blurry'],
+                 'company_keywords': False, 'text_sha256': 'a' * 64},
+                {'relative_path': 'mandate/mandate.jpg', 'identified_type': 'Mandate Card', 'quality_issues': [],
+                 'company_keywords': False, 'text_sha256': 'b' * 64},
+            ],
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.package_path)
+
+    def test_manifest_records_analysis_and_is_not_a_document(self):
+        manifest = write_manifest(self.package_path, build_manifest(self.package_path, self.report))
+        entries = {entry['path']: entry for entry in manifest['files']}
+        self.assertEqual(entries['kyc/id.pdf']['category'], 'kyc')
+        self.assertEqual(entries['kyc/id.pdf']['quality_issues'], ['Blurry'])
+        self.assertEqual(entries['mandate/mandate.jpg']['category'], 'mandate')
+        self.assertEqual(entries['mandate/mandate.jpg']['bytes'], len('mandate/mandate.jpg'))
+        self.assertEqual(len(entries['kyc/id.pdf']['sha256']), 64)
+        self.assertNotIn('_manifest.json', list_package_files(self.package_path))
+        self.assertTrue(is_current(load_manifest(self.package_path), self.package_path))
+
+    def test_manifest_is_regenerated_only_when_the_package_changes(self):
+        written = write_manifest(self.package_path, build_manifest(self.package_path, self.report))
+        self.assertEqual(current_manifest(self.package_path)['generated_at'], written['generated_at'])
+
+        with open(os.path.join(self.package_path, 'kyc', 'proof_of_residence.pdf'), 'w') as f:
+            f.write('new document')
+        regenerated = current_manifest(self.package_path)
+        entries = {entry['path']: entry for entry in regenerated['files']}
+        self.assertIn('kyc/proof_of_residence.pdf', entries)
+        self.assertIsNone(entries['kyc/proof_of_residence.pdf']['identified_type'])
+        # Analysis of unchanged files is carried over
+        self.assertEqual(entries['kyc/id.pdf']['identified_type'], 'National ID')
+        self.assertEqual(regenerated['status'], 'FLAGGED_FOR_REVIEW')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import json
+import logging
+import unittest
+from utils.metrics import stage, gemini_call, is_rate_limited, STAGE_SECONDS, GEMINI_REQUESTS
+from utils.logs import JsonFormatter
+
+class RateLimited(Exception):
+    code = 429
+
+class MetricsTestCase(unittest.TestCase):
+
+    def sample(self, metric, suffix, **labels):
+        for family in metric.collect():
+            for sample in family.samples:
+                if sample.name == family.name + suffix and sample.labels == labels:
+                    return sample.value
+        return 0.0
+
+    def test_stage_records_histogram_and_timings(self):
+        before = self.sample(STAGE_SECONDS, '_count', stage='unit_test')
+        timings = {}
+        with stage('unit_test', timings):
+            pass
+        with stage('unit_test', timings):
+            pass
+        self.assertEqual(self.sample(STAGE_SECONDS, '_count', stage='unit_test'), before + 2)
+        self.assertGreaterEqual(timings['unit_test'], 0.0)
+
+    def test_gemini_call_counts_rate_limits(self):
+        before = self.sample(GEMINI_REQUESTS, '_total', outcome='rate_limited')
+        with self.assertRaises(RateLimited):
+            with gemini_call():
+                raise RateLimited()
+        self.assertEqual(self.sample(GEMINI_REQUESTS, '_total', outcome='rate_limited'), before + 1)
+        self.assertFalse(is_rate_limited(ValueError('bad json')))
+
+    def test_json_formatter_includes_extra_fields(self):
+        record = logging.getLogger('aura.test').makeRecord(
+            'aura.test', logging.INFO, __file__, 1, 'OCR page done', (), None, extra={'page': 3}
+        )
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry['message'], 'OCR page done')
+        self.assertEqual(entry['level'], 'INFO')
+        self.assertEqual(entry['page'], 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import app_dual_extraction
+from app_dual_extraction import app, ID_PROMPT, MANDATE_PROMPT, parse_gemini_json
+from benchmarks.fake_gemini import FakeGemini, FakeGeminiServer, CANNED_FIELDS
+from utils.metrics import is_rate_limited
+from utils.model_backends import HttpBackend, ModelError, get_model_backend
+from utils.package_catalog import PackageCatalog
+from utils.extraction_tokens import issue_extraction_token
+
+
+class HttpBackendTestCase(unittest.TestCase):
+
+    def serve(self, **behaviour):
+        server = FakeGeminiServer(FakeGemini(latency=0, **behaviour)).start()
+        self.addCleanup(server.stop)
+        return server
+
+    def test_returns_canned_fields_by_prompt(self):
+        server = self.serve()
+        backend = HttpBackend(server.url, 'gemini-2.5-flash')
+        mandate = backend.generate(MANDATE_PROMPT, b'image', 'image/jpeg')
+        national_id = backend.generate(ID_PROMPT, b'image', 'image/jpeg')
+        self.assertEqual(parse_gemini_json(mandate.text), CANNED_FIELDS['mandate'])
+        self.assertEqual(parse_gemini_json(national_id.text), CANNED_FIELDS['id'])
+        self.assertGreater(mandate.usage_metadata.prompt_token_count, 0)
+        self.assertEqual(server.fake.stats()['requests']['ok'], 2)
+
+    def test_rate_limit_and_server_errors(self):
+        backend = HttpBackend(self.serve(rate_429=1.0).url, 'gemini-2.5-flash')
+        with self.assertRaises(ModelError) as raised:
+            backend.generate(MANDATE_PROMPT, b'image', 'image/jpeg')
+        self.assertTrue(is_rate_limited(raised.exception))
+
+        backend = HttpBackend(self.serve(rate_5xx=1.0).url, 'gemini-2.5-flash')
+        with self.assertRaises(ModelError) as raised:
+            backend.generate(MANDATE_PROMPT, b'image', 'image/jpeg')
+        self.assertEqual(raised.exception.code, 503)
+        self.assertFalse(is_rate_limited(raised.exception))
+
+    def test_malformed_answer_fails_to_parse(self):
+        backend = HttpBackend(self.serve(rate_malformed=1.0).url, 'gemini-2.5-flash')
+        response = backend.generate(MANDATE_PROMPT, b'image', 'image/jpeg')
+        with self.assertRaises(ValueError):
+            parse_gemini_json(response.text)
+
+    def test_backend_selection(self):
+        config = {'MODEL_BACKEND': 'http', 'MODEL_BACKEND_URL': 'http://127.0.0.1:1', 'GEMINI_MODEL': 'm'}
+        self.assertIs(get_model_backend(config), get_model_backend(dict(config)))
+        with self.assertRaises(ModelError):
+            get_model_backend({'MODEL_BACKEND': 'gemini', 'GEMINI_API_KEY': None, 'GEMINI_MODEL': 'm'})
+        with self.assertRaises(ModelError):
+            get_model_backend({'MODEL_BACKEND': 'carrier-pigeon', 'GEMINI_MODEL': 'm'})
+
+
+class ExtractionAgainstFakeModelTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        package_path = os.path.join(self.test_dir, '123456789')
+        os.makedirs(package_path)
+        for name in ('mandate.jpg', 'id.jpg'):
+            with open(os.path.join(package_path, name), 'wb') as f:
+                f.write(b'image bytes')
+        self.saved_config = dict(app.config)
+        app.config.update(TESTING=True, CATALOG_DB=os.path.join(self.test_dir, 'aura_catalog.db'),
+                          GEMINI_PAUSE_SECONDS=0, LEXICON_REFRESH_SECONDS=0, MODEL_BACKEND='http',
+                          EXTRACTION_SECRET='test-secret')
+        PackageCatalog(app.config['CATALOG_DB']).register_directory(package_path, 'CLEAN_FOR_PROCESSING')
+        self.client = app.test_client()
+
+    def tearDown(self):
+        app.config.clear()
+        app.config.update(self.saved_config)
+        shutil.rmtree(self.test_dir)
+
+    def extract(self, **behaviour):
+        server = FakeGeminiServer(FakeGemini(latency=0, **behaviour)).start()
+        self.addCleanup(server.stop)
+        app.config['MODEL_BACKEND_URL'] = server.url
+        with mock.patch.object(app_dual_extraction, 'store_htr_results'):
+            return self.client.post('/extract_by_reference', json={
+                'package_name': '123456789', 'mandate_path': 'mandate.jpg', 'id_path': 'id.jpg',
+            }, headers={'Authorization': 'Bearer ' + issue_extraction_token('test-secret', '123456789')})
+
+    def test_extracts_through_http_backend(self):
+        response = self.extract()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.get_json()['mandate_card']['profession'], 'ACCOUNTANT')
+        self.assertEqual(response.get_json()['national_id']['id_number'], '63-2001234-A-42')
+
+    def test_model_failures_map_to_gateway_errors(self):
+        self.assertEqual(self.extract(rate_429=1.0).status_code, 503)
+        self.assertEqual(self.extract(rate_5xx=1.0).status_code, 502)
+        self.assertEqual(self.extract(rate_malformed=1.0).status_code, 422)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import time
+import unittest
+import tempfile
+import shutil
+from utils.package_watcher import PackageWatcher, mark_upload_complete
+
+class PackageWatcherTestCase(unittest.TestCase):
+
+    use_inotify = True
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.dispatched = []
+        self.watcher = PackageWatcher(
+            self.test_dir, self.dispatched.append, settle_seconds=None, use_inotify=self.use_inotify
+        )
+        self.watcher.start()
+
+    def tearDown(self):
+        self.watcher.stop(timeout=5)
+        shutil.rmtree(self.test_dir)
+
+    def wait_for_dispatch(self, count, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while len(self.dispatched) < count and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+    def test_package_dispatched_only_after_marker(self):
+        """A package still being written is not dispatched until its marker appears."""
+        package_path = os.path.join(self.test_dir, '123456789')
+        os.makedirs(os.path.join(package_path, 'kyc'))
+        with open(os.path.join(package_path, 'kyc', 'id.pdf'), 'w') as f:
+            f.write('dummy content')
+
+        time.sleep(0.6)
+        self.assertEqual(self.dispatched, [])
+
+        mark_upload_complete(package_path)
+        self.wait_for_dispatch(1)
+        self.assertEqual(self.dispatched, ['123456789'])
+
+    def test_package_dispatched_once(self):
+        """Rewriting the marker does not dispatch the same package twice."""
+        package_path = os.path.join(self.test_dir, '987654321')
+        os.makedirs(package_path)
+        mark_upload_complete(package_path)
+        self.wait_for_dispatch(1)
+        mark_upload_complete(package_path)
+        time.sleep(0.6)
+        self.assertEqual(self.dispatched, ['987654321'])
+
+class PollingPackageWatcherTestCase(PackageWatcherTestCase):
+
+    use_inotify = False
+
+if __name__ == '__main__':
+    unittest.main()
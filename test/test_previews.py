@@ -0,0 +1,63 @@
+import os
+import unittest
+import tempfile
+import shutil
+from unittest import mock
+from PIL import Image
+from utils.previews import PreviewCache, get_preview, generate_previews, page_count
+
+
+class PreviewCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.scan = os.path.join(self.test_dir, 'scan.jpg')
+        Image.new('RGB', (2400, 3200), 'white').save(self.scan)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_preview_is_rendered_once_and_smaller_than_the_original(self):
+        cache = PreviewCache(os.path.join(self.test_dir, 'cache'), 10 * 1024 * 1024)
+        path, seconds = get_preview(cache, self.scan, 'a' * 64, 'page', 0)
+        self.assertGreater(seconds, 0)
+        with Image.open(path) as preview:
+            self.assertEqual(preview.size, (1200, 1600))
+
+        cached_path, seconds = get_preview(cache, self.scan, 'a' * 64, 'page', 0)
+        self.assertEqual((cached_path, seconds), (path, 0.0))
+
+    def test_generate_previews_renders_thumbnail_and_pages(self):
+        cache = PreviewCache(os.path.join(self.test_dir, 'cache'), 10 * 1024 * 1024)
+        stats = generate_previews(cache, self.scan, 'b' * 64)
+        self.assertEqual(stats['pages'], page_count(self.scan))
+        self.assertIsNotNone(cache.get('b' * 64, 'thumb', 0))
+        self.assertIsNotNone(cache.get('b' * 64, 'page', 0))
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = PreviewCache(os.path.join(self.test_dir, 'cache'), 10 * 1024 * 1024)
+        first, _ = get_preview(cache, self.scan, 'c' * 64, 'thumb', 0)
+        os.utime(first, (0, 0))  # make it the oldest entry
+        cache.max_bytes = os.path.getsize(first)
+        get_preview(cache, self.scan, 'd' * 64, 'thumb', 0)
+        self.assertIsNone(cache.get('c' * 64, 'thumb', 0))
+        self.assertIsNotNone(cache.get('d' * 64, 'thumb', 0))
+
+    def test_cache_only_walks_the_directory_when_over_budget(self):
+        cache = PreviewCache(os.path.join(self.test_dir, 'cache'), 10 * 1024 * 1024)
+        with mock.patch('utils.previews.os.walk', wraps=os.walk) as walk:
+            first, _ = get_preview(cache, self.scan, 'e' * 64, 'thumb', 0)
+            preview_bytes = os.path.getsize(first)
+            get_preview(cache, self.scan, 'f' * 64, 'thumb', 0)
+            walk.assert_not_called()
+            self.assertEqual(cache.size_bytes(), 2 * preview_bytes)
+
+            cache.max_bytes = preview_bytes
+            get_preview(cache, self.scan, 'g' * 64, 'thumb', 0)
+            walk.assert_called()
+        self.assertEqual(cache.size_bytes(), preview_bytes)
+        # A cache opened later on the same directory shares the running total
+        self.assertEqual(PreviewCache(cache.root, cache.max_bytes).size_bytes(), preview_bytes)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import time
+import pstats
+import unittest
+import tempfile
+import shutil
+from utils.profiling import SamplingProfiler, ProfileStore, Capture, job_profiler
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+class ProfilingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_sampling_profiler_records_folded_stacks(self):
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start()
+        busy_wait(0.1)
+        profiler.stop()
+        folded = profiler.folded()
+        self.assertIn('busy_wait (test_profiling.py:', folded)
+        stack, count = folded.splitlines()[0].rsplit(' ', 1)
+        self.assertGreater(int(count), 0)
+
+    def test_cprofile_capture_is_readable_by_pstats(self):
+        capture = Capture('cprofile')
+        busy_wait(0.01)
+        data, elapsed = capture.finish()
+        path = os.path.join(self.test_dir, 'request.prof')
+        with open(path, 'wb') as f:
+            f.write(data)
+        functions = [func[2] for func in pstats.Stats(path).stats]
+        self.assertIn('busy_wait', functions)
+        self.assertGreater(elapsed, 0)
+
+    def test_store_keeps_newest_profiles(self):
+        store = ProfileStore(self.test_dir, keep=2)
+        for profile_id in ('a', 'b', 'c'):
+            store.save(profile_id, 'sample', b'main 1\n', {'path': '/'})
+            time.sleep(0.01)
+        self.assertEqual([profile['id'] for profile in store.list()], ['c', 'b'])
+        self.assertIsNone(store.get('a'))
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'a.folded')))
+
+    def test_job_profiler_only_runs_when_requested(self):
+        config = {'PROFILE_DIR': self.test_dir, 'PROFILE_KEEP': 10, 'PROFILE_INTERVAL': 0.001, 'PROFILE_JOBS': False}
+        with job_profiler(config, 'extraction', {'id': 1, 'job_key': 'pkg', 'payload': {}}):
+            busy_wait(0.01)
+        self.assertEqual(ProfileStore(self.test_dir).list(), [])
+
+        with job_profiler(config, 'extraction', {'id': 2, 'job_key': 'pkg', 'payload': {'profile': True}}):
+            busy_wait(0.05)
+        self.assertEqual(ProfileStore(self.test_dir).list()[0]['id'], 'job-extraction-2')
+
+if __name__ == '__main__':
+    unittest.main()
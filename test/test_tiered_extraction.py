@@ -0,0 +1,131 @@
+import unittest
+from unittest import mock
+import fitz
+import app_dual_extraction
+from app_dual_extraction import app, extract_document
+from utils.tiered_extraction import (
+    SOURCE_LOCAL, SOURCE_MODEL, read_local_fields, unresolved_fields, merge_fields, field_names,
+)
+
+ID_CARD_LINES = [
+    'REPUBLIC OF ZIMBABWE',
+    'NATIONAL ID NUMBER: 63-2001234-A-42',
+    'SURNAME: CHITEZA',
+    'GIVEN NAMES: CLETOS',
+    'DATE OF BIRTH: 24/12/1985',
+    'SEX: M NATIONALITY: ZIMBABWEAN',
+    'DATE OF ISSUE: 15/06/2017',
+    'EXPIRY DATE: 14/06/2027',
+]
+MANDATE_LINES = [
+    'ACCOUNT MANDATE CARD',
+    'SURNAME: MOYO',
+    'FIRST NAME: TADIWA',
+    'OCCUPATION: CIVIL ENGINEER',
+    "EMPLOYER'S NAME: SELF",
+    'MONTHLY SALARY INCOME (ATTACH PAYSLIP)',
+    'GROSS MONTHLY $ 2,500.00',
+]
+
+
+def ocr(lines, confidences=None):
+    """Words as Tesseract would report them, at 0.96 unless confidences overrides a word."""
+    confidences = confidences or {}
+    return [
+        {'text': text, 'confidence': confidences.get(text, 0.96), 'line': (1, 1, number), 'box': (0, 0, 0, 0)}
+        for number, line in enumerate(lines) for text in line.split()
+    ]
+
+
+def text_pdf(lines):
+    document = fitz.open()
+    page = document.new_page()
+    for number, line in enumerate(lines):
+        page.insert_text((72, 72 + 18 * number), line, fontsize=11)
+    data = document.tobytes()
+    document.close()
+    return data
+
+
+class LocalFieldsTestCase(unittest.TestCase):
+
+    def test_reads_labelled_id_fields(self):
+        fields = read_local_fields(ocr(ID_CARD_LINES), 'id')
+        self.assertEqual(fields['ID_NUMBER'], ('63-2001234-A-42', 0.96))
+        self.assertEqual(fields['DATE_OF_BIRTH'][0], '1985-12-24')
+        self.assertEqual(fields['GENDER'][0], 'MALE')
+        self.assertEqual(fields['NATIONALITY'][0], 'ZIMBABWEAN')
+        self.assertEqual(fields['FULL NAME'][0], 'CLETOS CHITEZA')
+        self.assertEqual(fields['ISSUE DATE'][0], '2017-06-15')
+        self.assertEqual(fields['PLACE OF BIRTH'], (None, 0.0))
+        self.assertEqual(unresolved_fields('id', fields, 0.9), ['PLACE OF BIRTH'])
+
+    def test_mandate_skips_labels_without_a_valid_value(self):
+        fields = read_local_fields(ocr(MANDATE_LINES), 'mandate')
+        self.assertEqual(fields['GROSS MONTHLY INCOME'][0], '2500.00')
+        self.assertEqual(fields['OCCUPATION'], ('CIVIL ENGINEER', 0.96))
+        self.assertEqual(fields['NAME'][0], 'TADIWA')
+
+    def test_confidence_is_the_weakest_word_and_zero_when_invalid(self):
+        fields = read_local_fields(ocr(ID_CARD_LINES, {'CLETOS': 0.41, '24/12/1985': 0.55}), 'id')
+        self.assertEqual(fields['FULL NAME'][1], 0.41)
+        self.assertEqual(fields['DATE_OF_BIRTH'][1], 0.55)
+
+        fields = read_local_fields(ocr([line.replace('63-2001234-A-42', '6S-20O1Z34') for line in ID_CARD_LINES]), 'id')
+        self.assertEqual(fields['ID_NUMBER'][1], 0.0)
+        self.assertIn('ID_NUMBER', unresolved_fields('id', fields, 0.9))
+
+    def test_merge_records_provenance(self):
+        local = {'SURNAME': ('MOYO', 0.97), 'NAME': ('TAD1WA', 0.3), 'OCCUPATION': (None, 0.0),
+                 'GROSS MONTHLY INCOME': ('2500.00', 0.95)}
+        model = [{'field_name': 'NAME', 'extracted_value': 'TADIWA'},
+                 {'field_name': 'SURNAME', 'extracted_value': 'MOY0'},
+                 {'field_name': 'EMPLOYER', 'extracted_value': 'SELF'}]
+        merged = {field['field_name']: field for field in merge_fields(field_names('mandate'), local, model, 0.9)}
+        self.assertEqual(merged['SURNAME']['extracted_value'], 'MOYO')
+        self.assertEqual(merged['SURNAME']['source'], SOURCE_LOCAL)
+        self.assertEqual(merged['NAME']['extracted_value'], 'TADIWA')
+        self.assertEqual(merged['NAME']['source'], SOURCE_MODEL)
+        self.assertNotIn('OCCUPATION', merged)
+        self.assertEqual(merged['EMPLOYER']['source'], SOURCE_MODEL)
+
+
+class TieredExtractDocumentTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.saved_config = dict(app.config)
+        app.config.update(TIERED_EXTRACTION=True, LOCAL_CONFIDENCE_THRESHOLD=0.9)
+
+    def tearDown(self):
+        app.config.clear()
+        app.config.update(self.saved_config)
+
+    @mock.patch.object(app_dual_extraction, 'gemini_extract')
+    def test_model_not_called_when_every_field_is_read_locally(self, gemini_extract):
+        schema = extract_document('123', text_pdf(MANDATE_LINES), 'application/pdf', 'mandate', 'MANDATE_CARD',
+                                  'Mandate Card')
+        gemini_extract.assert_not_called()
+        self.assertEqual({field.source for field in schema.fields}, {SOURCE_LOCAL})
+        self.assertEqual(len(schema.fields), 4)
+
+    @mock.patch.object(app_dual_extraction, 'gemini_extract')
+    def test_only_unresolved_fields_are_requested(self, gemini_extract):
+        gemini_extract.return_value = {'fields': [{'field_name': 'PLACE OF BIRTH', 'extracted_value': 'HARARE'}]}
+        schema = extract_document('123', text_pdf(ID_CARD_LINES), 'application/pdf', 'id', 'ID_CARD', 'National ID')
+        prompt = gemini_extract.call_args.args[1]
+        self.assertIn('National ID: PLACE OF BIRTH.', prompt)
+        fields = {field.field_name: field for field in schema.fields}
+        self.assertEqual(fields['PLACE OF BIRTH'].source, SOURCE_MODEL)
+        self.assertEqual(fields['ID_NUMBER'].source, SOURCE_LOCAL)
+        self.assertEqual(fields['ID_NUMBER'].confidence_score, 1.0)
+
+    @mock.patch.object(app_dual_extraction, 'gemini_extract')
+    def test_unreadable_documents_go_to_the_model_whole(self, gemini_extract):
+        gemini_extract.return_value = {'fields': [{'field_name': 'OCCUPATION', 'extracted_value': 'CHEF'}]}
+        schema = extract_document('123', b'not an image', 'image/jpeg', 'mandate', 'MANDATE_CARD', 'Mandate Card')
+        self.assertEqual(gemini_extract.call_args.args[1], app_dual_extraction.MANDATE_PROMPT)
+        self.assertEqual([field.field_name for field in schema.fields], ['OCCUPATION'])
+
+
+if __name__ == '__main__':
+    unittest.main()
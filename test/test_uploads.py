@@ -0,0 +1,43 @@
+import io
+import os
+import unittest
+import tempfile
+import shutil
+from utils.uploads import BlobStore, FileTooLarge, hash_file
+
+
+class BlobStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.store = BlobStore(os.path.join(self.test_dir, 'blobs'))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_identical_content_is_stored_once(self):
+        first = os.path.join(self.test_dir, 'a.pdf')
+        second = os.path.join(self.test_dir, 'b.pdf')
+        stored_first = self.store.store_stream(io.BytesIO(b'same scan'), first)
+        stored_second = self.store.store_stream(io.BytesIO(b'same scan'), second)
+
+        self.assertFalse(stored_first['deduplicated'])
+        self.assertTrue(stored_second['deduplicated'])
+        self.assertEqual(stored_first['sha256'], hash_file(first))
+        self.assertTrue(os.path.samefile(first, second))
+        self.assertEqual(os.listdir(self.store.tmp_dir), [])
+
+    def test_oversized_stream_is_discarded(self):
+        with self.assertRaises(FileTooLarge):
+            self.store.store_stream(io.BytesIO(b'x' * 100), os.path.join(self.test_dir, 'big.pdf'), max_bytes=10)
+        self.assertEqual(os.listdir(self.store.tmp_dir), [])
+
+    def test_prune_removes_unreferenced_blobs(self):
+        document = os.path.join(self.test_dir, 'a.pdf')
+        self.store.store_stream(io.BytesIO(b'scan'), document)
+        self.assertEqual(self.store.prune(), 0)
+        os.remove(document)
+        self.assertEqual(self.store.prune(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import bisect
+import heapq
+import threading
+from collections import defaultdict
+
+# Each label already given in a group, and each pick from it in the same
+# batch, multiplies that group's priority by this
+DIVERSITY_DECAY = 0.7
+# Fields below this confidence are the ones a document is "unsure about"
+UNSURE_BELOW = 0.9
+# A group for documents sure of every field
+CONFIDENT_GROUP = 'confident'
+
+
+class LabelQueue:
+    """
+    Chooses which extracted documents humans should label next.
+
+    Unlabelled documents are ranked by uncertainty, the mean of
+    (1 - confidence) over their fields, so the ones the extractor was least
+    sure of come first. To spread labelling effort, documents are grouped by
+    which fields they are unsure about; every label already given in a
+    group, and every document taken from it for the same batch, multiplies
+    the group's priority by DIVERSITY_DECAY.
+
+    Each group keeps its documents in a sorted list, so adding, re-scoring
+    or labelling a document touches only that document, and top(k) merges
+    the group heads in O(groups + k log groups) without re-scoring anything.
+    """
+
+    def __init__(self, unsure_below=UNSURE_BELOW, decay=DIVERSITY_DECAY):
+        self.unsure_below = unsure_below
+        self.decay = decay
+        self._documents = {}  # document_id -> (fields, group, uncertainty)
+        self._groups = defaultdict(list)  # group -> sorted [(-uncertainty, document_id)]
+        self._labels = defaultdict(int)  # group -> labels given
+        self._labelled = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __contains__(self, document_id):
+        return document_id in self._documents
+
+    def _group(self, fields):
+        unsure = sorted(f'{source}:{name}' for (source, name), confidence in fields.items()
+                        if confidence is None or confidence < self.unsure_below)
+        return '|'.join(unsure) or CONFIDENT_GROUP
+
+    def _remove(self, document_id):
+        entry = self._documents.pop(document_id, None)
+        if entry is not None:
+            _, group, uncertainty = entry
+            entries = self._groups[group]
+            del entries[bisect.bisect_left(entries, (-uncertainty, document_id))]
+            if not entries:
+                del self._groups[group]
+        return entry
+
+    def update(self, document_id, source_type, confidences):
+        """
+        Adds a document, or re-scores it, from {field name: confidence} of
+        one of its sources (e.g. MANDATE_CARD). A confidence of None counts
+        as fully uncertain. Documents already labelled are ignored.
+        """
+        with self._lock:
+            if document_id in self._labelled:
+                return
+            entry = self._remove(document_id)
+            fields = dict(entry[0]) if entry else {}
+            fields.update({(source_type, name): confidence for name, confidence in confidences.items()})
+            uncertainty = sum(1.0 - (confidence if confidence is not None else 0.0)
+                              for confidence in fields.values()) / max(1, len(fields))
+            group = self._group(fields)
+            self._documents[document_id] = (fields, group, uncertainty)
+            bisect.insort(self._groups[group], (-uncertainty, document_id))
+
+    def mark_labelled(self, document_id):
+        """Takes a labelled or corrected document out of the queue and counts the label against its group."""
+        with self._lock:
+            entry = self._remove(document_id)
+            self._labelled.add(document_id)
+            if entry is not None:
+                self._labels[entry[1]] += 1
+
+    def top(self, k=10):
+        """The k documents to label next, most valuable first."""
+        with self._lock:
+            heads = []
+            for group, entries in self._groups.items():
+                factor = self.decay ** self._labels[group]
+                heads.append((entries[0][0] * factor, group, 0, factor))
+            heapq.heapify(heads)
+            picked = []
+            while heads and len(picked) < k:
+                priority, group, index, factor = heapq.heappop(heads)
+                entries = self._groups[group]
+                uncertainty, document_id = entries[index]
+                picked.append({'document_id': document_id, 'uncertainty': round(-uncertainty, 4),
+                               'priority': round(-priority, 4), 'group': group})
+                if index + 1 < len(entries):
+                    factor *= self.decay
+                    heapq.heappush(heads, (entries[index + 1][0] * factor, group, index + 1, factor))
+            return picked
+
+    def stats(self):
+        with self._lock:
+            return {
+                'unlabelled': len(self._documents),
+                'labelled': len(self._labelled),
+                'groups': {group: {'unlabelled': len(entries), 'labels': self._labels[group]}
+                           for group, entries in self._groups.items()},
+            }
+
+
+def apply_htr_results(queue, rows):
+    """
+    Feeds htr_extracted_data rows (db_models.HTRResult, or anything with
+    its attributes) into a LabelQueue. A corrected field marks its whole
+    document as labelled, since a reviewer has been through it.
+    """
+    documents = defaultdict(dict)
+    corrected = set()
+    for row in rows:
+        if row.is_corrected:
+            corrected.add(row.document_id)
+        documents[(row.document_id, row.source_type)][row.field_name] = row.confidence_score
+    for (document_id, source_type), confidences in documents.items():
+        if document_id not in corrected:
+            queue.update(document_id, source_type, confidences)
+    for document_id in corrected:
+        queue.mark_labelled(document_id)
+
+
+def apply_document_extractions(queue, rows, source_type='MANDATE_CARD'):
+    """
+    Feeds document_extractions rows (models.DocumentExtraction) into a
+    LabelQueue. Those rows carry no confidences, so their fields count as
+    fully uncertain until scored results for the same document arrive;
+    rows with ground truth are labelled.
+    """
+    for row in rows:
+        if row.gt_updated_at is not None:
+            queue.mark_labelled(row.document_id)
+        elif row.document_id not in queue:
+            queue.update(row.document_id, source_type,
+                         dict.fromkeys(('SURNAME', 'NAME', 'OCCUPATION', 'GROSS MONTHLY INCOME')))
@@ -0,0 +1,185 @@
+import os
+import threading
+from contextlib import contextmanager
+
+# --- Cost model ---
+# PDFs are rasterised for OCR at this DPI (see document_processor.extract_text_from_pdf).
+OCR_DPI = 300
+# Bytes held per rasterised pixel: the RGB page, OpenCV's grayscale copy and
+# the float64 Laplacian used by the blur check.
+BYTES_PER_PIXEL = 3 + 1 + 8
+# Baseline memory for a worker handling any document (interpreter, Tesseract).
+BASE_MEMORY_BYTES = 64 * 1024 * 1024
+# A4 at OCR_DPI, used when a page size cannot be read.
+DEFAULT_PAGE_PIXELS = 2480 * 3508
+# Every document is OCR'd once; classification and identification share the text.
+OCR_PASSES = 1
+
+# --- Lanes ---
+SMALL_LANE = 'small'
+LARGE_LANE = 'large'
+LANES = (SMALL_LANE, LARGE_LANE)
+
+# Packages beyond any of these limits go to the large lane.
+LARGE_PACKAGE_PAGES = 10
+LARGE_PACKAGE_MEMORY_BYTES = 512 * 1024 * 1024
+LARGE_PACKAGE_FILE_BYTES = 50 * 1024 * 1024
+
+
+def _pdf_pages(file_path):
+    """Returns (page_count, largest page in pixels at OCR_DPI) for a PDF."""
+    import PyPDF2
+    with open(file_path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        pages = len(reader.pages)
+        largest = 0
+        for page in reader.pages:
+            box = page.mediabox
+            width = float(box.width) / 72 * OCR_DPI
+            height = float(box.height) / 72 * OCR_DPI
+            largest = max(largest, int(width * height))
+    return pages, largest or DEFAULT_PAGE_PIXELS
+
+
+def _image_pages(file_path):
+    """Returns (frame_count, pixels per frame) for an image, reading only its header."""
+    from PIL import Image
+    with Image.open(file_path) as img:
+        width, height = img.size
+        frames = getattr(img, 'n_frames', 1)
+    return frames, width * height
+
+
+def estimate_document_cost(file_path):
+    """
+    Estimates what analysing one document will cost from its page count,
+    pixel dimensions and file size, without decoding it.
+    """
+    size_bytes = os.path.getsize(file_path)
+    try:
+        if os.path.splitext(file_path)[1].lower() == '.pdf':
+            pages, page_pixels = _pdf_pages(file_path)
+        else:
+            pages, page_pixels = _image_pages(file_path)
+    except Exception:
+        # Unreadable headers: assume one page per MB, at least one A4 page
+        pages, page_pixels = max(1, size_bytes // (1024 * 1024)), DEFAULT_PAGE_PIXELS
+    return {
+        'pages': pages,
+        'page_pixels': page_pixels,
+        'bytes': size_bytes,
+        # Pages are rasterised one at a time, so memory is bounded by the largest page
+        'memory_bytes': BASE_MEMORY_BYTES + page_pixels * BYTES_PER_PIXEL,
+        'ocr_pages': pages * OCR_PASSES,
+    }
+
+
+def estimate_package_cost(file_paths):
+    """Combines document estimates; documents in a package are analysed one after another."""
+    documents = [estimate_document_cost(path) for path in file_paths]
+    cost = {
+        'pages': sum(d['pages'] for d in documents),
+        'bytes': sum(d['bytes'] for d in documents),
+        'memory_bytes': max((d['memory_bytes'] for d in documents), default=BASE_MEMORY_BYTES),
+        'ocr_pages': sum(d['ocr_pages'] for d in documents),
+    }
+    cost['lane'] = choose_lane(cost)
+    return cost
+
+
+def choose_lane(cost):
+    if (cost['pages'] > LARGE_PACKAGE_PAGES
+            or cost['memory_bytes'] > LARGE_PACKAGE_MEMORY_BYTES
+            or cost['bytes'] > LARGE_PACKAGE_FILE_BYTES):
+        return LARGE_LANE
+    return SMALL_LANE
+
+
+class AdmissionController:
+    """
+    Admits package analyses against a shared memory and CPU budget.
+
+    Every admitted job holds its estimated memory and one CPU slot until it
+    finishes. The large lane additionally has its own concurrency cap and may
+    only use large_memory_fraction of the budget, so small packages always
+    find headroom. A job estimated above what its lane may use cannot share:
+    it waits for the controller to be idle and then holds the whole budget,
+    and jobs arriving while it waits queue behind it so it is not starved.
+    Estimates beyond the whole budget are admitted the same way; they are
+    alone, but the budget cannot hold them.
+    """
+
+    def __init__(self, memory_budget_bytes, cpu_slots=None, large_lane_limit=1, large_memory_fraction=0.5):
+        self.memory_budget = memory_budget_bytes
+        self.cpu_slots = cpu_slots or os.cpu_count() or 1
+        self.lane_limits = {SMALL_LANE: None, LARGE_LANE: large_lane_limit}
+        self.lane_memory = {
+            SMALL_LANE: memory_budget_bytes,
+            LARGE_LANE: int(memory_budget_bytes * large_memory_fraction),
+        }
+        self._condition = threading.Condition()
+        self.memory_in_use = 0
+        self.cpu_in_use = 0
+        self.lane_active = {lane: 0 for lane in LANES}
+        self.lane_memory_in_use = {lane: 0 for lane in LANES}
+        self.exclusive_waiting = 0
+
+    def charge(self, cost):
+        """The memory a job is charged: its estimate, or the whole budget if that is more than its lane may use."""
+        lane = cost.get('lane', SMALL_LANE)
+        if cost['memory_bytes'] > self.lane_memory[lane]:
+            return self.memory_budget
+        return cost['memory_bytes']
+
+    def _fits(self, lane, memory, exclusive):
+        if exclusive:
+            return self.cpu_in_use == 0
+        limit = self.lane_limits[lane]
+        return (
+            not self.exclusive_waiting
+            and self.memory_in_use + memory <= self.memory_budget
+            and self.lane_memory_in_use[lane] + memory <= self.lane_memory[lane]
+            and self.cpu_in_use < self.cpu_slots
+            and (limit is None or self.lane_active[lane] < limit)
+        )
+
+    @contextmanager
+    def admit(self, cost, timeout=None):
+        """Blocks until the job fits within the budget, then holds its share while it runs."""
+        lane = cost.get('lane', SMALL_LANE)
+        memory = self.charge(cost)
+        exclusive = cost['memory_bytes'] > self.lane_memory[lane]
+        with self._condition:
+            self.exclusive_waiting += exclusive
+            try:
+                admitted = self._condition.wait_for(lambda: self._fits(lane, memory, exclusive), timeout)
+            finally:
+                self.exclusive_waiting -= exclusive
+                # Jobs held back for this one may now fit
+                if exclusive:
+                    self._condition.notify_all()
+            if not admitted:
+                raise TimeoutError(f"No capacity for a {memory}-byte job in the {lane} lane")
+            self.memory_in_use += memory
+            self.lane_memory_in_use[lane] += memory
+            self.cpu_in_use += 1
+            self.lane_active[lane] += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.memory_in_use -= memory
+                self.lane_memory_in_use[lane] -= memory
+                self.cpu_in_use -= 1
+                self.lane_active[lane] -= 1
+                self._condition.notify_all()
+
+    def snapshot(self):
+        with self._condition:
+            return {
+                'memory_in_use': self.memory_in_use,
+                'memory_budget': self.memory_budget,
+                'cpu_in_use': self.cpu_in_use,
+                'cpu_slots': self.cpu_slots,
+                'lane_active': dict(self.lane_active),
+            }
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from utils.ingestion import gather_package_files, analyse_package
+
+
+def find_package_dirs(root_dir):
+    """
+    Finds package directories under root_dir. A directory holding a
+    package_info.json is a package; if the tree has none, every immediate
+    subdirectory of root_dir is treated as a package.
+    """
+    packages = []
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        if 'package_info.json' in filenames and dirpath != root_dir:
+            packages.append(dirpath)
+            dirnames[:] = []  # Documents inside a package are not packages themselves
+    if not packages:
+        packages = [
+            os.path.join(root_dir, name)
+            for name in os.listdir(root_dir)
+            if os.path.isdir(os.path.join(root_dir, name))
+        ]
+    return sorted(packages)
+
+
+def find_duplicate_names(package_dirs):
+    """Maps each directory name shared by more than one package to those packages' paths."""
+    by_name = {}
+    for package_path in package_dirs:
+        by_name.setdefault(os.path.basename(package_path), []).append(package_path)
+    return {name: paths for name, paths in by_name.items() if len(paths) > 1}
+
+
+def analyse_package_dir(package_path):
+    """
+    Process-pool entry point: runs package_processor.process_package over one
+    package directory. Returns (package_path, report, elapsed_seconds).
+    """
+    start = time.perf_counter()
+    files = gather_package_files(package_path)
+    report = analyse_package(package_path, files) if files else None
+    return package_path, report, time.perf_counter() - start
+
+
+def load_checkpoint(checkpoint_path):
+    """Returns the set of package paths already recorded in a checkpoint file."""
+    completed = set()
+    if not os.path.exists(checkpoint_path):
+        return completed
+    with open(checkpoint_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                completed.add(json.loads(line)['package'])
+            except (ValueError, KeyError):
+                # A torn final line from an interrupted run; that package is redone
+                continue
+    return completed
+
+
+def _terminate_torn_line(checkpoint_path):
+    """Ends a line left unterminated by an interrupted write, so new entries start on their own line."""
+    if not os.path.exists(checkpoint_path) or os.path.getsize(checkpoint_path) == 0:
+        return
+    with open(checkpoint_path, 'rb+') as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b'\n':
+            f.write(b'\n')
+
+
+def _append_checkpoint(checkpoint_file, entry):
+    checkpoint_file.write(json.dumps(entry) + '\n')
+    checkpoint_file.flush()
+    os.fsync(checkpoint_file.fileno())
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _stage_summary(values):
+    return {
+        'total_seconds': round(sum(values), 4),
+        'mean_seconds': round(sum(values) / len(values), 4) if values else 0.0,
+        'p50_seconds': round(_percentile(values, 0.50), 4),
+        'p95_seconds': round(_percentile(values, 0.95), 4),
+        'max_seconds': round(max(values), 4) if values else 0.0,
+    }
+
+
+def run_batch(root_dir, checkpoint_path, on_result=None, workers=None, echo=print, progress_interval=1.0):
+    """
+    Analyses every package under root_dir across a process pool.
+
+    Each finished package is passed to on_result(package_path, report) in
+    this process (e.g. to file it for review) and then appended to the
+    checkpoint file; if on_result returns a status, that is the one recorded.
+    Packages already in the checkpoint are skipped, so an interrupted run
+    resumes where it stopped. Packages are filed under their directory name,
+    so when on_result is given, packages sharing a name with another in the
+    tree are not processed and are listed in the summary instead. Returns a
+    summary dict with throughput and per-stage timings.
+    """
+    workers = workers or os.cpu_count() or 1
+    package_dirs = find_package_dirs(root_dir)
+    completed = load_checkpoint(checkpoint_path)
+    duplicates = find_duplicate_names(package_dirs)
+    rejected = {path for paths in duplicates.values() for path in paths} if on_result is not None else set()
+    pending = [path for path in package_dirs if path not in completed and path not in rejected]
+
+    stage_timings = {}
+    statuses = {}
+    failures = []
+    processed = 0
+    start = time.perf_counter()
+    last_progress = 0.0
+
+    skipped = len([path for path in package_dirs if path in completed])
+    echo(f"Found {len(package_dirs)} packages, {skipped} already checkpointed; "
+         f"processing {len(pending)} with {workers} workers.")
+    for name, paths in duplicates.items():
+        echo(f"Package name {name} is used by {len(paths)} directories"
+             + ("; none of them will be filed: " if rejected else ": ") + ", ".join(paths))
+
+    _terminate_torn_line(checkpoint_path)
+    with open(checkpoint_path, 'a') as checkpoint_file, ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(analyse_package_dir, path): path for path in pending}
+        try:
+            for future in as_completed(futures):
+                package_path = futures[future]
+                try:
+                    _, report, elapsed = future.result()
+                    stage_timings.setdefault('analysis', []).append(elapsed)
+
+                    status = None
+                    if report is not None:
+                        status = report['status']
+                        for stage, seconds in report.get('timings', {}).items():
+                            stage_timings.setdefault(stage, []).append(seconds)
+                        if on_result is not None:
+                            filing_start = time.perf_counter()
+                            status = on_result(package_path, report) or status
+                            stage_timings.setdefault('filing', []).append(time.perf_counter() - filing_start)
+                except Exception as e:
+                    failures.append({'package': package_path, 'error': str(e)})
+                    echo(f"Error processing package {package_path}: {e}")
+                    continue
+
+                statuses[status] = statuses.get(status, 0) + 1
+                _append_checkpoint(checkpoint_file, {'package': package_path, 'status': status, 'seconds': round(elapsed, 4)})
+                processed += 1
+
+                now = time.perf_counter()
+                if now - last_progress >= progress_interval or processed == len(pending):
+                    last_progress = now
+                    rate = processed / max(now - start, 1e-9)
+                    remaining = (len(pending) - processed) / rate if rate else 0
+                    echo(f"[{processed}/{len(pending)}] {rate:.2f} packages/s, ~{remaining:.0f}s remaining")
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            echo(f"Interrupted after {processed} packages; rerun the same command to resume.")
+            raise
+
+    wall_seconds = time.perf_counter() - start
+    return {
+        'root_dir': root_dir,
+        'workers': workers,
+        'packages_found': len(package_dirs),
+        'skipped_from_checkpoint': skipped,
+        'duplicate_names': duplicates,
+        'rejected_duplicates': len(rejected),
+        'processed': processed,
+        'failed': len(failures),
+        'failures': failures,
+        'statuses': {str(status): count for status, count in statuses.items()},
+        'wall_seconds': round(wall_seconds, 4),
+        'packages_per_second': round(processed / wall_seconds, 4) if wall_seconds else 0.0,
+        'stages': {stage: _stage_summary(values) for stage, values in stage_timings.items()},
+    }
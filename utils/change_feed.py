@@ -0,0 +1,87 @@
+import sqlite3
+import threading
+from collections import deque
+from utils.package_catalog import PackageCatalog
+from utils.logs import get_logger
+
+log = get_logger('change_feed')
+
+
+class ChangeFeed:
+    """
+    Fans package state changes out to every connected dashboard.
+
+    A single daemon thread reads new rows from the catalog's package_events
+    table every poll_interval seconds (or as soon as notify() is called) and
+    keeps the most recent ones in memory. Readers block in wait() on a shared
+    condition, so each connected client costs one sleeping thread and no
+    database queries of its own. Events written by other processes, such as
+    the ingest-worker command, arrive through the same table.
+    """
+
+    def __init__(self, catalog_db, poll_interval=1.0, buffer_size=1000):
+        self.catalog_db = catalog_db
+        self.poll_interval = poll_interval
+        self._events = deque(maxlen=buffer_size)
+        self._condition = threading.Condition()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.last_id = PackageCatalog(catalog_db).last_event_id()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        """Reads the catalog now rather than at the next poll."""
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.poll()
+            except sqlite3.Error as e:
+                # e.g. the database is locked; the next poll picks up where this one stopped
+                log.warning("Change feed poll failed", extra={'error': str(e)})
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def poll(self):
+        """Fetches events written since the last poll and wakes every reader."""
+        events = PackageCatalog(self.catalog_db).events_since(self.last_id)
+        if not events:
+            return 0
+        with self._condition:
+            self._events.extend(events)
+            self.last_id = events[-1]['id']
+            self._condition.notify_all()
+        return len(events)
+
+    def wait(self, after_id, timeout=None):
+        """
+        Returns the events after after_id, blocking up to timeout seconds
+        until there is at least one. A reader that has fallen behind the
+        in-memory buffer (e.g. a browser reconnecting with an old
+        Last-Event-ID) is caught up from the catalog instead.
+        """
+        with self._condition:
+            if after_id >= self.last_id:
+                self._condition.wait(timeout)
+            oldest_id = self._events[0]['id'] if self._events else self.last_id + 1
+            if after_id + 1 >= oldest_id:
+                # Newest first, stopping at what the reader already has
+                fresh = []
+                for event in reversed(self._events):
+                    if event['id'] <= after_id:
+                        break
+                    fresh.append(event)
+                return fresh[::-1]
+        return PackageCatalog(self.catalog_db).events_since(after_id)
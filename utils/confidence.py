@@ -0,0 +1,135 @@
+"""
+Per-field confidence for extracted documents, and which fields a reviewer
+still has to check.
+
+Fields read locally carry the confidence of the OCR words under them (see
+utils/tiered_extraction.py). The model reports no confidence of its own,
+so its answers are scored from checks instead: a value that fails its
+field's validator scores INVALID_CONFIDENCE, one that agrees with what
+local OCR read for the same field is combined with the OCR confidence, and
+one that disagrees is halved. Fields that contradict another field of the
+same document (a birth date after the issue date) are halved as well.
+
+Fields at or above the auto-accept threshold need no review;
+calibrate_threshold picks that threshold from labelled results, such as
+the field_confidence bench in benchmarks/pipeline.py.
+"""
+from datetime import date
+from utils.metrics import REVIEW_FIELDS
+from utils.tiered_extraction import SOURCE_MODEL, field_checks
+
+# A model answer that passes its validator with nothing to compare it against
+MODEL_PRIOR = 0.85
+INVALID_CONFIDENCE = 0.1
+DISAGREEMENT_FACTOR = 0.5
+INCONSISTENT_FACTOR = 0.5
+# Plausible ages on the day an ID is issued
+ID_AGE_RANGE = (16, 120)
+
+
+def normalised_value(document, name, value):
+    """The value as the field's normaliser writes it, or None if it has none."""
+    if value is None or not str(value).strip():
+        return None
+    normalise, _ = field_checks(document).get(name, (None, None))
+    return normalise(str(value)) if normalise else ' '.join(str(value).split()).upper()
+
+
+def model_confidence(document, name, value, local=None):
+    """
+    Confidence in the model's value for a field. local is the field's
+    (value, confidence) reading from local OCR, if there was one.
+    """
+    value = normalised_value(document, name, value)
+    if value is None:
+        return 0.0
+    _, validate = field_checks(document).get(name, (None, None))
+    if validate and not validate(value):
+        return INVALID_CONFIDENCE
+    local_value, local_confidence = local or (None, 0.0)
+    if local_value is None:
+        return MODEL_PRIOR
+    if normalised_value(document, name, local_value) == value:
+        # Two independent reads agreeing
+        return 1 - (1 - MODEL_PRIOR) * (1 - local_confidence)
+    return MODEL_PRIOR * DISAGREEMENT_FACTOR
+
+
+def inconsistent_fields(document, values):
+    """Names of fields that contradict another field of the same document."""
+    if document != 'id':
+        return set()
+    try:
+        born = date.fromisoformat(values.get('DATE_OF_BIRTH') or '')
+        issued = date.fromisoformat(values.get('ISSUE DATE') or '')
+    except ValueError:
+        return set()
+    age = issued.year - born.year - ((issued.month, issued.day) < (born.month, born.day))
+    if ID_AGE_RANGE[0] <= age <= ID_AGE_RANGE[1]:
+        return set()
+    return {'DATE_OF_BIRTH', 'ISSUE DATE'}
+
+
+def score_fields(document, fields, local):
+    """
+    Sets confidence_score on merged field dicts (see
+    tiered_extraction.merge_fields): model answers are scored by
+    model_confidence, local readings keep their OCR confidence, and fields
+    contradicting one another are marked down.
+    """
+    for field in fields:
+        if field.get('source') == SOURCE_MODEL:
+            field['confidence_score'] = round(
+                model_confidence(document, field['field_name'], field.get('extracted_value'),
+                                 local.get(field['field_name'])), 4)
+    values = {field['field_name']: normalised_value(document, field['field_name'], field.get('extracted_value'))
+              for field in fields}
+    for field in fields:
+        if field['field_name'] in inconsistent_fields(document, values):
+            field['confidence_score'] = round(field['confidence_score'] * INCONSISTENT_FACTOR, 4)
+    return fields
+
+
+def review_fields(confidences, threshold):
+    """
+    Splits {field: confidence} into (auto_accepted, needs_review) lists.
+    Fields with no value (confidence None) always need review.
+    """
+    accepted = [name for name, confidence in confidences.items() if confidence is not None and confidence >= threshold]
+    review = [name for name in confidences if name not in accepted]
+    REVIEW_FIELDS.labels('auto_accepted').inc(len(accepted))
+    REVIEW_FIELDS.labels('needs_review').inc(len(review))
+    return accepted, review
+
+
+def calibrate_threshold(samples, target_precision=0.98, min_accepted=1):
+    """
+    The lowest threshold at which fields scoring at least that much are
+    correct at least target_precision of the time, from (confidence,
+    correct) samples. Returns None if no threshold reaches it.
+    """
+    ranked = sorted(samples, key=lambda sample: -sample[0])
+    best = None
+    correct = 0
+    for count, (confidence, is_correct) in enumerate(ranked, start=1):
+        correct += bool(is_correct)
+        # Only cut between distinct confidences, so every tie is on the same side
+        if count < len(ranked) and ranked[count][0] == confidence:
+            continue
+        if count >= min_accepted and correct / count >= target_precision and confidence > 0:
+            best = confidence
+    return best
+
+
+def review_workload(samples, threshold):
+    """How much review auto-accepting fields at threshold saves, from (confidence, correct) samples."""
+    accepted = [is_correct for confidence, is_correct in samples if threshold is not None and confidence >= threshold]
+    return {
+        'fields': len(samples),
+        'threshold': threshold,
+        'auto_accepted': len(accepted),
+        'needs_review': len(samples) - len(accepted),
+        'review_reduction': len(accepted) / len(samples) if samples else None,
+        'auto_accepted_precision': sum(accepted) / len(accepted) if accepted else None,
+        'overall_accuracy': sum(bool(is_correct) for _, is_correct in samples) / len(samples) if samples else None,
+    }
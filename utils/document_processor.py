@@ -7,6 +7,10 @@ from PIL import Image
 import pytesseract
 import re
 from datetime import datetime
+from utils.logs import get_logger
+from utils.metrics import stage, PAGES
+
+log = get_logger('document_processor')
 
 # --- Configuration ---
 # Use environment variables for system-specific paths to make the code portable.
@@ -34,34 +38,40 @@ def extract_text_from_pdf(pdf_path):
     
     try:
         # 1. Try to extract text directly using PyPDF2
-        with open(pdf_path, 'rb') as file:
+        with stage('pdf_text'), open(pdf_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
+            page_count = len(pdf_reader.pages)
             for page in pdf_reader.pages:
                 extracted_page_text = page.extract_text()
                 if extracted_page_text:
                     text += extracted_page_text + "\n"
+        PAGES.labels('text').inc(page_count)
         
         # 2. If little text was extracted, assume it's an image-based PDF and use OCR
         if len(text.strip()) < 50:
-            print("Low text content detected. Falling back to OCR.")
-            # Convert PDF pages to images
-            images = convert_from_path(pdf_path, dpi=300)
-            print(f"Number of images generated from PDF: {len(images)}")
+            log.info("Low text content detected, falling back to OCR", extra={'file': pdf_path, 'pages': page_count})
             ocr_text = ""
-            for idx, img in enumerate(images):
+            # Rasterise one page at a time so memory is bounded by the largest
+            # page rather than the whole document (see utils/admission.py)
+            for page_number in range(1, page_count + 1):
                 try:
+                    with stage('rasterise'):
+                        img = convert_from_path(pdf_path, dpi=300, first_page=page_number, last_page=page_number)[0]
                     # Use pytesseract directly on the image
-                    ocr_result = pytesseract.image_to_string(img, lang='eng')
-                    print(f"OCR result for page {idx+1}: {repr(ocr_result[:100])}...")
+                    with stage('ocr'):
+                        ocr_result = pytesseract.image_to_string(img, lang='eng')
+                    img.close()
+                    PAGES.labels('ocr').inc()
+                    log.debug("OCR page done", extra={'file': pdf_path, 'page': page_number, 'chars': len(ocr_result)})
                     ocr_text += ocr_result + "\n"
                 except Exception as e:
-                    print(f"Error during image processing for OCR: {e}")
+                    log.warning("OCR failed for page", extra={'file': pdf_path, 'page': page_number, 'error': str(e)})
             # Use OCR text if direct extraction failed
             if len(ocr_text.strip()) > len(text.strip()):
                 text = ocr_text
 
     except PyPDF2.errors.PdfReadError:
-        print("PDF Read Error. File might be corrupted or encrypted. Trying OCR directly.")
+        log.warning("PDF read error; file might be corrupted or encrypted, trying OCR directly", extra={'file': pdf_path})
         # If PyPDF2 fails completely, proceed to OCR as the main method
         try:
             return extract_text_from_image(pdf_path) # pdf2image can often handle files PyPDF2 cannot
@@ -78,7 +88,10 @@ def extract_text_from_image(image_path):
     try:
         # Use pytesseract to process the image and output text
         img = Image.open(image_path)
-        return pytesseract.image_to_string(img, lang='eng')
+        with stage('ocr'):
+            text = pytesseract.image_to_string(img, lang='eng')
+        PAGES.labels('ocr').inc()
+        return text
     except Exception as e:
         raise Exception(f"Error processing image with OCR using pytesseract: {e}")
 
@@ -336,7 +349,7 @@ def extract_personal_details(ocr_text):
     nationality_pattern = r'\b(' + '|'.join(nationality_keywords) + r')\b'
 
     # Tier 1: Search for nationality next to a label.
-    found_nationality_keyword = _find_value(r"(?:NATIONALITY|NAT\.?|CITIZENSHIP)\s*[:.\s-]*" + nationality_pattern, text, group=2)
+    found_nationality_keyword = _find_value(r"(?:NATIONALITY|NAT\.?|CITIZENSHIP)\s*[:.\s-]*" + nationality_pattern, text, group=1)
     # Tier 2: If not found, search for any nationality keyword globally in the text.
     if not details["nationality"]:
         found_nationality_keyword = _find_value(nationality_pattern, text, group=1)
@@ -383,11 +396,11 @@ def process_document(file_path):
 
         # Check for keywords that indicate an Account/Mandate Form
         if 'EMPLOYMENT STATUS' in normalized_text_for_check or 'OCCUPATION' in normalized_text_for_check or 'MONTHLY SALARY' in normalized_text_for_check:
-            print("[DEBUG] Document identified as Account/Mandate Form. Running basic details extraction.")
+            log.debug("Document identified as Account/Mandate Form; extracting basic details", extra={'file': file_path})
             fields = extract_basic_details(text)
         # Default to personal details extraction (for ID cards, etc.)
         else:
-            print("[DEBUG] Document identified as ID Card. Running personal details extraction.")
+            log.debug("Document identified as ID Card; extracting personal details", extra={'file': file_path})
             fields = extract_personal_details(text)
         
         # Simple quality check based on text extraction
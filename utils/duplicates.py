@@ -0,0 +1,377 @@
+"""
+Finds documents already processed in another package, so their results can
+be reused instead of repeating OCR and model extraction.
+
+The same ID scan or mandate card is often uploaded again under another
+account number, byte for byte or as a fresh scan or photo of the same page.
+Every filed document is recorded in DuplicateIndex with its content hash
+and two perceptual hashes of its normalised first page: a pHash (the signs
+of the page's lowest DCT frequencies) and a dHash (brightness gradients).
+Rescanning, recompressing or rescaling a page flips only a few of their 64
+bits, while different pages differ in about half.
+
+Documents with the same content hash are exact duplicates, whose analysis
+and extracted fields are reused as they are. Perceptual hashes alone prove
+nothing about a page's details: names and numbers are small print that
+barely moves them, and in the benchmark corpus (benchmarks/corpus.py)
+different people's ID and mandate cards of one design are 0-8 bits apart,
+as close as rescans of one card. So a near duplicate is a document whose
+hashes are close and whose text, once read, has the same text_sha256 as
+well. Its analysis is never reused, since the text has to be read to
+confirm it, and its extracted fields only where find_extraction is asked to.
+
+Candidates are found by multi-index hashing: the pHash is stored as four
+16-bit bands, each indexed, and two hashes within NEAR_DISTANCE bits of
+each other have at least one band within NEAR_DISTANCE // 4 bits
+(pigeonhole principle). A lookup probes the band values that close, a few
+hundred index seeks however many documents are indexed, and confirms the
+candidates on both hashes and the text.
+"""
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from itertools import combinations
+from utils.logs import get_logger
+from utils.metrics import stage, DUPLICATE_DOCUMENTS, DUPLICATE_SECONDS_SAVED
+
+log = get_logger('duplicates')
+
+MATCH_EXACT = 'exact'
+MATCH_NEAR = 'near'
+# Source of extracted fields copied from a duplicate, alongside tiered_extraction's 'local' and 'gemini'
+SOURCE_DUPLICATE = 'duplicate'
+
+HASH_BITS = 64
+BANDS = 4
+BAND_BITS = HASH_BITS // BANDS
+# Most differing pHash and dHash bits for a near-duplicate candidate. A rescan
+# tilted by a degree or so differs by up to 10; the text decides the rest.
+NEAR_DISTANCE = 10
+DHASH_DISTANCE = 16
+# Width pages are rendered at before hashing; enough to average out scan noise
+NORMALISED_WIDTH = 256
+
+# Analysis results (see package_processor.analyse_document) reusable for a duplicate
+REUSED_FIELDS = ('identified_type', 'quality_issues', 'company_keywords', 'text_sha256')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS document_fingerprints (
+    package TEXT NOT NULL,
+    path TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    phash TEXT,
+    dhash TEXT,
+    band0 INTEGER,
+    band1 INTEGER,
+    band2 INTEGER,
+    band3 INTEGER,
+    analysis TEXT,
+    analysis_seconds REAL,
+    extraction TEXT NOT NULL DEFAULT '{}',
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (package, path)
+);
+CREATE INDEX IF NOT EXISTS ix_fingerprints_sha256 ON document_fingerprints (sha256);
+CREATE INDEX IF NOT EXISTS ix_fingerprints_band0 ON document_fingerprints (band0);
+CREATE INDEX IF NOT EXISTS ix_fingerprints_band1 ON document_fingerprints (band1);
+CREATE INDEX IF NOT EXISTS ix_fingerprints_band2 ON document_fingerprints (band2);
+CREATE INDEX IF NOT EXISTS ix_fingerprints_band3 ON document_fingerprints (band3);
+"""
+
+_initialised_paths = set()
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def hash_bands(value):
+    """The BANDS 16-bit slices of a 64-bit hash, lowest first."""
+    return [(value >> (BAND_BITS * i)) & ((1 << BAND_BITS) - 1) for i in range(BANDS)]
+
+
+def band_probes(band, radius):
+    """band and every value differing from it in at most radius bits."""
+    probes = [band]
+    for flipped in range(1, radius + 1):
+        for bits in combinations(range(BAND_BITS), flipped):
+            value = band
+            for bit in bits:
+                value ^= 1 << bit
+            probes.append(value)
+    return probes
+
+
+def _bits_to_int(bits):
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
+
+
+@lru_cache(maxsize=None)
+def _dct_matrix(size):
+    import numpy as np
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    return np.cos(np.pi * (2 * n + 1) * k / (2 * size))
+
+
+def phash(image):
+    """64-bit pHash of a grayscale PIL image: low DCT frequencies above or below their median."""
+    import numpy as np
+    from PIL import Image
+    pixels = np.asarray(image.resize((32, 32), Image.LANCZOS), dtype=np.float64)
+    dct = _dct_matrix(32) @ pixels @ _dct_matrix(32).T
+    low = dct[:8, :8].flatten()
+    # The DC term is the page's mean brightness, not its layout
+    return _bits_to_int(low > np.median(low[1:]))
+
+
+def dhash(image):
+    """64-bit dHash of a grayscale PIL image: whether each pixel is brighter than its left neighbour."""
+    import numpy as np
+    from PIL import Image
+    pixels = np.asarray(image.resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    return _bits_to_int((pixels[:, 1:] > pixels[:, :-1]).flatten())
+
+
+def normalised_page(file_path):
+    """A document's first page in grayscale with its contrast stretched, so scans and photos of it compare alike."""
+    from PIL import ImageOps
+    from utils.previews import render_page
+    return ImageOps.autocontrast(render_page(file_path, 0, NORMALISED_WIDTH).convert('L'), cutoff=1)
+
+
+def fingerprint(file_path):
+    """(pHash, dHash) of a document's first page, or (None, None) if it cannot be rendered."""
+    try:
+        image = normalised_page(file_path)
+    except Exception as e:
+        log.debug("Could not fingerprint document", extra={'file': file_path, 'error': str(e)})
+        return None, None
+    return phash(image), dhash(image)
+
+
+def _hex(value):
+    return None if value is None else f'{value:016x}'
+
+
+def _int(value):
+    return None if value is None else int(value, 16)
+
+
+class DuplicateIndex:
+    """
+    SQLite-backed index of every filed document's content and perceptual
+    hashes, with the analysis and extraction results they produced. It
+    lives in the package catalog's file, so the web app, ingestion workers
+    and extraction service all share it.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        if db_path not in _initialised_paths:
+            with self._connect() as conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.executescript(_SCHEMA)
+            _initialised_paths.add(db_path)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_dict(row):
+        document = dict(row)
+        document['phash'] = _int(document['phash'])
+        document['dhash'] = _int(document['dhash'])
+        document['analysis'] = json.loads(document['analysis']) if document['analysis'] else None
+        document['extraction'] = json.loads(document['extraction'])
+        for i in range(BANDS):
+            del document[f'band{i}']
+        return document
+
+    def add_manifest(self, package, manifest, analysis_seconds=None):
+        """
+        Records every analysed document of a filed package from its
+        manifest (see utils.manifest), replacing what was recorded for the
+        package before. analysis_seconds maps a document's path to how long
+        analysing it took, the compute a later duplicate saves.
+        """
+        analysis_seconds = analysis_seconds or {}
+        now = datetime.utcnow().isoformat()
+        rows = []
+        for entry in manifest.get('files', []):
+            if entry.get('identified_type') is None:
+                continue
+            bands = hash_bands(entry['phash']) if entry.get('phash') is not None else [None] * BANDS
+            rows.append((
+                package, entry['path'], entry['sha256'], _hex(entry.get('phash')), _hex(entry.get('dhash')), *bands,
+                json.dumps({field: entry.get(field) for field in REUSED_FIELDS}),
+                analysis_seconds.get(entry['path']), now,
+            ))
+        with self._connect() as conn:
+            conn.execute(
+                f"DELETE FROM document_fingerprints WHERE package = ? AND path NOT IN ({','.join('?' * len(rows))})",
+                [package] + [row[1] for row in rows],
+            )
+            # A document whose content is unchanged keeps its timing and extraction results
+            conn.executemany(
+                """
+                INSERT INTO document_fingerprints (package, path, sha256, phash, dhash, band0, band1, band2, band3,
+                                                   analysis, analysis_seconds, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(package, path) DO UPDATE SET
+                    analysis_seconds = CASE WHEN sha256 = excluded.sha256
+                        THEN COALESCE(excluded.analysis_seconds, analysis_seconds) ELSE excluded.analysis_seconds END,
+                    extraction = CASE WHEN sha256 = excluded.sha256 THEN extraction ELSE '{}' END,
+                    sha256 = excluded.sha256,
+                    phash = excluded.phash,
+                    dhash = excluded.dhash,
+                    band0 = excluded.band0,
+                    band1 = excluded.band1,
+                    band2 = excluded.band2,
+                    band3 = excluded.band3,
+                    analysis = excluded.analysis,
+                    updated_at = excluded.updated_at
+                """,
+                rows,
+            )
+        return len(rows)
+
+    def get(self, package, path):
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT * FROM document_fingerprints WHERE package = ? AND path = ?', (package, path)
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def find(self, sha256, phash=None, dhash=None, text_sha256=None, exclude_package=None,
+             max_distance=NEAR_DISTANCE):
+        """
+        Documents with the same content, or, given the text_sha256 of this
+        document's text, with the same text and hashes within max_distance
+        (pHash) and DHASH_DISTANCE (dHash) bits. Exact matches come first and
+        then nearest first. Each is a document dict with 'match' (MATCH_EXACT
+        or MATCH_NEAR) and 'distance' added.
+        """
+        clauses, params = ['sha256 = ?'], [sha256]
+        if phash is not None and text_sha256 is not None:
+            # One term per band, so each is answered from its own index
+            for i, band in enumerate(hash_bands(phash)):
+                probes = band_probes(band, max_distance // BANDS)
+                clauses.append(f"(band{i} IN ({','.join('?' * len(probes))}) "
+                               "AND json_extract(analysis, '$.text_sha256') = ?)")
+                params.extend(probes + [text_sha256])
+        sql = f"SELECT * FROM document_fingerprints WHERE ({' OR '.join(clauses)})"
+        if exclude_package is not None:
+            sql += ' AND package != ?'
+            params.append(exclude_package)
+        matches = []
+        with self._connect() as conn:
+            for row in conn.execute(sql, params):
+                # Candidates are confirmed on their hashes before their results are decoded
+                if row['sha256'] == sha256:
+                    match, distance = MATCH_EXACT, 0
+                elif text_sha256 is not None and phash is not None and row['phash'] is not None:
+                    distance = hamming(phash, _int(row['phash']))
+                    if distance > max_distance:
+                        continue
+                    if dhash is not None and row['dhash'] is not None \
+                            and hamming(dhash, _int(row['dhash'])) > DHASH_DISTANCE:
+                        continue
+                    match = MATCH_NEAR
+                else:
+                    continue
+                matches.append(dict(self._row_to_dict(row), match=match, distance=distance))
+        return sorted(matches, key=lambda document: (document['distance'], document['package'], document['path']))
+
+    def package_duplicates(self, package, manifest):
+        """{path: [link]} for the documents of a package that also appear in other packages."""
+        duplicates = {}
+        for entry in manifest.get('files', []):
+            matches = self.find(entry['sha256'], entry.get('phash'), entry.get('dhash'), entry.get('text_sha256'),
+                                exclude_package=package)
+            if matches:
+                duplicates[entry['path']] = [duplicate_link(match) for match in matches]
+        return duplicates
+
+    def record_extraction(self, package, path, document, fields, seconds):
+        """Stores the fields extracted from a 'mandate' or 'id' document, for its duplicates to reuse."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE document_fingerprints SET extraction = json_set(extraction, '$.' || ?, json(?)) "
+                "WHERE package = ? AND path = ?",
+                (document, json.dumps({'fields': fields, 'seconds': seconds}), package, path),
+            )
+
+    def find_extraction(self, package, path, document, near=False):
+        """
+        (match, extraction) for an identical copy of a filed document, or
+        with near, the closest near duplicate, that was already extracted as
+        document. None if there is none.
+        """
+        indexed = self.get(package, path)
+        if indexed is None:
+            return None
+        text_sha256 = (indexed['analysis'] or {}).get('text_sha256') if near else None
+        matches = self.find(indexed['sha256'], indexed['phash'], indexed['dhash'], text_sha256,
+                            exclude_package=package)
+        for match in matches:
+            if document in match['extraction']:
+                return match, match['extraction'][document]
+        return None
+
+
+def duplicate_link(match):
+    """What a report or page needs to know about a duplicate."""
+    return {key: match[key] for key in ('package', 'path', 'match', 'distance')}
+
+
+def record_reuse(match, work, seconds):
+    """Counts a duplicate whose results were reused and the seconds of work that saved."""
+    DUPLICATE_DOCUMENTS.labels(match['match'], work).inc()
+    DUPLICATE_SECONDS_SAVED.labels(work).inc(seconds or 0)
+
+
+def reusable_results(index, package, documents):
+    """
+    Looks up the documents about to be analysed in a package, given as
+    {file path: content hash}, among those filed in other packages.
+    Returns (fingerprints, exact, links), each keyed by file path: every
+    document's (pHash, dHash); for exact duplicates, the earlier analysis
+    to reuse as is, carrying the seconds it took as analysis_seconds; and
+    the duplicate each was matched to.
+    """
+    fingerprints, exact, links = {}, {}, {}
+    for file_path, sha256 in documents.items():
+        with stage('fingerprint'):
+            fingerprints[file_path] = fingerprint(file_path)
+        match = next((match for match in index.find(sha256, exclude_package=package) if match['analysis']), None)
+        if match is None:
+            continue
+        links[file_path] = duplicate_link(match)
+        exact[file_path] = dict(match['analysis'], analysis_seconds=match['analysis_seconds'])
+        record_reuse(match, 'analysis', match['analysis_seconds'])
+        log.info("Duplicate document found", extra={'file': file_path, **links[file_path]})
+    return fingerprints, exact, links
+
+
+def near_duplicate(index, package, sha256, hashes, text_sha256):
+    """
+    The link to a near duplicate in another package of a document just
+    analysed, given its content hash, (pHash, dHash) and text_sha256, or None.
+    """
+    phash_value, dhash_value = hashes
+    matches = index.find(sha256, phash_value, dhash_value, text_sha256, exclude_package=package)
+    if not matches:
+        return None
+    link = duplicate_link(matches[0])
+    log.info("Near duplicate document found", extra={'sha256': sha256, **link})
+    return link
@@ -0,0 +1,38 @@
+"""
+Package-scoped access tokens for the extraction service.
+
+The extraction service reads documents straight from package storage and
+returns the personal details it extracts, so it only serves callers holding
+a token for that package. app.py issues one when it renders a package to a
+CPC user; both services sign and check tokens with EXTRACTION_SECRET, which
+must be the same in each. Clients send the token as 'Authorization: Bearer
+<token>', or as ?token= where headers cannot be set (EventSource).
+"""
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+
+TOKEN_SALT = 'aura-extraction'
+TOKEN_PARAM = 'token'
+
+
+def issue_extraction_token(secret, package_name):
+    """A token granting access to one package's documents and extraction jobs."""
+    return URLSafeTimedSerializer(secret, salt=TOKEN_SALT).dumps({'package': package_name})
+
+
+def token_package(secret, token, max_age):
+    """The package a token grants access to, or None if it is invalid or expired."""
+    if not secret or not token:
+        return None
+    try:
+        claims = URLSafeTimedSerializer(secret, salt=TOKEN_SALT).loads(token, max_age=max_age)
+    except BadSignature:
+        return None
+    return claims.get('package') if isinstance(claims, dict) else None
+
+
+def request_token(headers, args):
+    """The token sent with a request, from the Authorization header or the query string."""
+    scheme, _, credentials = (headers.get('Authorization') or '').partition(' ')
+    if scheme.lower() == 'bearer' and credentials.strip():
+        return credentials.strip()
+    return args.get(TOKEN_PARAM)
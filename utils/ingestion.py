@@ -0,0 +1,248 @@
+import os
+import json
+import shutil
+from utils.package_catalog import list_package_files, read_package_info, STATUS_CLEAN, MANIFEST_FILE
+from utils.package_watcher import UPLOAD_COMPLETE_MARKER
+from utils.manifest import build_manifest, write_manifest, current_manifest, document_hashes, known_results
+from utils.duplicates import DuplicateIndex, MATCH_EXACT, reusable_results, near_duplicate
+from utils.metrics import stage, PACKAGES
+
+# Files written alongside the customer documents that must not be analysed.
+NON_DOCUMENT_FILES = ('package_info.json', UPLOAD_COMPLETE_MARKER, MANIFEST_FILE)
+
+
+def gather_package_files(package_path):
+    """Returns the absolute paths of every document in a package directory."""
+    return [
+        os.path.join(dp, f)
+        for dp, dn, fn in os.walk(package_path)
+        for f in fn
+        if f not in NON_DOCUMENT_FILES
+    ]
+
+
+def analyse_package(package_path, files=None, previous_manifest=None, duplicate_index=None):
+    """
+    Runs package_processor.process_package over a package directory, tagging
+    each document report with its path relative to the package. Files whose
+    content hash matches a document analysed in previous_manifest reuse that
+    result instead of being analysed again. With a duplicates.DuplicateIndex,
+    the remaining files are fingerprinted: those filed byte for byte in
+    another package reuse its results too, and the rest are linked, once
+    analysed, to any near duplicate with the same text.
+    """
+    # Imported here so the web app starts without loading the OCR stack
+    import utils.package_processor as package_processor
+    files = files if files is not None else gather_package_files(package_path)
+    relative_paths = {
+        file_path: os.path.relpath(file_path, package_path).replace(os.sep, '/') for file_path in files
+    }
+    known = {}
+    hashes = None
+    if previous_manifest:
+        reusable = known_results(previous_manifest)
+        hashes = document_hashes(package_path, relative_paths.values(), previous_manifest)
+        known = {
+            file_path: reusable[hashes[relative_path]]
+            for file_path, relative_path in relative_paths.items()
+            if hashes[relative_path] in reusable
+        }
+    package_name = os.path.basename(package_path)
+    unknown, fingerprints, links = {}, {}, {}
+    if duplicate_index is not None:
+        if hashes is None:
+            hashes = document_hashes(package_path, relative_paths.values())
+        unknown = {
+            file_path: hashes[relative_path]
+            for file_path, relative_path in relative_paths.items()
+            if file_path not in known
+        }
+        fingerprints, exact, links = reusable_results(duplicate_index, package_name, unknown)
+        known.update(exact)
+    report = package_processor.process_package(files, known_results=known)
+    # Document reports come back in the order the files were given
+    for file_path, doc_report in zip(files, report['documents']):
+        doc_report['relative_path'] = relative_paths[file_path]
+        if file_path in fingerprints:
+            doc_report['phash'], doc_report['dhash'] = fingerprints[file_path]
+            if file_path not in links:
+                links[file_path] = near_duplicate(duplicate_index, package_name, unknown[file_path],
+                                                  fingerprints[file_path], doc_report['text_sha256'])
+            doc_report['duplicate_of'] = links[file_path]
+    return report
+
+
+def write_precheck_report(package_name, report, package_path, final_package_path):
+    """
+    Renames each analysed document after its identified type and writes the
+    _Pre-Check_Report.txt summary into the package's final location.
+    """
+    report_lines = [
+        f"AURA Pre-Check Report for Package: {package_name}",
+        "==================================================",
+        f"Detected Account Type: {report['account_type']}",
+        f"Overall Status: {report['status']}",
+        "\n--- DOCUMENT SUMMARY ---"
+    ]
+    for doc_report in report['documents']:
+        original_name = doc_report['original_name']
+        identified_type = doc_report['identified_type'].replace(' ', '_')
+        _, file_ext = os.path.splitext(original_name)
+        new_name = f"{report['account_type']}_{identified_type}{file_ext}"
+
+        # Find the original file's subdirectory (e.g., 'kyc', 'mandate') to preserve it
+        original_file_full_path = doc_report.get('file_path')
+        relative_dir = os.path.dirname(os.path.relpath(original_file_full_path, package_path)) if original_file_full_path else ''
+        target_dir = os.path.join(final_package_path, relative_dir)
+
+        # Ensure the target subdirectory (e.g., .../clean_packages/12345/mandate) exists
+        os.makedirs(target_dir, exist_ok=True)
+
+        # The original file is now inside final_package_path, under the same subdirectory.
+        current_original_file_path = os.path.join(final_package_path, relative_dir, original_name)
+        new_file_path = os.path.join(target_dir, new_name)
+        if os.path.exists(current_original_file_path) and not os.path.exists(new_file_path):
+            os.rename(current_original_file_path, new_file_path)
+
+        report_lines.append(f"\nFile: {new_name} (Original: {original_name})")
+        report_lines.append(f"  - Identified as: {doc_report['identified_type']}")
+        if doc_report['quality_issues']:
+            report_lines.append(f"  - Quality Flags: {', '.join(doc_report['quality_issues'])}")
+        if doc_report.get('duplicate_of'):
+            duplicate = doc_report['duplicate_of']
+            report_lines.append(f"  - {'Identical to' if duplicate['match'] == MATCH_EXACT else 'Near duplicate of'}: "
+                                f"{duplicate['path']} in package {duplicate['package']}")
+
+    if report['missing_documents']:
+        report_lines.append("\n--- MISSING DOCUMENTS ---")
+        report_lines.extend([f"  - {missing}" for missing in report['missing_documents']])
+
+    with open(os.path.join(final_package_path, '_Pre-Check_Report.txt'), 'w') as f:
+        f.write("\n".join(report_lines))
+
+
+def find_filed_package(package_name, clean_dir, flagged_dir):
+    """Returns the path of an earlier version of a package already filed for review, or None."""
+    for directory in (clean_dir, flagged_dir):
+        package_path = os.path.join(directory, package_name)
+        if os.path.isdir(package_path):
+            return package_path
+    return None
+
+
+def merge_previous_version(existing_path, package_path):
+    """
+    Links the documents of an already filed package into its re-submission,
+    so a branch only needs to upload what was missing or has changed. Files
+    in the re-submission replace those at the same path. The filed package
+    is left intact, so it stays whole if the re-submission fails; it is
+    replaced once the merged package is filed. Returns the filed version's
+    manifest, whose per-file results can then be reused.
+    """
+    previous_manifest = current_manifest(existing_path)
+    for relative_path in list_package_files(existing_path):
+        target_path = os.path.join(package_path, relative_path)
+        if os.path.exists(target_path):
+            continue
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        # Both keep the file's mtime, so its recorded hash stays valid
+        source_path = os.path.join(existing_path, relative_path)
+        try:
+            os.link(source_path, target_path)
+        except OSError:
+            # Different filesystem or no hard link support
+            shutil.copy2(source_path, target_path)
+
+    old_info = read_package_info(existing_path)
+    new_info = read_package_info(package_path)
+    if old_info:
+        package_info = dict(old_info)
+        package_info.update({key: value for key, value in new_info.items() if value not in (None, '') and key != 'files'})
+        package_info['files'] = dict(old_info.get('files') or {}, **(new_info.get('files') or {}))
+        with open(os.path.join(package_path, 'package_info.json'), 'w') as f:
+            json.dump(package_info, f, indent=4)
+    return previous_manifest
+
+
+def file_package(package_name, report, package_path, clean_dir, flagged_dir, catalog, previous_manifest=None):
+    """
+    Moves an analysed package into the clean or flagged directory, writes its
+    pre-check report and records the new state in the catalog and its
+    documents in the duplicate index.
+    Returns the package's final status.
+    """
+    destination_folder = clean_dir if report['status'] == STATUS_CLEAN else flagged_dir
+    final_package_path = os.path.join(destination_folder, package_name)
+
+    with stage('file_move'):
+        if os.path.exists(final_package_path):
+            shutil.rmtree(final_package_path)
+        os.makedirs(destination_folder, exist_ok=True)
+        shutil.move(package_path, final_package_path)
+        write_precheck_report(package_name, report, package_path, final_package_path)
+    with stage('manifest'):
+        manifest = write_manifest(final_package_path, build_manifest(final_package_path, report, previous_manifest))
+    DuplicateIndex(catalog.db_path).add_manifest(
+        package_name,
+        manifest,
+        {doc_report['relative_path']: doc_report.get('analysis_seconds') for doc_report in report['documents']
+         if doc_report.get('relative_path')},
+    )
+
+    catalog.upsert(
+        package_name,
+        report['status'],
+        final_package_path,
+        files=list_package_files(final_package_path),
+        package_info=read_package_info(final_package_path),
+    )
+    PACKAGES.labels(report['status']).inc()
+    return report['status']
+
+
+def ingest_package(package_name, packages_dir, clean_dir, flagged_dir, catalog):
+    """
+    Analyses one package waiting in packages_dir and files it for review.
+    If an earlier version is already filed, the two are merged and only new
+    or changed documents are analysed. Returns the final status, or None if
+    there was nothing to process.
+    """
+    package_path = os.path.join(packages_dir, package_name)
+    if not os.path.isdir(package_path):
+        return None
+    return merge_and_file_package(package_name, package_path, clean_dir, flagged_dir, catalog)
+
+
+def merge_and_file_package(package_name, package_path, clean_dir, flagged_dir, catalog, report=None):
+    """
+    Files the package at package_path for review under package_name. If an
+    earlier version is already filed, the two are merged and the merged
+    package is analysed, reusing the earlier per-file results. Otherwise
+    report, if given, is used as the package's analysis. Returns the final
+    status, or None if the package has no documents.
+    """
+    previous_manifest = None
+    existing_path = find_filed_package(package_name, clean_dir, flagged_dir)
+    if existing_path:
+        previous_manifest = merge_previous_version(existing_path, package_path)
+        # The given report only covers the re-submitted documents
+        report = None
+
+    files = gather_package_files(package_path)
+    if not files:
+        # Clean up empty directories
+        shutil.rmtree(package_path)
+        catalog.delete(package_name)
+        return None
+
+    if report is None:
+        with stage('analysis'):
+            report = analyse_package(package_path, files, previous_manifest, DuplicateIndex(catalog.db_path))
+    status = file_package(package_name, report, package_path, clean_dir, flagged_dir, catalog, previous_manifest)
+
+    # The earlier version may have been filed in the other review directory
+    final_dir = clean_dir if status == STATUS_CLEAN else flagged_dir
+    if existing_path and os.path.normpath(os.path.dirname(existing_path)) != os.path.normpath(final_dir) \
+            and os.path.isdir(existing_path):
+        shutil.rmtree(existing_path)
+    return status
@@ -0,0 +1,282 @@
+import os
+import json
+import socket
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from utils.logs import get_logger
+
+log = get_logger('job_queue')
+
+# --- Job statuses ---
+JOB_QUEUED = 'queued'
+JOB_PROCESSING = 'processing'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+ACTIVE_JOB_STATUSES = (JOB_QUEUED, JOB_PROCESSING)
+
+DEFAULT_LANE = 'default'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    queue TEXT NOT NULL,
+    job_key TEXT NOT NULL,
+    lane TEXT NOT NULL DEFAULT 'default',
+    status TEXT NOT NULL,
+    payload TEXT,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_by TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_claim ON jobs (queue, status, lane, id);
+CREATE INDEX IF NOT EXISTS ix_jobs_key ON jobs (queue, job_key, status);
+"""
+
+_initialised_paths = set()
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """
+    Durable FIFO job queue stored in a local SQLite file. Several named queues
+    can share one file. A job is claimed inside an IMMEDIATE transaction, so
+    across every thread and process using the file each job has exactly one
+    owner at a time.
+    """
+
+    def __init__(self, db_path, name):
+        self.db_path = db_path
+        self.name = name
+        if db_path not in _initialised_paths:
+            with self._connect() as conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.executescript(_SCHEMA)
+            _initialised_paths.add(db_path)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_dict(row):
+        job = dict(row)
+        for column in ('payload', 'progress', 'result'):
+            job[column] = json.loads(job[column]) if job[column] else None
+        return job
+
+    @staticmethod
+    def worker_id():
+        """Identifies the calling thread as hostname:pid:thread for claim bookkeeping."""
+        return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+
+    def enqueue(self, job_key, payload=None, lane=DEFAULT_LANE):
+        """
+        Adds a job unless one for the same key is already waiting, in which
+        case the waiting job takes this payload and lane and is returned
+        instead, so it runs with what was asked for last.
+        """
+        now = datetime.utcnow().isoformat()
+        encoded = json.dumps(payload) if payload is not None else None
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT id FROM jobs WHERE queue = ? AND job_key = ? AND status = ?',
+                (self.name, job_key, JOB_QUEUED),
+            ).fetchone()
+            if row is None:
+                job_id = conn.execute(
+                    """
+                    INSERT INTO jobs (queue, job_key, lane, status, payload, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (self.name, job_key, lane, JOB_QUEUED, encoded, now, now),
+                ).lastrowid
+            else:
+                job_id = row['id']
+                conn.execute(
+                    'UPDATE jobs SET payload = ?, lane = ?, updated_at = ? WHERE id = ?',
+                    (encoded, lane, now, job_id),
+                )
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            conn.execute('COMMIT')
+        return self._row_to_dict(row)
+
+    def claim(self, lanes=None, worker_id=None):
+        """
+        Atomically takes the oldest queued job, skipping keys that already have
+        a job in progress. Returns the claimed job or None if nothing is ready.
+        """
+        worker_id = worker_id or self.worker_id()
+        query = """
+            SELECT * FROM jobs AS j
+            WHERE j.queue = ? AND j.status = ?
+              AND NOT EXISTS (
+                  SELECT 1 FROM jobs AS p
+                  WHERE p.queue = j.queue AND p.job_key = j.job_key AND p.status = ?
+              )
+        """
+        params = [self.name, JOB_QUEUED, JOB_PROCESSING]
+        if lanes:
+            query += f" AND j.lane IN ({', '.join('?' for _ in lanes)})"
+            params.extend(lanes)
+        query += ' ORDER BY j.id LIMIT 1'
+
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(query, params).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute(
+                """
+                UPDATE jobs SET status = ?, claimed_by = ?, attempts = attempts + 1, updated_at = ?
+                WHERE id = ?
+                """,
+                (JOB_PROCESSING, worker_id, datetime.utcnow().isoformat(), row['id']),
+            )
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (row['id'],)).fetchone()
+            conn.execute('COMMIT')
+        return self._row_to_dict(row)
+
+    def _update(self, job_id, **columns):
+        columns['updated_at'] = datetime.utcnow().isoformat()
+        assignments = ', '.join(f'{column} = ?' for column in columns)
+        with self._connect() as conn:
+            conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', [*columns.values(), job_id])
+
+    def update_progress(self, job_id, progress):
+        self._update(job_id, progress=json.dumps(progress))
+
+    def complete(self, job_id, result=None):
+        self._update(job_id, status=JOB_DONE, result=json.dumps(result) if result is not None else None)
+
+    def fail(self, job_id, error):
+        self._update(job_id, status=JOB_FAILED, error=str(error))
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ? AND queue = ?', (job_id, self.name)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def latest(self, job_key):
+        """Returns the most recent job for a key, or None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT * FROM jobs WHERE queue = ? AND job_key = ? ORDER BY id DESC LIMIT 1',
+                (self.name, job_key),
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def pending_count(self):
+        with self._connect() as conn:
+            return conn.execute(
+                'SELECT COUNT(*) FROM jobs WHERE queue = ? AND status = ?', (self.name, JOB_QUEUED)
+            ).fetchone()[0]
+
+    def requeue_interrupted(self):
+        """
+        Puts back jobs that were claimed by a process on this host which is no
+        longer running, e.g. after a crash or restart. Returns how many were requeued.
+        """
+        hostname = socket.gethostname()
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT id, claimed_by FROM jobs WHERE queue = ? AND status = ?', (self.name, JOB_PROCESSING)
+            ).fetchall()
+        requeued = 0
+        for row in rows:
+            host, pid, _ = (row['claimed_by'] or '::').split(':', 2)
+            if host == hostname and pid.isdigit() and not _process_alive(int(pid)):
+                self._update(row['id'], status=JOB_QUEUED, claimed_by=None)
+                requeued += 1
+        return requeued
+
+
+def run_job(queue, job, handler):
+    """Runs one claimed job through handler, recording its result or failure."""
+    try:
+        result = handler(job)
+    except Exception as e:
+        log.exception("Job failed", extra={'job_id': job['id'], 'job_key': job['job_key'], 'queue': queue.name})
+        queue.fail(job['id'], e)
+        return False
+    queue.complete(job['id'], result)
+    return True
+
+
+def run_pending(queue, handler, lanes=None):
+    """Processes queued jobs in the calling thread until the queue is empty."""
+    processed = 0
+    while True:
+        job = queue.claim(lanes=lanes)
+        if job is None:
+            return processed
+        run_job(queue, job, handler)
+        processed += 1
+
+
+class WorkerPool:
+    """
+    A fixed number of daemon threads that claim jobs from a JobQueue and pass
+    them to handler. Idle workers sleep until notify() is called or the poll
+    interval elapses, which also picks up jobs enqueued by other processes.
+    """
+
+    def __init__(self, queue, handler, workers=1, lanes=None, name='worker', poll_interval=1.0):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.lanes = lanes
+        self.name = name
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self.queue.requeue_interrupted()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'{self.name}-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def notify(self):
+        """Wakes idle workers because new work was enqueued."""
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        while not self._stopping.is_set():
+            job = self.queue.claim(lanes=self.lanes)
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            run_job(self.queue, job, self.handler)
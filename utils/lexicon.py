@@ -0,0 +1,266 @@
+"""
+Corrections reviewers have already made, reused on new extractions.
+
+Reviewers fix the same OCR and HTR misreadings again and again (ACC0UNTANT,
+MOY0, HARARF). CorrectionLexicon learns two things per field from every
+correction, whether in htr_extracted_data.corrected_value or in the gt_*
+columns of document_extractions: which misreadings were corrected to what,
+and the vocabulary of correct values. A value seen before as a misreading
+is replaced by its most common correction. For fields with a small
+vocabulary (FUZZY_FIELDS), an unknown value within a few edits of exactly
+one known value is replaced by it as well; names are only corrected from
+misreadings seen before, as a name one letter away is as likely to be
+someone else's.
+
+Known values are indexed per field by their character deletions
+(DeleteIndex), so a fuzzy lookup checks a handful of candidates rather than
+the whole vocabulary and takes microseconds. Every lookup is counted by
+field and result, see stats().
+"""
+import threading
+from collections import Counter, defaultdict
+from utils.metrics import LEXICON_LOOKUPS
+
+# Lookup results
+LEARNED = 'learned'  # a misreading corrected before
+FUZZY = 'fuzzy'  # close to exactly one known value
+KNOWN = 'known'  # already a correct value
+MISS = 'miss'
+
+# Free-text fields worth learning; amounts, dates and ID numbers have validators instead
+LEXICON_FIELDS = ('SURNAME', 'NAME', 'FULL NAME', 'OCCUPATION', 'EMPLOYER', 'PLACE OF BIRTH')
+# Fields drawn from a small vocabulary, safe to correct to their nearest known value
+FUZZY_FIELDS = ('OCCUPATION', 'EMPLOYER', 'PLACE OF BIRTH')
+# document_extractions columns with a gt_ counterpart, and their fields
+GROUND_TRUTH_FIELDS = {'surname': 'SURNAME', 'name': 'NAME', 'occupation': 'OCCUPATION'}
+# Most edits a fuzzy match may differ by, for the longest values
+MAX_DISTANCE = 2
+
+
+def normalised(value):
+    return ' '.join(str(value).split()).upper()
+
+
+def max_distance(value):
+    """Edits a fuzzy match may differ by: none for short values, where one edit makes another word."""
+    return 0 if len(value) < 5 else 1 if len(value) < 9 else MAX_DISTANCE
+
+
+def edit_distance(a, b):
+    """Levenshtein distance: insertions, deletions and substitutions."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def deletes(value, distance):
+    """value and every string made by deleting up to distance of its characters."""
+    variants = frontier = {value}
+    for _ in range(distance):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+        variants = variants | frontier
+    return variants
+
+
+class DeleteIndex:
+    """
+    Strings indexed for finding every value within a few edits of another
+    (SymSpell's symmetric delete): each value is filed under every string
+    made by deleting up to max_distance of its characters. Two values within
+    n edits share such a string with at most n deletions from each, so a
+    search looks up the query's own deletions and checks only the values
+    filed under them, whatever the size of the vocabulary.
+    """
+
+    def __init__(self, max_distance=MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._values = set()
+        self._variants = defaultdict(set)  # deletion -> values it was made from
+
+    def __len__(self):
+        return len(self._values)
+
+    def add(self, value):
+        if value in self._values:
+            return
+        self._values.add(value)
+        for variant in deletes(value, self.max_distance):
+            self._variants[variant].add(value)
+
+    def discard(self, value):
+        if value not in self._values:
+            return
+        self._values.discard(value)
+        for variant in deletes(value, self.max_distance):
+            values = self._variants[variant]
+            values.discard(value)
+            if not values:
+                del self._variants[variant]
+
+    def search(self, value, limit):
+        """[(distance, value)] of every value within limit edits, nearest first."""
+        limit = min(limit, self.max_distance)
+        candidates = set()
+        for variant in deletes(value, limit):
+            candidates.update(self._variants.get(variant, ()))
+        found = []
+        for candidate in candidates:
+            if abs(len(candidate) - len(value)) <= limit:
+                distance = edit_distance(value, candidate)
+                if distance <= limit:
+                    found.append((distance, candidate))
+        return sorted(found)
+
+
+class CorrectionLexicon:
+    """
+    Per-field misreadings and correct values learned from reviewers'
+    corrections. Safe to share between threads; learning is incremental,
+    so callers feed it only the rows changed since their last refresh.
+    """
+
+    def __init__(self, fuzzy_fields=FUZZY_FIELDS):
+        self.fuzzy_fields = set(fuzzy_fields)
+        self._known = defaultdict(Counter)  # field -> correct value -> times seen
+        self._misreadings = defaultdict(dict)  # field -> misreading -> Counter of its corrections
+        self._indexes = defaultdict(DeleteIndex)  # field -> known values
+        self._learned = {}  # source row key -> what it taught, so reading a row again is harmless
+        self._lookups = defaultdict(Counter)  # field -> result -> lookups
+        self._lock = threading.Lock()
+
+    def learn(self, field, extracted, corrected, key=None):
+        """
+        Records that a field's extracted value (None if nothing was read) was
+        corrected to corrected. key identifies the source row; a row already
+        learned with the same values is skipped, and one learned with other
+        values first has what it taught before taken back. Returns whether
+        anything was learned.
+        """
+        if corrected is None or not str(corrected).strip():
+            return False
+        correction = normalised(corrected)
+        misreading = normalised(extracted) if extracted is not None and str(extracted).strip() else None
+        with self._lock:
+            if key is not None:
+                previous = self._learned.get(key)
+                if previous == (field, misreading, correction):
+                    return False
+                if previous is not None:
+                    self._forget(*previous)
+                self._learned[key] = (field, misreading, correction)
+            self._known[field][correction] += 1
+            self._indexes[field].add(correction)
+            if misreading and misreading != correction:
+                self._misreadings[field].setdefault(misreading, Counter())[correction] += 1
+        return True
+
+    def _forget(self, field, misreading, correction):
+        """Takes back what learn() recorded for one correction. Call with the lock held."""
+        known = self._known[field]
+        known[correction] -= 1
+        if known[correction] <= 0:
+            del known[correction]
+            self._indexes[field].discard(correction)
+        if misreading and misreading != correction:
+            corrections = self._misreadings[field][misreading]
+            corrections[correction] -= 1
+            if corrections[correction] <= 0:
+                del corrections[correction]
+            if not corrections:
+                del self._misreadings[field][misreading]
+
+    def lookup(self, field, value):
+        """
+        (value, result) for a field's extracted value: the correction if the
+        lexicon knows one (result LEARNED or FUZZY), otherwise the value
+        unchanged (KNOWN or MISS). Empty values give (value, None).
+        """
+        if value is None or not str(value).strip():
+            return value, None
+        text = normalised(value)
+        result = MISS
+        with self._lock:
+            known = self._known.get(field, {})
+            corrections = self._misreadings.get(field, {}).get(text)
+            if corrections and corrections.most_common(1)[0][1] > known.get(text, 0):
+                # Corrected more often than it was confirmed as right
+                result, value = LEARNED, corrections.most_common(1)[0][0]
+            elif text in known:
+                result = KNOWN
+            elif field in self.fuzzy_fields and known:
+                matches = self._indexes[field].search(text, max_distance(text))
+                nearest = sorted((match for distance, match in matches if distance == matches[0][0]),
+                                 key=lambda match: -known[match])
+                # Ties go to the more common value, or nowhere when equally common
+                if nearest and (len(nearest) == 1 or known[nearest[0]] > known[nearest[1]]):
+                    result, value = FUZZY, nearest[0]
+            self._lookups[field][result] += 1
+        LEXICON_LOOKUPS.labels(field, result).inc()
+        return value, result
+
+    def correct_fields(self, fields):
+        """
+        Corrects the extracted_value of HTRSchema field dicts in place.
+        Returns the names of the fields changed.
+        """
+        changed = []
+        for field in fields:
+            if field.get('field_name') not in LEXICON_FIELDS:
+                continue
+            value, result = self.lookup(field['field_name'], field.get('extracted_value'))
+            if result in (LEARNED, FUZZY):
+                field['extracted_value'] = value
+                changed.append(field['field_name'])
+        return changed
+
+    def stats(self):
+        """Vocabulary and lookup results for every field, with the share of lookups each answered."""
+        with self._lock:
+            fields = set(self._known) | set(self._lookups)
+            report = {}
+            for field in sorted(fields):
+                lookups = self._lookups[field]
+                total = sum(lookups.values())
+                report[field] = {
+                    'known_values': len(self._known.get(field, {})),
+                    'misreadings': len(self._misreadings.get(field, {})),
+                    'lookups': total,
+                    **{result: lookups[result] for result in (LEARNED, FUZZY, KNOWN, MISS)},
+                    'hit_rate': round((total - lookups[MISS]) / total, 4) if total else None,
+                    'correction_rate': round((lookups[LEARNED] + lookups[FUZZY]) / total, 4) if total else None,
+                }
+            return report
+
+
+def learn_htr_corrections(lexicon, rows):
+    """
+    Feeds htr_extracted_data rows (db_models.HTRResult, or anything with its
+    attributes) into a lexicon; only corrected free-text fields teach it anything.
+    """
+    learned = 0
+    for row in rows:
+        if row.is_corrected and row.field_name in LEXICON_FIELDS:
+            learned += lexicon.learn(row.field_name, row.extracted_value, row.corrected_value,
+                                     key=('htr', row.document_id, row.source_type, row.field_name))
+    return learned
+
+
+def learn_ground_truth(lexicon, rows):
+    """Feeds document_extractions rows (models.DocumentExtraction) with ground truth into a lexicon."""
+    learned = 0
+    for row in rows:
+        for column, field in GROUND_TRUTH_FIELDS.items():
+            learned += lexicon.learn(field, getattr(row, column), getattr(row, f'gt_{column}'),
+                                     key=('gt', row.document_id, column))
+    return learned
+
+
+# The lexicon of this process, filled and consulted by the extraction
+# services, which can read the correction history
+correction_lexicon = CorrectionLexicon()
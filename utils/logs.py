@@ -0,0 +1,61 @@
+import os
+import sys
+import json
+import logging
+
+# Attributes every LogRecord has; anything else was passed through extra=
+# and is emitted as a field of the structured entry.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line, including its extra= fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Human-readable format for development: the message followed by key=value fields."""
+
+    def format(self, record):
+        line = f'{self.formatTime(record, "%H:%M:%S")} {record.levelname:<7} {record.name}: {record.getMessage()}'
+        fields = ' '.join(
+            f'{key}={value!r}' for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES
+        )
+        if fields:
+            line += f' {fields}'
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+def configure_logging(level=None, fmt=None):
+    """
+    Sends the 'aura' loggers to stderr. The level comes from AURA_LOG_LEVEL
+    (default INFO) and the format from AURA_LOG_FORMAT: 'json' for log
+    shippers, anything else for key=value text. Safe to call more than once.
+    """
+    logger = logging.getLogger('aura')
+    level = level or os.environ.get('AURA_LOG_LEVEL', 'INFO')
+    fmt = fmt or os.environ.get('AURA_LOG_FORMAT', 'text')
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter() if fmt == 'json' else KeyValueFormatter())
+        logger.addHandler(handler)
+    return logger
+
+
+def get_logger(name):
+    """A logger under the 'aura' hierarchy, e.g. get_logger('ingestion') -> 'aura.ingestion'."""
+    return logging.getLogger(f'aura.{name}')
@@ -0,0 +1,164 @@
+import os
+import json
+from datetime import datetime
+from utils.package_catalog import MANIFEST_FILE, list_package_files, read_package_info
+from utils.uploads import hash_file
+
+MANIFEST_VERSION = 1
+
+# Per-file analysis results kept in the manifest and reused for unchanged content.
+# phash and dhash are perceptual hashes of the first page and duplicate_of the
+# document in another package whose results were reused (see utils.duplicates).
+ANALYSIS_FIELDS = ('identified_type', 'quality_issues', 'company_keywords', 'text_sha256', 'phash', 'dhash', 'duplicate_of')
+
+
+def file_category(relative_path):
+    """
+    The upload category of a document. Files uploaded into 'mandate/' are
+    Mandate Cards; everything else, including files in the package root, is KYC.
+    """
+    parts = relative_path.split('/')
+    return 'mandate' if len(parts) > 1 and parts[0] == 'mandate' else 'kyc'
+
+
+def directory_signature(package_path):
+    """
+    Modification times of the package directory and its subdirectories.
+    Adding, removing or renaming a document changes one of them, so comparing
+    signatures detects a changed package without listing every file.
+    """
+    signature = {}
+    for dirpath, _, _ in os.walk(package_path):
+        relative_dir = os.path.relpath(dirpath, package_path).replace(os.sep, '/')
+        signature[relative_dir] = os.stat(dirpath).st_mtime_ns
+    return signature
+
+
+def document_hashes(package_path, relative_paths, previous=None):
+    """
+    SHA-256 of each document, keyed by relative path. A hash is reused from
+    the previous manifest when the file's size and mtime are unchanged, or
+    from the upload record in package_info.json, so only new files are read.
+    """
+    uploaded = read_package_info(package_path).get('files') or {}
+    previous_files = {entry['path']: entry for entry in (previous or {}).get('files', [])}
+    hashes = {}
+    for relative_path in relative_paths:
+        file_path = os.path.join(package_path, relative_path)
+        stat = os.stat(file_path)
+        prior = previous_files.get(relative_path)
+        recorded = uploaded.get(relative_path) or {}
+        if prior and prior['bytes'] == stat.st_size and prior['mtime_ns'] == stat.st_mtime_ns:
+            hashes[relative_path] = prior['sha256']
+        elif recorded.get('sha256') and recorded.get('bytes') == stat.st_size:
+            hashes[relative_path] = recorded['sha256']
+        else:
+            hashes[relative_path] = hash_file(file_path)
+    return hashes
+
+
+def known_results(manifest):
+    """Per-file analysis results from a manifest, keyed by content hash."""
+    results = {}
+    for entry in (manifest or {}).get('files', []):
+        # Entries from before this field was recorded cannot be reused
+        if entry.get('identified_type') is not None and entry.get('company_keywords') is not None:
+            results[entry['sha256']] = {field: entry.get(field) for field in ANALYSIS_FIELDS}
+    return results
+
+
+def build_manifest(package_path, report=None, previous=None):
+    """
+    Describes every document of a package: category, identified type,
+    quality flags, content hash and size. Analysis results come from report
+    (as returned by ingestion.analyse_package) or are carried over from the
+    previous manifest for files whose content has not changed.
+    """
+    previous = previous or {}
+    reusable = known_results(previous)
+    analysed = {
+        doc_report['relative_path']: doc_report
+        for doc_report in (report or {}).get('documents', [])
+        if doc_report.get('relative_path')
+    }
+
+    relative_paths = list_package_files(package_path)
+    hashes = document_hashes(package_path, relative_paths, previous)
+    files = []
+    for relative_path in relative_paths:
+        stat = os.stat(os.path.join(package_path, relative_path))
+        entry = {
+            'path': relative_path,
+            'category': file_category(relative_path),
+            'bytes': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': hashes[relative_path],
+            'identified_type': None,
+            'quality_issues': [],
+            'company_keywords': None,
+            'text_sha256': None,
+            'phash': None,
+            'dhash': None,
+            'duplicate_of': None,
+        }
+        result = analysed.get(relative_path) or reusable.get(entry['sha256'])
+        if result:
+            entry.update({field: result.get(field, entry[field]) for field in ANALYSIS_FIELDS})
+        files.append(entry)
+
+    return {
+        'version': MANIFEST_VERSION,
+        'package': os.path.basename(package_path),
+        'account_type': report['account_type'] if report else previous.get('account_type'),
+        'status': report['status'] if report else previous.get('status'),
+        'missing_documents': report['missing_documents'] if report else previous.get('missing_documents', []),
+        'generated_at': datetime.utcnow().isoformat(),
+        'files': files,
+    }
+
+
+def write_manifest(package_path, manifest):
+    """Writes a manifest into its package, stamped with the directory signature."""
+    manifest_path = os.path.join(package_path, MANIFEST_FILE)
+    # Create the file before taking the signature: creating it changes the
+    # package directory's mtime, rewriting it in place does not.
+    if not os.path.exists(manifest_path):
+        open(manifest_path, 'a').close()
+    manifest['signature'] = directory_signature(package_path)
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def load_manifest(package_path):
+    """Returns a package's manifest, or None if it is missing or unreadable."""
+    try:
+        with open(os.path.join(package_path, MANIFEST_FILE), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # A concurrent rewrite can be caught half-written; it is rebuilt
+        return None
+
+
+def is_current(manifest, package_path):
+    """True if no directory in the package has changed since the manifest was written."""
+    if not manifest or manifest.get('version') != MANIFEST_VERSION or not manifest.get('signature'):
+        return False
+    for relative_dir, mtime_ns in manifest['signature'].items():
+        try:
+            if os.stat(os.path.join(package_path, relative_dir)).st_mtime_ns != mtime_ns:
+                return False
+        except FileNotFoundError:
+            return False
+    return True
+
+
+def current_manifest(package_path):
+    """
+    Returns the package's manifest, regenerating it only if the package
+    directory changed since it was written (e.g. documents were copied in).
+    """
+    manifest = load_manifest(package_path)
+    if is_current(manifest, package_path):
+        return manifest
+    return write_manifest(package_path, build_manifest(package_path, previous=manifest))
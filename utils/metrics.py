@@ -0,0 +1,122 @@
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import (
+    CollectorRegistry, Counter, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess,
+)
+
+# Stage latencies range from a keyword match (milliseconds) to OCR of a long
+# scan or a throttled Gemini call (minutes).
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    'aura_stage_seconds', 'Time spent in each pipeline stage.', ['stage'], buckets=STAGE_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    'aura_http_request_seconds', 'HTTP request latency by endpoint.', ['app', 'endpoint', 'method', 'status'],
+    buckets=STAGE_BUCKETS,
+)
+PAGES = Counter('aura_pages_total', 'Document pages read, by how their text was obtained.', ['method'])
+DOCUMENT_BYTES = Counter('aura_document_bytes_total', 'Bytes of documents analysed.')
+DOCUMENTS = Counter('aura_documents_total', 'Documents in processed packages, analysed or reused.', ['outcome'])
+PACKAGES = Counter('aura_packages_total', 'Packages filed for review, by status.', ['status'])
+CACHE_REQUESTS = Counter('aura_cache_requests_total', 'Cache lookups by cache and result.', ['cache', 'result'])
+GEMINI_REQUESTS = Counter('aura_gemini_requests_total', 'Gemini requests by outcome.', ['outcome'])
+GEMINI_TOKENS = Counter('aura_gemini_tokens_total', 'Gemini tokens consumed, by kind.', ['kind'])
+EXTRACTED_FIELDS = Counter('aura_extracted_fields_total', 'Extracted fields by where their value came from.', ['source'])
+REVIEW_FIELDS = Counter('aura_review_fields_total', 'Extracted fields auto-accepted or left for review.', ['decision'])
+LEXICON_LOOKUPS = Counter('aura_lexicon_lookups_total', 'Correction lexicon lookups by field and result.', ['field', 'result'])
+DUPLICATE_DOCUMENTS = Counter(
+    'aura_duplicate_documents_total', 'Documents whose earlier results were reused, by match and work.', ['match', 'work'],
+)
+DUPLICATE_SECONDS_SAVED = Counter(
+    'aura_duplicate_seconds_saved_total', 'Seconds of analysis or extraction skipped by reusing a duplicate.', ['work'],
+)
+
+
+@contextmanager
+def stage(name, timings=None):
+    """
+    Times a block into aura_stage_seconds{stage=name}. If a timings dict is
+    given, the elapsed seconds are also added to timings[name].
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def is_rate_limited(exc):
+    """True for a Gemini quota error (HTTP 429 / google.api_core ResourceExhausted)."""
+    return getattr(exc, 'code', None) == 429 or type(exc).__name__ in ('ResourceExhausted', 'TooManyRequests')
+
+
+@contextmanager
+def gemini_call():
+    """Times one Gemini request and counts it as ok, rate_limited or error."""
+    with stage('gemini'):
+        try:
+            yield
+        except Exception as e:
+            GEMINI_REQUESTS.labels('rate_limited' if is_rate_limited(e) else 'error').inc()
+            raise
+        GEMINI_REQUESTS.labels('ok').inc()
+
+
+def record_gemini_usage(response):
+    """Adds the token counts reported with a Gemini response, if any."""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return
+    GEMINI_TOKENS.labels('prompt').inc(getattr(usage, 'prompt_token_count', 0) or 0)
+    GEMINI_TOKENS.labels('output').inc(getattr(usage, 'candidates_token_count', 0) or 0)
+
+
+def metrics_payload():
+    """
+    The Prometheus text exposition of every metric, as (body, content type).
+    When PROMETHEUS_MULTIPROC_DIR is set (gunicorn with several workers),
+    the samples of all worker processes are aggregated.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def instrument_app(app, name):
+    """
+    Records the latency of every request to a Flask app and serves /metrics.
+    /metrics is unauthenticated so Prometheus can scrape it; expose it only
+    on the internal network.
+    """
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_latency(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            REQUEST_SECONDS.labels(
+                name, request.endpoint or 'unmatched', request.method, response.status_code
+            ).observe(time.perf_counter() - start)
+        return response
+
+    def metrics():
+        body, content_type = metrics_payload()
+        return Response(body, content_type=content_type)
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
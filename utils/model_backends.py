@@ -0,0 +1,113 @@
+import json
+import base64
+import asyncio
+import threading
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+
+# Backends selectable with the MODEL_BACKEND setting
+GEMINI = 'gemini'
+HTTP = 'http'
+
+
+class ModelError(Exception):
+    """
+    A failed model request. code is the HTTP status, so a 429 is recognised
+    by utils.metrics.is_rate_limited like Gemini's own quota error.
+    """
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+class GeminiBackend:
+    """Calls Google's Gemini API through the google-generativeai client."""
+
+    def __init__(self, api_key, model_name):
+        if not api_key:
+            raise ModelError('GEMINI_API_KEY is not set.')
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt, image_bytes, mime_type):
+        return self.model.generate_content([prompt, {'mime_type': mime_type, 'data': image_bytes}])
+
+    async def generate_async(self, prompt, image_bytes, mime_type):
+        return await self.model.generate_content_async([prompt, {'mime_type': mime_type, 'data': image_bytes}])
+
+
+class HttpBackend:
+    """
+    Calls any server speaking the generateContent REST protocol at base_url,
+    such as the local stand-in in benchmarks/fake_gemini.py. Responses are
+    shaped like the Gemini client's, with .text and .usage_metadata.
+    """
+
+    def __init__(self, base_url, model_name, timeout=120):
+        if not base_url:
+            raise ModelError('MODEL_BACKEND_URL is not set.')
+        self.url = f"{base_url.rstrip('/')}/v1beta/models/{model_name}:generateContent"
+        self.timeout = timeout
+
+    def generate(self, prompt, image_bytes, mime_type):
+        body = json.dumps({'contents': [{'parts': [
+            {'text': prompt},
+            {'inline_data': {'mime_type': mime_type, 'data': base64.b64encode(image_bytes).decode('ascii')}},
+        ]}]}).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                payload = json.load(response)
+        except urllib.error.HTTPError as e:
+            raise ModelError(f'Model server returned HTTP {e.code}', code=e.code) from e
+        except (urllib.error.URLError, OSError) as e:
+            raise ModelError(f'Model server unreachable: {e}') from e
+        return parse_generate_response(payload)
+
+    async def generate_async(self, prompt, image_bytes, mime_type):
+        return await asyncio.to_thread(self.generate, prompt, image_bytes, mime_type)
+
+
+def parse_generate_response(payload):
+    """Turns a generateContent JSON response into an object like the Gemini client's response."""
+    try:
+        parts = payload['candidates'][0]['content']['parts']
+    except (KeyError, IndexError, TypeError) as e:
+        raise ModelError('Model response has no candidates') from e
+    usage = payload.get('usageMetadata') or {}
+    return SimpleNamespace(
+        text=''.join(part.get('text', '') for part in parts),
+        usage_metadata=SimpleNamespace(
+            prompt_token_count=usage.get('promptTokenCount', 0),
+            candidates_token_count=usage.get('candidatesTokenCount', 0),
+        ),
+    )
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_model_backend(config):
+    """
+    The backend selected by config['MODEL_BACKEND'], created once per
+    distinct configuration: 'gemini' (default) uses GEMINI_API_KEY and
+    GEMINI_MODEL; 'http' sends the same requests to MODEL_BACKEND_URL.
+    """
+    kind = config.get('MODEL_BACKEND') or GEMINI
+    key = (kind, config.get('GEMINI_MODEL'), config.get('GEMINI_API_KEY'), config.get('MODEL_BACKEND_URL'))
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            if kind == GEMINI:
+                backend = GeminiBackend(config.get('GEMINI_API_KEY'), config['GEMINI_MODEL'])
+            elif kind == HTTP:
+                backend = HttpBackend(config.get('MODEL_BACKEND_URL'), config['GEMINI_MODEL'],
+                                      config.get('MODEL_TIMEOUT_SECONDS', 120))
+            else:
+                raise ModelError(f'Unknown MODEL_BACKEND {kind!r}')
+            _backends[key] = backend
+    return backend
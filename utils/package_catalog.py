@@ -0,0 +1,357 @@
+import os
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from utils.package_watcher import UPLOAD_COMPLETE_MARKER
+
+# --- Package statuses ---
+# RECEIVED is set when a branch upload lands in PACKAGES_DIR, QUEUED and
+# PROCESSING track the ingestion workers, and the two review statuses mirror
+# the report produced by package_processor.process_package.
+STATUS_RECEIVED = 'RECEIVED'
+STATUS_QUEUED = 'QUEUED'
+STATUS_PROCESSING = 'PROCESSING'
+STATUS_CLEAN = 'CLEAN_FOR_PROCESSING'
+STATUS_FLAGGED = 'FLAGGED_FOR_REVIEW'
+STATUS_FAILED = 'FAILED'
+
+REVIEW_STATUSES = (STATUS_CLEAN, STATUS_FLAGGED)
+
+# Per-package manifest written when a package is filed (see utils.manifest).
+MANIFEST_FILE = '_manifest.json'
+
+# Files that live inside a package directory but are not customer documents.
+PACKAGE_METADATA_FILES = ('package_info.json', '_pre-check_report.txt', UPLOAD_COMPLETE_MARKER, MANIFEST_FILE)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS packages (
+    name TEXT PRIMARY KEY,
+    account_no TEXT,
+    account_name TEXT,
+    branch_name TEXT,
+    account_type TEXT,
+    status TEXT NOT NULL,
+    location TEXT NOT NULL,
+    files TEXT NOT NULL DEFAULT '[]',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_packages_status ON packages (status, updated_at);
+CREATE INDEX IF NOT EXISTS ix_packages_branch ON packages (branch_name);
+CREATE INDEX IF NOT EXISTS ix_packages_account_type ON packages (account_type);
+CREATE INDEX IF NOT EXISTS ix_packages_updated_at ON packages (updated_at);
+CREATE INDEX IF NOT EXISTS ix_packages_created_at ON packages (created_at);
+CREATE INDEX IF NOT EXISTS ix_packages_branch_updated ON packages (branch_name, updated_at);
+CREATE INDEX IF NOT EXISTS ix_packages_account_type_updated ON packages (account_type, updated_at);
+
+-- Bumped on every change to a package in a review status (REVIEW_STATUSES),
+-- so cached listings, which only ever show those, can be validated without
+-- re-running their queries. RECEIVED, QUEUED and PROCESSING rows change
+-- several times per package during ingestion without affecting any listing,
+-- so they only bump it when they enter or leave a review status.
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0);
+-- Replaced by the tr_packages_listed_* triggers, which skip unlisted rows
+DROP TRIGGER IF EXISTS tr_packages_insert;
+DROP TRIGGER IF EXISTS tr_packages_update;
+DROP TRIGGER IF EXISTS tr_packages_delete;
+CREATE TRIGGER IF NOT EXISTS tr_packages_listed_insert AFTER INSERT ON packages
+WHEN NEW.status IN ('CLEAN_FOR_PROCESSING', 'FLAGGED_FOR_REVIEW')
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS tr_packages_listed_update AFTER UPDATE ON packages
+WHEN OLD.status IN ('CLEAN_FOR_PROCESSING', 'FLAGGED_FOR_REVIEW')
+    OR NEW.status IN ('CLEAN_FOR_PROCESSING', 'FLAGGED_FOR_REVIEW')
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS tr_packages_listed_delete AFTER DELETE ON packages
+WHEN OLD.status IN ('CLEAN_FOR_PROCESSING', 'FLAGGED_FOR_REVIEW')
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+
+-- Change feed: one row per package state transition, read by utils.change_feed.
+-- Only the most recent 10,000 rows are kept.
+CREATE TABLE IF NOT EXISTS package_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    status TEXT,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    account_name TEXT,
+    branch_name TEXT,
+    account_type TEXT,
+    at TEXT NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS tr_package_events_insert AFTER INSERT ON packages
+BEGIN
+    INSERT INTO package_events (name, status, account_name, branch_name, account_type, at)
+    VALUES (NEW.name, NEW.status, NEW.account_name, NEW.branch_name, NEW.account_type, NEW.updated_at);
+END;
+CREATE TRIGGER IF NOT EXISTS tr_package_events_update AFTER UPDATE ON packages
+BEGIN
+    INSERT INTO package_events (name, status, account_name, branch_name, account_type, at)
+    VALUES (NEW.name, NEW.status, NEW.account_name, NEW.branch_name, NEW.account_type, NEW.updated_at);
+END;
+CREATE TRIGGER IF NOT EXISTS tr_package_events_delete AFTER DELETE ON packages
+BEGIN
+    INSERT INTO package_events (name, status, deleted, account_name, branch_name, account_type, at)
+    VALUES (OLD.name, OLD.status, 1, OLD.account_name, OLD.branch_name, OLD.account_type,
+            strftime('%Y-%m-%dT%H:%M:%f', 'now'));
+END;
+CREATE TRIGGER IF NOT EXISTS tr_package_events_retention AFTER INSERT ON package_events
+BEGIN
+    DELETE FROM package_events WHERE id <= NEW.id - 10000;
+END;
+"""
+
+# Change feed event names, by the status a package moved to. A package
+# removed from the catalog (submitted or deleted) produces 'removed'.
+STATUS_EVENTS = {
+    STATUS_RECEIVED: 'received',
+    STATUS_QUEUED: 'queued',
+    STATUS_PROCESSING: 'processing',
+    STATUS_CLEAN: 'processed',
+    STATUS_FLAGGED: 'flagged',
+    STATUS_FAILED: 'failed',
+}
+
+# Columns a listing may be sorted by, by the name used in the API.
+SORT_COLUMNS = {
+    'updated': 'updated_at',
+    'created': 'created_at',
+    'name': 'name',
+    'account_name': 'account_name',
+    'branch': 'branch_name',
+    'account_type': 'account_type',
+    'status': 'status',
+}
+
+# Paths whose schema has already been created in this process.
+_initialised_paths = set()
+
+
+def list_package_files(package_path):
+    """Returns the document paths of a package, relative to it and using '/' separators."""
+    files = []
+    for root, _, filenames in os.walk(package_path):
+        for filename in filenames:
+            if filename.lower() in PACKAGE_METADATA_FILES:
+                continue
+            relative_path = os.path.relpath(os.path.join(root, filename), package_path)
+            files.append(relative_path.replace('\\', '/'))
+    return sorted(files)
+
+
+def read_package_info(package_path):
+    """Loads package_info.json from a package directory, or an empty dict if absent."""
+    package_info_path = os.path.join(package_path, 'package_info.json')
+    if not os.path.exists(package_info_path):
+        return {}
+    with open(package_info_path, 'r') as f:
+        return json.load(f)
+
+
+class PackageCatalog:
+    """
+    SQLite-backed index of every known package: who it belongs to, its review
+    status, which directory it currently lives in and which files it holds.
+    Listing and lookup routes read from here instead of scanning the package
+    directories on every request.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        if db_path not in _initialised_paths:
+            with self._connect() as conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.executescript(_SCHEMA)
+            _initialised_paths.add(db_path)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_dict(row):
+        package = dict(row)
+        package['files'] = json.loads(package['files'])
+        return package
+
+    def upsert(self, name, status, location, files=None, package_info=None):
+        """Creates or replaces the catalog entry for a package."""
+        package_info = package_info or {}
+        now = datetime.utcnow().isoformat()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO packages (name, account_no, account_name, branch_name, account_type,
+                                      status, location, files, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    account_no = excluded.account_no,
+                    account_name = excluded.account_name,
+                    branch_name = excluded.branch_name,
+                    account_type = excluded.account_type,
+                    status = excluded.status,
+                    location = excluded.location,
+                    files = excluded.files,
+                    updated_at = excluded.updated_at
+                """,
+                (
+                    name,
+                    package_info.get('account_no', name),
+                    package_info.get('account_name'),
+                    package_info.get('branch_name'),
+                    package_info.get('account_type'),
+                    status,
+                    location,
+                    json.dumps(files or []),
+                    now,
+                    now,
+                ),
+            )
+
+    def update_status(self, name, status, location=None, files=None):
+        """Records a state change for a package, optionally with its new location and files."""
+        assignments = ['status = ?', 'updated_at = ?']
+        params = [status, datetime.utcnow().isoformat()]
+        if location is not None:
+            assignments.append('location = ?')
+            params.append(location)
+        if files is not None:
+            assignments.append('files = ?')
+            params.append(json.dumps(files))
+        params.append(name)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE packages SET {', '.join(assignments)} WHERE name = ?", params)
+
+    def get(self, name):
+        """Returns the catalog entry for a package, or None if it is unknown."""
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM packages WHERE name = ?', (name,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def list(self, statuses=None):
+        """Lists packages, most recently updated first, optionally filtered by status."""
+        query = 'SELECT * FROM packages'
+        params = []
+        if statuses:
+            query += f" WHERE status IN ({', '.join('?' for _ in statuses)})"
+            params.extend(statuses)
+        query += ' ORDER BY updated_at DESC'
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def query(self, statuses=None, branch=None, account_type=None, date_from=None, date_to=None,
+              sort='updated', descending=True, limit=50, offset=0):
+        """
+        One page of packages matching the given filters, sorted by one of
+        SORT_COLUMNS. date_from and date_to are ISO dates bounding when the
+        package was last updated, both inclusive. Returns (packages, total),
+        where total counts every matching package.
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f'Cannot sort packages by {sort!r}')
+        conditions = []
+        params = []
+        if statuses:
+            conditions.append(f"status IN ({', '.join('?' for _ in statuses)})")
+            params.extend(statuses)
+        if branch:
+            conditions.append('branch_name = ?')
+            params.append(branch)
+        if account_type:
+            conditions.append('account_type = ?')
+            params.append(account_type)
+        if date_from:
+            conditions.append('updated_at >= ?')
+            params.append(date_from.isoformat())
+        if date_to:
+            conditions.append('updated_at < ?')
+            params.append((date_to + timedelta(days=1)).isoformat())
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        direction = 'DESC' if descending else 'ASC'
+        # name breaks ties so pages never overlap or skip rows
+        order = f' ORDER BY {SORT_COLUMNS[sort]} {direction}, name {direction}'
+        with self._connect() as conn:
+            total = conn.execute(f'SELECT COUNT(*) FROM packages{where}', params).fetchone()[0]
+            rows = conn.execute(f'SELECT * FROM packages{where}{order} LIMIT ? OFFSET ?',
+                                params + [limit, offset]).fetchall()
+        return [self._row_to_dict(row) for row in rows], total
+
+    def branches(self, statuses=None):
+        """The distinct branch names of catalogued packages, for filter choices."""
+        query = 'SELECT DISTINCT branch_name FROM packages WHERE branch_name IS NOT NULL'
+        params = []
+        if statuses:
+            query += f" AND status IN ({', '.join('?' for _ in statuses)})"
+            params.extend(statuses)
+        with self._connect() as conn:
+            return sorted(row[0] for row in conn.execute(query, params).fetchall())
+
+    def events_since(self, last_id, limit=500):
+        """
+        Change feed entries after event id last_id, oldest first. Each has the
+        package's name and status, an 'event' name from STATUS_EVENTS (or
+        'removed') and the listing fields a dashboard row shows.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT * FROM package_events WHERE id > ? ORDER BY id LIMIT ?', (last_id, limit)
+            ).fetchall()
+        events = []
+        for row in rows:
+            event = dict(row)
+            event['event'] = 'removed' if event.pop('deleted') else STATUS_EVENTS.get(event['status'], 'updated')
+            events.append(event)
+        return events
+
+    def last_event_id(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COALESCE(MAX(id), 0) FROM package_events').fetchone()[0]
+
+    def version(self):
+        """A counter that changes whenever a package in a review status is added, changed or removed."""
+        with self._connect() as conn:
+            return conn.execute('SELECT version FROM catalog_version WHERE id = 1').fetchone()[0]
+
+    def delete(self, name):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM packages WHERE name = ?', (name,))
+
+    def is_empty(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT 1 FROM packages LIMIT 1').fetchone() is None
+
+    def register_directory(self, package_path, status):
+        """Indexes a package directory that already exists on disk."""
+        self.upsert(
+            os.path.basename(package_path),
+            status,
+            package_path,
+            files=list_package_files(package_path),
+            package_info=read_package_info(package_path),
+        )
+
+    def rebuild(self, directories):
+        """
+        Re-indexes every package found in the given {directory: status} mapping.
+        Used once to migrate existing packages into the catalog.
+        """
+        count = 0
+        for dir_path, status in directories.items():
+            if not os.path.isdir(dir_path):
+                continue
+            for package_name in os.listdir(dir_path):
+                package_path = os.path.join(dir_path, package_name)
+                if os.path.isdir(package_path):
+                    self.register_directory(package_path, status)
+                    count += 1
+        return count
@@ -1,36 +1,20 @@
 import os
 import json
+import time
+import hashlib
 import cv2
 import numpy as np
 from utils.document_processor import extract_text_from_pdf, extract_text_from_image
+from utils.logs import get_logger
+from utils.metrics import stage, record_cache, DOCUMENT_BYTES, DOCUMENTS
+
+log = get_logger('package_processor')
 
 def load_config():
     """Loads the configuration from config.json."""
     with open('config.json', 'r') as f:
         return json.load(f)
 
-def classify_account_type(files, config):
-    """
-    Classifies account type as 'COMPANY' or 'INDIVIDUAL' based on keywords in the documents.
-    """
-    classification_keywords = config.get('classification_keywords', {})
-    for file_path in files:
-        try:
-            file_ext = os.path.splitext(file_path)[1].lower()
-            if file_ext == '.pdf':
-                text = extract_text_from_pdf(file_path)
-            else:
-                text = extract_text_from_image(file_path)
-            
-            text = text.lower()
-            
-            if any(keyword in text for keyword in classification_keywords.get('COMPANY', [])):
-                return 'COMPANY'
-        except Exception as e:
-            print(f"Could not read file {file_path} for classification: {e}")
-            continue
-    return 'INDIVIDUAL' # Default to individual if no company keywords are found
-
 def check_document_quality(file_path):
     """
     Performs quality checks on a document (blurriness and blank page).
@@ -55,62 +39,104 @@ def check_document_quality(file_path):
             quality_report['is_blurry'] = True
             
     except Exception as e:
-        print(f"Error during quality check for {file_path}: {e}")
+        log.warning("Quality check failed", extra={'file': file_path, 'error': str(e)})
 
     return quality_report
 
-def identify_document_type(file_path, config):
-    """Identifies the specific type of a document using OCR and keyword matching."""
-    doc_keywords = config.get('document_keywords', {})
-    try:
-        file_ext = os.path.splitext(file_path)[1].lower()
-        if file_ext == '.pdf':
-            text = extract_text_from_pdf(file_path)
-        else:
-            text = extract_text_from_image(file_path)
-        
-        text = text.lower()
 
-        for doc_type, keywords in doc_keywords.items():
-            if any(keyword in text for keyword in keywords):
-                return doc_type
-    except Exception as e:
-        print(f"Could not read file {file_path} for identification: {e}")
-    
+def read_document_text(file_path):
+    """OCRs a PDF or image document and returns its text."""
+    file_ext = os.path.splitext(file_path)[1].lower()
+    if file_ext == '.pdf':
+        return extract_text_from_pdf(file_path)
+    return extract_text_from_image(file_path)
+
+
+def match_document_type(text, config):
+    """Identifies a document type from already extracted (lower-case) text."""
+    for doc_type, keywords in config.get('document_keywords', {}).items():
+        if any(keyword in text for keyword in keywords):
+            return doc_type
     return "Unknown Document"
 
 
-def process_package(package_files):
+def analyse_document(file_path, config, timings):
+    """
+    Analyses one document, reading its text only once for both account
+    classification and document identification. The result depends only on
+    the file's content, so it can be reused for an identical file later.
+    text_sha256 is None when no text could be read.
+    """
+    with stage('identification', timings):
+        try:
+            text = read_document_text(file_path).lower()
+        except Exception as e:
+            log.warning("Could not read file for identification", extra={'file': file_path, 'error': str(e)})
+            text = ''
+        doc_type = match_document_type(text, config)
+
+    with stage('classification', timings):
+        company_keywords = config.get('classification_keywords', {}).get('COMPANY', [])
+        has_company_keywords = any(keyword in text for keyword in company_keywords)
+
+    with stage('quality_check', timings):
+        quality = check_document_quality(file_path)
+    DOCUMENT_BYTES.inc(os.path.getsize(file_path))
+
+    quality_issues = []
+    if quality['is_blank']:
+        quality_issues.append('Blank Page')
+    if quality['is_blurry']:
+        quality_issues.append('Blurry')
+
+    return {
+        'identified_type': doc_type,
+        'quality_issues': quality_issues,
+        'company_keywords': has_company_keywords,
+        'text_sha256': hashlib.sha256(text.encode('utf-8')).hexdigest() if text.strip() else None,
+    }
+
+
+def process_package(package_files, known_results=None):
     """
     Orchestrates the entire document package analysis.
+
+    known_results maps a file path to the result analyse_document produced
+    earlier for the same content; those files are not analysed again, so a
+    re-submitted package only costs the analysis of its new files.
+    Each document report records the seconds its analysis took, or took
+    the document whose result it reuses.
     """
     config = load_config()
-    
-    # 1. Classify Account Type
-    account_type = classify_account_type(package_files, config)
-    
-    # 2. Perform checks on each document
+    known_results = known_results or {}
+    # Seconds spent in each stage, reported so slow packages can be diagnosed
+    timings = {'classification': 0.0, 'identification': 0.0, 'quality_check': 0.0}
+
+    # 1. Analyse each document, reusing earlier results for unchanged files
     document_reports = []
     identified_docs = set()
-    
+    has_company_keywords = False
+
     for file_path in package_files:
-        doc_type = identify_document_type(file_path, config)
-        quality = check_document_quality(file_path)
-        
-        report = {
-            'original_name': os.path.basename(file_path),
-            'identified_type': doc_type,
-            'quality_issues': []
-        }
-        if quality['is_blank']:
-            report['quality_issues'].append('Blank Page')
-        if quality['is_blurry']:
-            report['quality_issues'].append('Blurry')
-            
+        known = known_results.get(file_path)
+        started = time.perf_counter()
+        if known:
+            result = dict(known, reused=True)
+        else:
+            result = dict(analyse_document(file_path, config, timings), reused=False,
+                          analysis_seconds=time.perf_counter() - started)
+        record_cache('document_result', known is not None)
+        DOCUMENTS.labels('reused' if known else 'analysed').inc()
+
+        report = dict(result, original_name=os.path.basename(file_path))
         document_reports.append(report)
-        if doc_type != "Unknown Document":
-            identified_docs.add(doc_type)
-            
+        has_company_keywords = has_company_keywords or result['company_keywords']
+        if result['identified_type'] != "Unknown Document":
+            identified_docs.add(result['identified_type'])
+
+    # 2. Classify Account Type: COMPANY if any document mentions company keywords
+    account_type = 'COMPANY' if has_company_keywords else 'INDIVIDUAL'
+
     # 3. Check for missing documents
     required_docs = set(config['document_checklists'].get(account_type, []))
     missing_docs = list(required_docs - identified_docs)
@@ -120,7 +146,8 @@ def process_package(package_files):
         'account_type': account_type,
         'documents': document_reports,
         'missing_documents': missing_docs,
-        'status': 'FLAGGED_FOR_REVIEW' if missing_docs or any(r['quality_issues'] for r in document_reports) else 'CLEAN_FOR_PROCESSING'
+        'status': 'FLAGGED_FOR_REVIEW' if missing_docs or any(r['quality_issues'] for r in document_reports) else 'CLEAN_FOR_PROCESSING',
+        'timings': timings
     }
     
     return final_report
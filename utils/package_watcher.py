@@ -0,0 +1,276 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from utils.logs import get_logger
+
+log = get_logger('package_watcher')
+
+# Written by the upload route after package_info.json and every document are
+# saved. A package directory is only dispatched once this marker exists.
+UPLOAD_COMPLETE_MARKER = '.upload_complete'
+
+# --- inotify constants (see inotify(7)) ---
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def mark_upload_complete(package_path):
+    """Signals to the watcher that every file of a package has been written."""
+    with open(os.path.join(package_path, UPLOAD_COMPLETE_MARKER), 'w') as f:
+        f.write(str(time.time()))
+
+
+def is_upload_complete(package_path):
+    return os.path.exists(os.path.join(package_path, UPLOAD_COMPLETE_MARKER))
+
+
+def _latest_mtime(package_path):
+    latest = os.path.getmtime(package_path)
+    for root, dirs, files in os.walk(package_path):
+        for name in dirs + files:
+            try:
+                latest = max(latest, os.path.getmtime(os.path.join(root, name)))
+            except OSError:
+                continue
+    return latest
+
+
+def _load_inotify():
+    """Returns libc with the inotify functions, or None where they are unavailable."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class PackageWatcher:
+    """
+    Watches PACKAGES_DIR for package directories whose upload has completed
+    and passes each package name to on_ready exactly once.
+
+    On Linux this uses inotify, so an idle watcher sleeps in select() until
+    something is written. Elsewhere, or if inotify cannot be initialised, it
+    falls back to listing PACKAGES_DIR every poll_interval seconds and only
+    inspecting directories it has not dispatched yet.
+
+    Directories copied in without the completion marker are dispatched once
+    nothing inside them has changed for settle_seconds; pass None to require
+    the marker.
+    """
+
+    def __init__(self, packages_dir, on_ready, settle_seconds=30, poll_interval=0.5, use_inotify=True):
+        self.packages_dir = packages_dir
+        self.on_ready = on_ready
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self._libc = _load_inotify() if use_inotify else None
+        self._dispatched = set()
+        self._settling = {}  # package name -> time of last observed activity
+        self._thread = None
+        self._stop_read, self._stop_write = os.pipe()
+
+    @property
+    def mode(self):
+        return 'inotify' if self._libc is not None else 'polling'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='package-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        os.write(self._stop_write, b'x')
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _stopping(self, timeout):
+        readable, _, _ = select.select([self._stop_read], [], [], timeout)
+        return bool(readable)
+
+    def _run(self):
+        if self._libc is not None:
+            try:
+                self._run_inotify()
+                return
+            except OSError as e:
+                log.warning("inotify unavailable; falling back to polling", extra={'directory': self.packages_dir, 'error': str(e)})
+                self._libc = None
+        self._run_polling()
+
+    # --- Dispatch bookkeeping shared by both modes ---
+
+    def _check(self, package_name):
+        """Dispatches a package if its upload is complete. Returns True once dispatched."""
+        if package_name in self._dispatched:
+            return True
+        package_path = os.path.join(self.packages_dir, package_name)
+        if not os.path.isdir(package_path):
+            self._settling.pop(package_name, None)
+            return False
+        if is_upload_complete(package_path):
+            self._dispatch(package_name)
+            return True
+        self._settling.setdefault(package_name, time.monotonic())
+        return False
+
+    def _dispatch(self, package_name):
+        self._dispatched.add(package_name)
+        self._settling.pop(package_name, None)
+        try:
+            self.on_ready(package_name)
+        except Exception as e:
+            log.exception("Error dispatching package", extra={'package': package_name})
+
+    def _check_settled(self):
+        """Dispatches marker-less directories that have been quiet for settle_seconds."""
+        if self.settle_seconds is None:
+            return
+        now = time.monotonic()
+        for package_name, seen_at in list(self._settling.items()):
+            if now - seen_at < self.settle_seconds:
+                continue
+            package_path = os.path.join(self.packages_dir, package_name)
+            try:
+                idle_for = time.time() - _latest_mtime(package_path)
+            except OSError:
+                self._settling.pop(package_name, None)
+                continue
+            if idle_for >= self.settle_seconds:
+                self._dispatch(package_name)
+            else:
+                self._settling[package_name] = now - idle_for
+
+    def _forget_removed(self, present):
+        # Packages leave PACKAGES_DIR once filed; a later upload under the
+        # same account number must be dispatched again.
+        self._dispatched &= present
+
+    def _select_timeout(self, default):
+        if self._settling and self.settle_seconds is not None:
+            return min(default or self.settle_seconds, self.settle_seconds)
+        return default
+
+    # --- Polling fallback ---
+
+    def _run_polling(self):
+        while True:
+            try:
+                present = {entry.name for entry in os.scandir(self.packages_dir) if entry.is_dir()}
+            except FileNotFoundError:
+                present = set()
+            self._forget_removed(present)
+            for package_name in present - self._dispatched:
+                self._check(package_name)
+            self._check_settled()
+            if self._stopping(self.poll_interval):
+                return
+
+    # --- inotify ---
+
+    def _add_watch(self, fd, path, mask):
+        wd = self._libc.inotify_add_watch(fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def _watch_package(self, fd, package_name, watches):
+        if package_name in self._dispatched or package_name in watches.values():
+            return
+        try:
+            wd = self._add_watch(fd, os.path.join(self.packages_dir, package_name), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+        except OSError as e:
+            if e.errno in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise
+        watches[wd] = package_name
+        # The marker may have been written before the watch existed
+        if self._check(package_name):
+            self._unwatch(fd, wd, watches)
+
+    def _unwatch(self, fd, wd, watches):
+        watches.pop(wd, None)
+        self._libc.inotify_rm_watch(fd, wd)
+
+    def _scan(self, fd, watches):
+        try:
+            present = {entry.name for entry in os.scandir(self.packages_dir) if entry.is_dir()}
+        except FileNotFoundError:
+            present = set()
+        self._forget_removed(present)
+        for package_name in present:
+            self._watch_package(fd, package_name, watches)
+
+    def _run_inotify(self):
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        try:
+            root_wd = self._add_watch(fd, self.packages_dir, IN_CREATE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE)
+            watches = {}  # watch descriptor -> package name
+            self._scan(fd, watches)
+
+            while True:
+                readable, _, _ = select.select([fd, self._stop_read], [], [], self._select_timeout(None))
+                if self._stop_read in readable:
+                    return
+                if fd in readable:
+                    self._handle_events(fd, root_wd, watches)
+                self._check_settled()
+                for wd, package_name in list(watches.items()):
+                    if package_name in self._dispatched:
+                        self._unwatch(fd, wd, watches)
+        finally:
+            os.close(fd)
+
+    def _handle_events(self, fd, root_wd, watches):
+        try:
+            buffer = os.read(fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            name = buffer[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b'\0')
+            name = os.fsdecode(name)
+            offset += _EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped; fall back to one listing of PACKAGES_DIR
+                self._scan(fd, watches)
+            elif mask & IN_IGNORED:
+                watches.pop(wd, None)
+            elif wd == root_wd:
+                if not mask & IN_ISDIR:
+                    continue
+                self._dispatched.discard(name)
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_package(fd, name, watches)
+                else:
+                    self._settling.pop(name, None)
+            elif wd in watches:
+                package_name = watches[wd]
+                if name == UPLOAD_COMPLETE_MARKER:
+                    self._check(package_name)
+                elif package_name in self._settling:
+                    self._settling[package_name] = time.monotonic()
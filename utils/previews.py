@@ -0,0 +1,190 @@
+import os
+import io
+import time
+import tempfile
+import threading
+from utils.uploads import hash_file
+from utils.metrics import stage, record_cache
+
+# Rendered sizes, by name: the width in pixels a page is scaled to.
+PREVIEW_SIZES = {'thumb': 160, 'page': 1200}
+WEBP_QUALITY = 80
+
+# Bytes held by each cache directory, read from disk by the first PreviewCache
+# opened on it in this process and kept up to date by put and evict
+_cache_bytes = {}
+_cache_bytes_lock = threading.Lock()
+
+
+def _preview_format():
+    """WebP where Pillow was built with it, JPEG otherwise. Returns (PIL format, extension, mimetype)."""
+    from PIL import features
+    if features.check('webp'):
+        return 'WEBP', 'webp', 'image/webp'
+    return 'JPEG', 'jpg', 'image/jpeg'
+
+
+def page_count(file_path):
+    """Number of pages (PDF) or frames (images) a document has."""
+    if os.path.splitext(file_path)[1].lower() == '.pdf':
+        import fitz  # PyMuPDF
+        with fitz.open(file_path) as pdf:
+            return pdf.page_count
+    from PIL import Image
+    with Image.open(file_path) as img:
+        return getattr(img, 'n_frames', 1)
+
+
+def render_page(file_path, page, width):
+    """Renders one page (0-based) of a document as a PIL image at most width pixels wide."""
+    from PIL import Image
+    if os.path.splitext(file_path)[1].lower() == '.pdf':
+        import fitz  # PyMuPDF
+        with fitz.open(file_path) as pdf:
+            pdf_page = pdf.load_page(page)
+            zoom = min(width / pdf_page.rect.width, 4.0)
+            pix = pdf_page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            return Image.frombytes('RGB', [pix.width, pix.height], pix.samples)
+    with Image.open(file_path) as img:
+        img.seek(page)
+        # draft() lets the JPEG decoder skip straight to a reduced scale
+        img.draft('RGB', (width, width * 4))
+        frame = img.convert('RGB')
+    frame.thumbnail((width, width * 4))
+    return frame
+
+
+class PreviewCache:
+    """
+    Size-bounded on-disk cache of rendered page previews, keyed by the
+    document's content hash so a preview is shared by every copy of a scan
+    and never goes stale. Entries are evicted least recently used first
+    once the cache grows past max_bytes.
+
+    The cache's size is tracked in memory, so a write only walks the
+    directory when it takes the cache over max_bytes. Each process counts
+    its own writes; eviction recounts from disk, which picks up the others'.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.format, self.extension, self.mimetype = _preview_format()
+        os.makedirs(root, exist_ok=True)
+        with _cache_bytes_lock:
+            if root not in _cache_bytes:
+                _cache_bytes[root] = sum(size for _, size, _ in self._entries())
+
+    def path(self, digest, size, page):
+        return os.path.join(self.root, digest[:2], f'{digest}-{size}-p{page}.{self.extension}')
+
+    def get(self, digest, size, page):
+        path = self.path(digest, size, page)
+        try:
+            # Mark as recently used; access times are unreliable on noatime mounts
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, digest, size, page, image):
+        """Encodes and stores a rendered page. Returns (path, encoded bytes)."""
+        buffer = io.BytesIO()
+        image.save(buffer, format=self.format, quality=WEBP_QUALITY)
+        data = buffer.getvalue()
+        path = self.path(digest, size, page)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp_path, path)
+        with _cache_bytes_lock:
+            _cache_bytes[self.root] += len(data) - replaced
+            over_budget = _cache_bytes[self.root] > self.max_bytes
+        if over_budget:
+            self.evict()
+        return path, len(data)
+
+    def size_bytes(self):
+        """Bytes the cache holds, as tracked by this process."""
+        with _cache_bytes_lock:
+            return _cache_bytes[self.root]
+
+    def _entries(self):
+        """(mtime, size, path) of every stored preview."""
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """Deletes least recently used previews until the cache fits in max_bytes."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+        with _cache_bytes_lock:
+            _cache_bytes[self.root] = total
+        return removed
+
+
+def document_digest(file_path, package_info=None, relative_path=None):
+    """The content hash recorded at upload time, or one computed from the file."""
+    recorded = ((package_info or {}).get('files') or {}).get(relative_path) if relative_path else None
+    if recorded and recorded.get('sha256'):
+        return recorded['sha256']
+    return hash_file(file_path)
+
+
+def get_preview(cache, file_path, digest, size='page', page=0):
+    """
+    Returns (path, generation_seconds) for a preview, rendering it on a cache
+    miss. generation_seconds is 0.0 when the preview was already cached.
+    """
+    path = cache.get(digest, size, page)
+    record_cache('preview', path is not None)
+    if path:
+        return path, 0.0
+    start = time.perf_counter()
+    with stage('preview_render'):
+        path, _ = cache.put(digest, size, page, render_page(file_path, page, PREVIEW_SIZES[size]))
+    return path, time.perf_counter() - start
+
+
+def generate_previews(cache, file_path, digest):
+    """
+    Renders the thumbnail and every page preview of a document ahead of the
+    first view. Returns {'pages', 'seconds', 'bytes'}.
+    """
+    start = time.perf_counter()
+    pages = page_count(file_path)
+    encoded_bytes = 0
+    wanted = [('thumb', 0)] + [('page', page) for page in range(pages)]
+    for size, page in wanted:
+        if cache.get(digest, size, page):
+            continue
+        _, written = cache.put(digest, size, page, render_page(file_path, page, PREVIEW_SIZES[size]))
+        encoded_bytes += written
+    return {'pages': pages, 'seconds': time.perf_counter() - start, 'bytes': encoded_bytes}
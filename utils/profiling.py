@@ -0,0 +1,255 @@
+import os
+import sys
+import json
+import time
+import uuid
+import hmac
+import marshal
+import cProfile
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from utils.logs import get_logger
+
+log = get_logger('profiling')
+
+# Header carrying PROFILING_TOKEN: profiles the request it is sent with and
+# authorises access to the stored profiles.
+PROFILE_HEADER = 'X-Profile'
+# Optional: 'sample' (default) or 'cprofile'
+PROFILE_MODE_HEADER = 'X-Profile-Mode'
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Request ids are used as file names, so only simple ones are accepted
+_PROFILE_ID = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+# Stored profile formats, by mode: (extension, mimetype)
+PROFILE_FORMATS = {
+    # Folded stacks, one 'frame;frame;frame count' line per distinct stack.
+    # Feed to flamegraph.pl or load into speedscope.
+    'sample': ('folded', 'text/plain'),
+    # pstats dump, for snakeviz, flameprof or python -m pstats
+    'cprofile': ('prof', 'application/octet-stream'),
+}
+
+
+class SamplingProfiler:
+    """
+    Samples the call stack of one thread every interval seconds from a
+    background thread, without instrumenting the profiled code. Cheap enough
+    for production requests and faithful for time spent in C extensions
+    (Tesseract, PyMuPDF), which cProfile attributes to a single call.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class ProfileStore:
+    """
+    Keeps captured profiles on disk as <profile_id>.<ext> plus a
+    <profile_id>.json description, retaining only the newest keep profiles.
+    """
+
+    def __init__(self, root, keep=200):
+        self.root = root
+        self.keep = keep
+        os.makedirs(root, exist_ok=True)
+
+    def save(self, profile_id, mode, data, meta):
+        extension, _ = PROFILE_FORMATS[mode]
+        path = os.path.join(self.root, f'{profile_id}.{extension}')
+        with open(path, 'wb') as f:
+            f.write(data)
+        meta = dict(meta, id=profile_id, mode=mode, file=os.path.basename(path),
+                    created_at=datetime.utcnow().isoformat())
+        with open(os.path.join(self.root, f'{profile_id}.json'), 'w') as f:
+            json.dump(meta, f)
+        self.prune()
+        return meta
+
+    def list(self):
+        """Descriptions of the stored profiles, newest first."""
+        profiles = []
+        for filename in os.listdir(self.root):
+            if filename.endswith('.json'):
+                try:
+                    with open(os.path.join(self.root, filename)) as f:
+                        profiles.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return sorted(profiles, key=lambda meta: meta['created_at'], reverse=True)
+
+    def get(self, profile_id):
+        """Returns (path, mimetype) of a stored profile, or None."""
+        for profile in self.list():
+            if profile['id'] == profile_id:
+                _, mimetype = PROFILE_FORMATS[profile['mode']]
+                return os.path.join(self.root, profile['file']), mimetype
+        return None
+
+    def prune(self):
+        for profile in self.list()[self.keep:]:
+            for filename in (profile['file'], f"{profile['id']}.json"):
+                try:
+                    os.remove(os.path.join(self.root, filename))
+                except FileNotFoundError:
+                    pass
+
+
+class Capture:
+    """One in-progress profile of the current thread, in either mode."""
+
+    def __init__(self, mode='sample', interval=0.005):
+        if mode not in PROFILE_FORMATS:
+            raise ValueError(f'Unknown profile mode {mode!r}')
+        self.mode = mode
+        self.started = time.perf_counter()
+        if mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._profiler = SamplingProfiler(interval=interval)
+            self._profiler.start()
+
+    def finish(self):
+        """Stops profiling. Returns (data bytes, elapsed seconds)."""
+        elapsed = time.perf_counter() - self.started
+        if self.mode == 'cprofile':
+            self._profiler.disable()
+            # The same encoding Profile.dump_stats writes, without a temporary file
+            self._profiler.create_stats()
+            return marshal.dumps(self._profiler.stats), elapsed
+        self._profiler.stop()
+        return self._profiler.folded().encode('utf-8'), elapsed
+
+
+@contextmanager
+def profile_block(store, profile_id, meta, mode='sample', interval=0.005):
+    """Profiles the enclosed block (e.g. one background job) and stores the result."""
+    capture = Capture(mode, interval)
+    try:
+        yield
+    finally:
+        data, elapsed = capture.finish()
+        store.save(profile_id, mode, data, dict(meta, seconds=round(elapsed, 4)))
+        log.info("Profile captured", extra={'profile_id': profile_id, 'mode': mode, 'seconds': elapsed})
+
+
+def has_profiling_token(config, headers):
+    """True if the request carries the configured PROFILING_TOKEN."""
+    token = config.get('PROFILING_TOKEN')
+    sent = headers.get(PROFILE_HEADER)
+    return bool(token and sent and hmac.compare_digest(sent, token))
+
+
+def job_profiler(config, queue_name, job):
+    """
+    A context manager that profiles one background job if PROFILE_JOBS is set
+    or the job was enqueued with payload['profile'], and does nothing otherwise.
+    The profile is stored as job-<queue>-<job id>.
+    """
+    if not (config.get('PROFILE_JOBS') or (job.get('payload') or {}).get('profile')):
+        return nullcontext()
+    return profile_block(
+        ProfileStore(config['PROFILE_DIR'], config['PROFILE_KEEP']),
+        f"job-{queue_name}-{job['id']}",
+        {'queue': queue_name, 'job_key': job['job_key']},
+        interval=config['PROFILE_INTERVAL'],
+    )
+
+
+def install_profiling(app):
+    """
+    Adds opt-in profiling to a Flask app.
+
+    A request is profiled when PROFILE_REQUESTS is set, or when it carries an
+    X-Profile header equal to PROFILING_TOKEN. Its profile is stored under
+    the request's X-Request-ID (generated if absent), which is echoed in the
+    response. GET /profiles lists stored profiles and /profiles/<id>
+    downloads one; both require the token. With neither option configured,
+    no profiler runs and each request costs two dictionary lookups.
+    """
+    from flask import g, request, jsonify, send_file, abort
+
+    def store():
+        return ProfileStore(app.config['PROFILE_DIR'], app.config['PROFILE_KEEP'])
+
+    def has_token():
+        return has_profiling_token(app.config, request.headers)
+
+    @app.before_request
+    def _start_profile():
+        if not app.config.get('PROFILE_REQUESTS') and not app.config.get('PROFILING_TOKEN'):
+            return None
+        if app.config.get('PROFILE_REQUESTS') or has_token():
+            mode = request.headers.get(PROFILE_MODE_HEADER, 'sample')
+            if mode not in PROFILE_FORMATS:
+                return jsonify({'error': f'Unknown profile mode {mode!r}.'}), 400
+            request_id = request.headers.get(REQUEST_ID_HEADER, '')
+            g.profile_id = request_id if _PROFILE_ID.match(request_id) else uuid.uuid4().hex
+            g.profile_capture = Capture(mode, app.config['PROFILE_INTERVAL'])
+        return None
+
+    @app.after_request
+    def _finish_profile(response):
+        capture = g.pop('profile_capture', None)
+        if capture is None:
+            return response
+        data, elapsed = capture.finish()
+        store().save(g.profile_id, capture.mode, data, {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'seconds': round(elapsed, 4),
+        })
+        response.headers[REQUEST_ID_HEADER] = g.profile_id
+        response.headers['X-Profile-Id'] = g.profile_id
+        return response
+
+    def list_profiles():
+        if not has_token():
+            abort(403)
+        return jsonify({'profiles': store().list()})
+
+    def download_profile(profile_id):
+        if not has_token():
+            abort(403)
+        found = store().get(profile_id)
+        if found is None:
+            abort(404)
+        path, mimetype = found
+        return send_file(path, mimetype=mimetype, as_attachment=True, download_name=os.path.basename(path))
+
+    app.add_url_rule('/profiles', 'list_profiles', list_profiles)
+    app.add_url_rule('/profiles/<profile_id>', 'download_profile', download_profile)
@@ -0,0 +1,23 @@
+import json
+
+# Sent on idle streams so proxies do not close the connection.
+KEEPALIVE = ': keepalive\n\n'
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    # Stop nginx from buffering the stream
+    'X-Accel-Buffering': 'no',
+}
+
+
+def format_sse(data, event=None, event_id=None):
+    """Formats one server-sent event; data is JSON-encoded unless it is already a string."""
+    if not isinstance(data, str):
+        data = json.dumps(data)
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event is not None:
+        lines.append(f'event: {event}')
+    lines.extend(f'data: {line}' for line in data.splitlines() or [''])
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,305 @@
+"""
+Tiered field extraction: read a document locally first and ask the model
+only for the fields the local read is not confident about.
+
+The local tier takes the words of a document's first page, either from the
+PDF text layer or from Tesseract with each word's recognition confidence,
+and reads every field from the line holding its label (SURNAME: MOYO). A
+field's confidence is the lowest confidence of the words making up its
+value, and zero when the value is missing or fails its validator (an ID
+number that doesn't look like one, a birth date in the future). Fields at
+or above the threshold are kept; the rest are requested from the model in
+one narrowed prompt and merged back, each field recording its source.
+"""
+import io
+import re
+from datetime import date, datetime
+from utils.document_processor import extract_basic_details, extract_personal_details, _normalize_date
+from utils.logs import get_logger
+from utils.metrics import stage, EXTRACTED_FIELDS
+
+log = get_logger('tiered_extraction')
+
+# Where a field's value came from
+SOURCE_LOCAL = 'local'
+SOURCE_MODEL = 'gemini'
+
+# The PDF text layer is exact; fewer characters than this means a scan
+MIN_TEXT_LAYER_CHARS = 50
+
+
+def _upper_text(value):
+    return ' '.join(value.split()).upper()
+
+
+def _amount(value):
+    return re.sub(r'[^\d.]', '', value)
+
+
+def _gender(value):
+    value = value.strip().upper()
+    if value in ('M', 'MALE'):
+        return 'MALE'
+    if value in ('F', 'FEMALE'):
+        return 'FEMALE'
+    return value
+
+
+def _date(value):
+    """YYYY-MM-DD from an ISO date (as the model answers) or any format _normalize_date reads."""
+    value = value.strip()
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        return _normalize_date(value)
+
+
+def _id_number(value):
+    return re.sub(r'\s+', '', value).upper()
+
+
+def is_name(value):
+    return bool(re.fullmatch(r"[A-Z][A-Z' -]{0,60}", value))
+
+
+def is_occupation(value):
+    return bool(re.fullmatch(r"[A-Z][A-Z&' ./-]{1,60}", value))
+
+
+def is_amount(value):
+    return bool(re.fullmatch(r'\d{1,9}(?:\.\d{1,2})?', value)) and float(value) > 0
+
+
+def is_id_number(value):
+    return bool(re.fullmatch(r'\d{2}-?\d{6,8}-?[A-Z]-?\d{2}', value))
+
+
+def is_past_date(value):
+    try:
+        parsed = datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return False
+    return date(1900, 1, 1) <= parsed <= date.today()
+
+
+def is_gender(value):
+    return value in ('MALE', 'FEMALE')
+
+
+# Each field: (name, label patterns, key in the document_processor extractor's
+# details, normaliser, validator). A field with several labels joins their
+# values in order, e.g. GIVEN NAMES then SURNAME for the full name.
+MANDATE_FIELDS = (
+    ('SURNAME', (r'SURNAME',), None, _upper_text, is_name),
+    ('NAME', (r'(?:FIRST|GIVEN)\s+NAMES?|FORENAMES?',), None, _upper_text, is_name),
+    ('OCCUPATION', (r'OCCUPATION|JOB\s+TITLE|PROFESSION',), 'profession', _upper_text, is_occupation),
+    ('GROSS MONTHLY INCOME', (r'GROSS\s+MONTHLY(?:\s+INCOME)?|MONTHLY\s+SALARY',), 'monthly_salary', _amount,
+     is_amount),
+)
+ID_FIELDS = (
+    ('ID_NUMBER', (r'NATIONAL\s+ID\s+NUMBER|ID\s+NUMBER|I\.?D\.?\s+NO|IDN',), 'id_number', _id_number,
+     is_id_number),
+    ('DATE_OF_BIRTH', (r'DATE\s+OF\s+BIRTH|BIRTH\s+DATE|DOB',), 'date_of_birth', _date, is_past_date),
+    ('GENDER', (r'SEX|GENDER',), 'gender', _gender, is_gender),
+    ('NATIONALITY', (r'NATIONALITY|CITIZENSHIP',), 'nationality', _upper_text, is_name),
+    ('PLACE OF BIRTH', (r'PLACE\s+OF\s+BIRTH',), None, _upper_text, is_name),
+    ('FULL NAME', (r'GIVEN\s+NAMES?|FIRST\s+NAMES?', r'SURNAME'), 'full_name', _upper_text, is_name),
+    ('ISSUE DATE', (r'DATE\s+OF\s+ISSUE|ISSUE\s+DATE|ISSUED\s+ON',), 'issue_date', _date, is_past_date),
+)
+DOCUMENT_FIELDS = {'mandate': MANDATE_FIELDS, 'id': ID_FIELDS}
+EXTRACTORS = {'mandate': extract_basic_details, 'id': extract_personal_details}
+# Labels that end another field's value when they share its line
+OTHER_LABELS = (r'EXPIRY\s+DATE', r'VILLAGE\s+OF\s+ORIGIN', r"EMPLOYER'?S\s+(?:NAME|ADDRESS)", r'ACCOUNT\s+\w+')
+
+
+def text_layer_words(pdf_bytes):
+    """Words of a PDF's first page text layer, all at confidence 1.0."""
+    import fitz
+    with fitz.open(stream=pdf_bytes, filetype='pdf') as document:
+        if not document.page_count:
+            return []
+        entries = document.load_page(0).get_text('words')
+    return [
+        {'text': text, 'confidence': 1.0, 'line': (block, line), 'box': (x0, y0, x1 - x0, y1 - y0)}
+        for x0, y0, x1, y1, text, block, line, _ in entries
+    ]
+
+
+def ocr_words(image_bytes):
+    """Words Tesseract recognises in an image, with confidences from 0 to 1."""
+    import pytesseract
+    from PIL import Image
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        data = pytesseract.image_to_data(image, lang='eng', output_type=pytesseract.Output.DICT)
+    words = []
+    for i, text in enumerate(data['text']):
+        confidence = float(data['conf'][i])
+        if not text.strip() or confidence < 0:
+            continue
+        words.append({
+            'text': text,
+            'confidence': confidence / 100,
+            'line': (data['block_num'][i], data['par_num'][i], data['line_num'][i]),
+            'box': (data['left'][i], data['top'][i], data['width'][i], data['height'][i]),
+        })
+    return words
+
+
+def read_words(file_bytes, mime_type, image_bytes):
+    """
+    The words of a document's first page: the text layer of a text PDF,
+    otherwise Tesseract's reading of image_bytes (the rasterised page).
+    Returns None when the document cannot be read locally, e.g. when
+    Tesseract is not installed, so every field goes to the model.
+    """
+    try:
+        if mime_type == 'application/pdf':
+            with stage('pdf_text'):
+                words = text_layer_words(file_bytes)
+            if sum(len(word['text']) for word in words) >= MIN_TEXT_LAYER_CHARS:
+                return words
+        with stage('ocr'):
+            return ocr_words(image_bytes)
+    except Exception as e:
+        log.info("Local read failed; all fields go to the model", extra={'error': str(e)})
+        return None
+
+
+def group_lines(words):
+    """Splits words into lines, each a (text, [(offset in text, word)]) pair."""
+    lines = []
+    current = None
+    for word in words:
+        if not lines or word['line'] != current:
+            lines.append(('', []))
+            current = word['line']
+        text, placed = lines[-1]
+        if text:
+            text += ' '
+        placed.append((len(text), word))
+        lines[-1] = (text + word['text'], placed)
+    return lines
+
+
+def labelled_values(lines, label, stop):
+    """Yields (value, words) for the text following label on each line, cut at the next label."""
+    pattern = re.compile(r'\b(?:' + label + r')\b[\s:.\-]*', re.IGNORECASE)
+    for text, placed in lines:
+        for match in pattern.finditer(text):
+            start = match.end()
+            following = stop.search(text, start)
+            end = following.start() if following else len(text)
+            value = text[start:end].strip(' :.-')
+            if value:
+                yield value, [word for offset, word in placed if start <= offset < end]
+
+
+def matching_words(value, words):
+    """The most confident word containing each token of value, or None if a token was not read."""
+    matched = []
+    for token in re.findall(r'[A-Z0-9]+', value.upper()):
+        candidates = [word for word in words if token in re.sub(r'[^A-Z0-9]', '', word['text'].upper())]
+        if not candidates:
+            return None
+        matched.append(max(candidates, key=lambda word: word['confidence']))
+    return matched
+
+
+def span_confidence(words):
+    """A value is only as reliable as its least certain word."""
+    return min((word['confidence'] for word in words), default=0.0)
+
+
+def read_local_fields(words, document):
+    """
+    Reads every field of a 'mandate' or 'id' document from its words.
+    Returns {field name: (value, confidence)}; fields not found have value None.
+    """
+    fields = DOCUMENT_FIELDS[document]
+    lines = group_lines(words)
+    labels = [label for _, field_labels, _, _, _ in fields for label in field_labels] + list(OTHER_LABELS)
+    details = EXTRACTORS[document]('\n'.join(text for text, _ in lines))
+
+    results = {}
+    for name, field_labels, detail_key, normalise, validate in fields:
+        stop = re.compile(r'\b(?:' + '|'.join(label for label in labels if label not in field_labels) + r')\b',
+                          re.IGNORECASE)
+        parts = []
+        for label in field_labels:
+            # The first value under the label that validates on its own, else the first one found
+            candidates = list(labelled_values(lines, label, stop))
+            valid = [(value, span) for value, span in candidates if len(field_labels) > 1 or
+                     (normalise(value) and validate(normalise(value)))]
+            if valid or candidates:
+                parts.append((valid or candidates)[0])
+        value, span = None, []
+        if parts and len(parts) == len(field_labels):
+            value = normalise(' '.join(part[0] for part in parts))
+            span = [word for _, part_words in parts for word in part_words]
+        elif detail_key and details.get(detail_key):
+            # Fall back to the document_processor extractor, scoring the words its value came from
+            value = normalise(str(details[detail_key]))
+            span = matching_words(details[detail_key], words) or []
+        if not value:
+            results[name] = (None, 0.0)
+            continue
+        confidence = span_confidence(span) if validate(value) else 0.0
+        results[name] = (value, round(confidence, 4))
+    return results
+
+
+def read_document_fields(file_bytes, mime_type, image_bytes, document):
+    """The local tier for one document: read_local_fields, or {} if it cannot be read locally."""
+    words = read_words(file_bytes, mime_type, image_bytes)
+    if not words:
+        return {}
+    with stage('local_fields'):
+        return read_local_fields(words, document)
+
+
+def field_names(document):
+    return [spec[0] for spec in DOCUMENT_FIELDS[document]]
+
+
+def field_checks(document):
+    """{field name: (normaliser, validator)} for a document's fields."""
+    return {name: (normalise, validate) for name, _, _, normalise, validate in DOCUMENT_FIELDS[document]}
+
+
+def unresolved_fields(document, local, threshold):
+    """The fields of document the local tier did not read with at least threshold confidence."""
+    return [
+        name for name in field_names(document)
+        if local.get(name, (None, 0.0))[0] is None or local[name][1] < threshold
+    ]
+
+
+def field_key(name):
+    """Compares field names regardless of case, spaces or underscores."""
+    return re.sub(r'[\s_]+', '_', name.strip().lower())
+
+
+def merge_fields(field_names, local, model_fields, threshold):
+    """
+    Builds the 'fields' list of an HTRSchema. Each field takes its local
+    value if it reached threshold, otherwise the model's answer; fields the
+    model did not return keep their local value. model_fields are the raw
+    field dicts from the model.
+    """
+    model_values = {field_key(field.get('field_name', '')): field for field in model_fields or []}
+    merged = []
+    for name in field_names:
+        value, confidence = local.get(name, (None, 0.0))
+        model_field = model_values.pop(field_key(name), None)
+        if value is None and model_field is None:
+            continue
+        if (value is not None and confidence >= threshold) or model_field is None:
+            merged.append({'field_name': name, 'extracted_value': value, 'confidence_score': confidence,
+                           'source': SOURCE_LOCAL})
+        else:
+            merged.append(dict(model_field, field_name=name, source=SOURCE_MODEL))
+    # Anything else the model volunteered is kept as it came
+    merged.extend(dict(field, source=SOURCE_MODEL) for field in model_values.values())
+    for field in merged:
+        EXTRACTED_FIELDS.labels(field['source']).inc()
+    return merged
@@ -0,0 +1,134 @@
+import os
+import shutil
+import hashlib
+import tempfile
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# Size of the chunks copied when storing a stream that is not already on disk.
+CHUNK_SIZE = 64 * 1024
+
+
+class FileTooLarge(RequestEntityTooLarge):
+    description = 'An uploaded file exceeds the per-file size limit.'
+
+
+class HashingFile:
+    """
+    A temporary file in the blob store that hashes its content as it is
+    written and refuses to grow beyond max_bytes. Werkzeug's form parser
+    streams each uploaded part into one of these, so a file is hashed and
+    size-checked in a single pass without being buffered in memory. The file
+    is deleted on close unless BlobStore.commit has stored it.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        self._file = tempfile.NamedTemporaryFile(dir=directory, prefix='upload-', delete=True)
+        self._hash = hashlib.sha256()
+        self.max_bytes = max_bytes
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            self._file.close()
+            raise FileTooLarge()
+        self._hash.update(data)
+        return self._file.write(data)
+
+    @property
+    def name(self):
+        return self._file.name
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def __getattr__(self, attr):
+        # read/seek/tell/flush/close are served by the underlying file
+        return getattr(self._file, attr)
+
+
+class BlobStore:
+    """
+    Content-addressed storage for uploaded documents, keyed by SHA-256.
+
+    Each distinct file is kept once under root; packages receive hard links
+    to it, so a scan that branches upload again costs no extra disk space.
+    Blobs whose only remaining link is the store's own are removed by prune().
+    root should be on the same filesystem as the package directories;
+    otherwise files are copied instead of linked.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def temp_file(self, max_bytes=None):
+        return HashingFile(self.tmp_dir, max_bytes)
+
+    def commit(self, hashing_file, dest_path):
+        """
+        Stores a fully written HashingFile and links it at dest_path.
+        Returns {'sha256', 'bytes', 'deduplicated'}.
+        """
+        hashing_file.flush()
+        digest = hashing_file.hexdigest()
+        blob_path = self.blob_path(digest)
+        deduplicated = os.path.exists(blob_path)
+        if not deduplicated:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            try:
+                os.link(hashing_file.name, blob_path)
+            except FileExistsError:
+                # Another upload stored the same content first
+                deduplicated = True
+        hashing_file.close()
+        self._link(blob_path, dest_path)
+        return {'sha256': digest, 'bytes': hashing_file.size, 'deduplicated': deduplicated}
+
+    def store_stream(self, stream, dest_path, max_bytes=None):
+        """Copies a readable stream into the store in chunks and links it at dest_path."""
+        hashing_file = self.temp_file(max_bytes)
+        try:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                hashing_file.write(chunk)
+        except Exception:
+            hashing_file.close()
+            raise
+        return self.commit(hashing_file, dest_path)
+
+    @staticmethod
+    def _link(blob_path, dest_path):
+        if os.path.lexists(dest_path):
+            os.remove(dest_path)
+        try:
+            os.link(blob_path, dest_path)
+        except OSError:
+            # Different filesystem or no hard link support
+            shutil.copyfile(blob_path, dest_path)
+
+    def prune(self):
+        """Deletes blobs no package links to any more. Returns how many were removed."""
+        removed = 0
+        for prefix in os.listdir(self.root):
+            prefix_dir = os.path.join(self.root, prefix)
+            if prefix_dir == self.tmp_dir or not os.path.isdir(prefix_dir):
+                continue
+            for digest in os.listdir(prefix_dir):
+                blob_path = os.path.join(prefix_dir, digest)
+                if os.stat(blob_path).st_nlink <= 1:
+                    os.remove(blob_path)
+                    removed += 1
+        return removed
+
+
+def hash_file(file_path):
+    """SHA-256 of a file on disk, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()